@@ -0,0 +1,1667 @@
+"""
+學生轉社分發核心 (Allocation Core)
+不依賴 Streamlit，可被網頁介面 (app.py)、命令列 (cli.py) 與測試直接匯入。
+"""
+import heapq
+import itertools
+import bisect
+import hashlib
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+import pandas as pd
+import numpy as np
+
+from rules import legacy_rules
+
+PREF_COLS = 10 # 志願1 ~ 志願10
+NO_RANK = 999 # 999代表未錄取任何志願，0代表第一志願
+ENGINES = {
+    'ripple': '動態遞補 + 交換',
+    'exact': '精確配對',
+}
+OPTIMIZERS = {
+    'swap': '兩兩交換',
+    'sum': '最小成本流 (志願序總和最小)',
+    'lex': '最小成本流 (志願序優先)',
+}
+FLOW_TIME_BUDGET = 10.0 # 秒；最小成本流最佳化的預設時間預算
+NO_CLUB = 'nan' # 沒有社團 (空白格) 的名稱，與空白格轉成字串的結果相同
+BLANK_NAMES = frozenset(['', NO_CLUB]) # 視為空白的社團名稱 (空白格轉成字串為 'nan'；'None' 等其他文字是一般的社團名稱)
+# 編譯時略過的志願及原因 (同一格有多個原因時取排在前面的；被限制規則略過的志願以規則說明為原因)
+DROP_REASONS = {
+    'unknown': '不在缺額表',
+    'duplicate': '重複填寫',
+}
+GRADE_RANGES = {1: (101, 115), 2: (201, 215), 3: (301, 315)} # 年級 -> 班級代碼範圍 (班級欄位的前 3 位數字)
+
+# --- 1. 資料模型類別 (Class Definitions) ---
+def normalize_club_name(value):
+    """
+    社團名稱正規化: 全形英數與符號轉半形 (NFKC)、去除前後空白並將中間的連續空白合併為一格；
+    空白格 (None、NaN、空字串) 與 'nan' 一律為 NO_CLUB
+    """
+    if value is None or (isinstance(value, float) and value != value):
+        return NO_CLUB
+    name = ' '.join(unicodedata.normalize('NFKC', str(value)).split())
+    return NO_CLUB if name in BLANK_NAMES else name
+
+class Club:
+    def __init__(self, name, initial_vacancy):
+        self.name = str(name).strip()
+        self.initial_vacancy = int(initial_vacancy)
+        self.members = {} # 目前在此社團的學生 (StudentTable 的列號)，dict 保留加入順序且可 O(1) 移除
+        self.occupancy = 0 # 目前人數
+        self.capacity = 0 # 將在初始化時計算: 初始缺額 + 初始成員數
+    
+    def add(self, idx):
+        self.members[idx] = None
+        self.occupancy += 1
+    
+    def remove(self, idx):
+        del self.members[idx]
+        self.occupancy -= 1
+    
+    def has_space(self):
+        return self.occupancy < self.capacity
+    
+    @property
+    def current_students(self):
+        # 依加入順序的成員名單 (匯出時使用)
+        return list(self.members)
+
+class StudentInput:
+    """
+    學生資料中與缺額表、限制無關的部分，依填寫時間排序後只整理一次 (可存成快照直接載入，見 snapshot.py)
+    - ids / names / class_strs: 學號、姓名、班級，列順序即填寫時間優先順序
+    - filled: 填寫時間 (datetime64，無法解析的為 NaT)
+    - class_num / grade: 班級代碼 (班級欄位的前 3 位數字) 與年級 (依 GRADE_RANGES，0 代表無法判斷)
+    - raw_names: 原社團與志願中出現過的每個不同文字 (尚未正規化，空白格為 'nan')
+    - original / prefs: raw_names 的索引，(學生數,) 與 (學生數, 10) 的整數陣列
+    """
+    def __init__(self, ids, names, class_strs, filled, class_num, grade, raw_names, original, prefs):
+        self.ids = ids
+        self.names = names
+        self.class_strs = class_strs
+        self.filled = filled
+        self.class_num = class_num
+        self.grade = grade
+        self.raw_names = raw_names
+        self.original = original
+        self.prefs = prefs
+    
+    @classmethod
+    def from_frame(cls, students_df):
+        # 確保依照時間排序
+        if '填寫時間' in students_df.columns:
+            students_df['填寫時間'] = pd.to_datetime(students_df['填寫時間'], errors='coerce')
+            students_df = students_df.sort_values(by="填寫時間")
+        n = len(students_df)
+        
+        def col(name):
+            if name in students_df.columns:
+                return students_df[name].map(str).str.strip() # 與 str() 相同，空白格會變成 'nan'
+            return pd.Series([''] * n, index=students_df.index)
+        
+        # 處理班級與年級判斷 (整欄一次處理): 取前 3 位數字，依 GRADE_RANGES 判斷年級
+        class_num = pd.to_numeric(col('班級').str.replace(r'\D', '', regex=True).str[:3], errors='coerce').to_numpy(dtype=np.float64)
+        grade = np.zeros(n, dtype=np.int8) # 0 代表無法判斷
+        for g, (lo, hi) in GRADE_RANGES.items():
+            grade[(class_num >= lo) & (class_num <= hi)] = g
+        
+        # 原社團與志願的文字去除重複 (之後每個不同的名稱只需要正規化一次)
+        pref_strs = np.full((n, PREF_COLS), '', dtype=object)
+        for i in range(1, PREF_COLS + 1):
+            if f'志願{i}' in students_df.columns:
+                pref_strs[:, i - 1] = col(f'志願{i}').to_numpy()
+        values = np.concatenate([col('原社團').to_numpy(dtype=object), pref_strs.ravel()])
+        codes, uniques = pd.factorize(values)
+        codes = codes.astype(np.int32)
+        
+        if '填寫時間' in students_df.columns:
+            filled = students_df['填寫時間'].to_numpy(dtype='datetime64[ns]')
+        else:
+            filled = np.full(n, np.datetime64('NaT'), dtype='datetime64[ns]')
+        return cls(ids=col('學號').tolist(),
+                   names=students_df['姓名'].tolist() if '姓名' in students_df.columns else [''] * n,
+                   class_strs=col('班級').tolist(), filled=filled, class_num=class_num, grade=grade,
+                   raw_names=list(uniques), original=codes[:n], prefs=codes[n:].reshape(n, PREF_COLS))
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def original_clubs(self):
+        # 自動發現隱藏社團 (Critical Fix: 確保所有原社團都被追蹤)；依第一次出現的順序，空白不算
+        names = map(normalize_club_name, (self.raw_names[k] for k in pd.unique(self.original)))
+        return [name for name in dict.fromkeys(names) if name != NO_CLUB]
+    
+    def to_frame(self):
+        """
+        還原成學生資料表 (依填寫時間排序；欄位同 STUDENT_COLUMNS，空白格為 'nan')，供顯示與匯出
+        分發請直接使用 StudentInput: 同一時間填寫的學生，再排序一次的先後可能不同
+        """
+        raw_names = np.array(self.raw_names, dtype=object)
+        data = {'學號': self.ids, '姓名': self.names, '班級': self.class_strs, '填寫時間': self.filled,
+                '原社團': raw_names[self.original]}
+        for i in range(PREF_COLS):
+            data[f'志願{i + 1}'] = raw_names[self.prefs[:, i]]
+        return pd.DataFrame(data)
+
+class StudentTable:
+    """
+    學生資料的欄位式 (Columnar) 表示，取代逐列建立的 Student 物件；建立時即完成輸入編譯
+    - 社團名稱先正規化 (normalize_club_name) 再轉成整數 ID: club_names[id]，前 len(clubs) 個 ID 就是有效社團
+    - prefs: (學生數, 10) 的整數矩陣，-1 代表空白、永遠不可能錄取 (不在缺額表、重複填寫) 或被限制的志願 (保留原本欄位位置)
+    - choices: 每位學生有效的志願 [(志願序, 社團ID)]，分發時只走訪這些，不再逐格檢查
+    - original / assigned / rank: 每位學生一格的陣列，列順序即填寫時間優先順序
+    被略過的志願與原因見 dropped_entries()
+    """
+    def __init__(self, students, clubs, h1_forbidden, h2_forbidden, h1_ban_all, h2_ban_all, rules=()):
+        """students 為 StudentInput (學生資料表會先轉換)"""
+        if not isinstance(students, StudentInput):
+            students = StudentInput.from_frame(students)
+        n = len(students)
+        self.club_names = list(clubs)
+        self.num_clubs = len(self.club_names)
+        club_ids = {name: i for i, name in enumerate(self.club_names)}
+        
+        self.ids = students.ids
+        self.names = students.names
+        self.class_strs = students.class_strs
+        self.class_num = students.class_num
+        self.grade = students.grade
+        
+        # 社團名稱轉整數 ID: 每個不同的名稱只正規化一次 (志願中出現、但不在缺額表的名稱也給 ID，只是不屬於有效社團)
+        lookup = np.empty(len(students.raw_names), dtype=np.int32)
+        self.renamed = {} # 原始名稱 -> 正規化後的名稱 (有改變的才記錄)
+        blank_ids = []
+        for k, raw in enumerate(students.raw_names):
+            name = normalize_club_name(raw)
+            blank = name == NO_CLUB
+            if blank:
+                name = raw # 空白格保留原本的文字 (例如 'nan') 顯示在結果中，但不會是社團
+            elif name != raw:
+                self.renamed[raw] = name
+            if name not in club_ids:
+                club_ids[name] = len(self.club_names)
+                self.club_names.append(name)
+            lookup[k] = club_ids[name]
+            if blank:
+                blank_ids.append(lookup[k])
+        self.original = lookup[students.original]
+        self.all_prefs = lookup[students.prefs] # 套用限制前的志願
+        self.club_ids = club_ids
+        
+        # 與限制無關、永遠不可能錄取的志願只判斷一次: 空白、不在缺額表、同一社團重複填寫 (只保留第一次)
+        self.blank = np.isin(self.all_prefs, blank_ids)
+        self.unknown = ~self.blank & (self.all_prefs >= self.num_clubs)
+        self.duplicate = np.zeros_like(self.blank)
+        for i in range(1, PREF_COLS):
+            self.duplicate[:, i] = (self.all_prefs[:, :i] == self.all_prefs[:, i:i + 1]).any(axis=1)
+        self.duplicate &= ~self.blank & ~self.unknown
+        self.apply_restrictions(h1_forbidden, h2_forbidden, h1_ban_all, h2_ban_all, rules)
+    
+    def lookup_clubs(self, names):
+        # 社團名稱 (正規化後) -> 社團 ID；不存在的名稱略過
+        return [self.club_ids[c] for c in map(normalize_club_name, names) if c in self.club_ids]
+    
+    def rule_rows(self, rule):
+        """符合規則條件 (年級、班級、原社團) 的學生遮罩"""
+        rows = np.ones(len(self.ids), dtype=bool)
+        if rule.grades:
+            rows &= np.isin(self.grade, rule.grades)
+        if rule.classes:
+            hit = np.zeros_like(rows)
+            class_strs = np.array(self.class_strs, dtype=object)
+            for c in rule.classes:
+                bounds = rule.class_range(c)
+                if bounds is not None:
+                    hit |= (self.class_num >= bounds[0]) & (self.class_num <= bounds[1])
+                else:
+                    hit |= class_strs == c
+                    if c.isdigit():
+                        hit |= self.class_num == int(c)
+            rows &= hit
+        if rule.from_clubs:
+            rows &= np.isin(self.original, self.lookup_clubs(rule.from_clubs))
+        return rows
+    
+    def apply_restrictions(self, h1_forbidden=(), h2_forbidden=(), h1_ban_all=False, h2_ban_all=False, rules=()):
+        """
+        重新套用限制規則並回到初始狀態 (每位學生在原社團、尚未錄取任何志願)
+        原本的高一 / 高二設定先轉成規則 (rules.legacy_rules)，再接上 rules；
+        每條規則編譯成一次 (學生, 志願) 的遮罩，rule_hit 記錄每格志願第一個命中的規則 (-1 代表沒有)
+        """
+        self.rules = legacy_rules(h1_forbidden, h2_forbidden, h1_ban_all, h2_ban_all) + list(rules)
+        self.rule_hit = np.full(self.all_prefs.shape, -1, dtype=np.int16)
+        for k, rule in reversed(list(enumerate(self.rules))):
+            hit = self.rule_rows(rule)[:, None]
+            if not rule.bans_all:
+                hit = hit & np.isin(self.all_prefs, self.lookup_clubs(rule.clubs))
+            self.rule_hit[np.broadcast_to(hit, self.rule_hit.shape)] = k
+        # 處理志願 (套用限制): 以遮罩一次清掉無效的志願與被規則禁止的志願
+        blocked = self.blank | self.unknown | self.duplicate | (self.rule_hit >= 0)
+        self.prefs = np.where(blocked, -1, self.all_prefs).astype(np.int32)
+        
+        # 有效志願攤平後依學生切開 (np.nonzero 依列優先，因此每位學生的志願維持原本順序)
+        valid = self.prefs >= 0
+        pairs = list(zip(np.nonzero(valid)[1].tolist(), self.prefs[valid].tolist()))
+        ends = np.cumsum(valid.sum(axis=1)).tolist()
+        self.choices = [pairs[lo:hi] for lo, hi in zip([0] + ends[:-1], ends)]
+        
+        self.assigned = self.original.copy() # 初始狀態在原社團
+        self.rank = np.full(len(self.ids), NO_RANK, dtype=np.int32)
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def is_club(self, cid):
+        return 0 <= cid < self.num_clubs
+    
+    def first_positions(self):
+        # 每位學生各有效志願的位置 {社團ID: 志願序} (重複填寫的已在編譯時去除)
+        return [{cid: i for i, cid in row} for row in self.choices]
+    
+    @property
+    def num_dropped(self):
+        """編譯時略過的志願格數 (不含空白格)"""
+        return int(((self.prefs < 0) & ~self.blank).sum())
+    
+    def dropped_entries(self):
+        """
+        編譯的診斷報告: 被略過的志願 (不含空白格)，每格一列 [學號, 姓名, 班級, 志願序, 志願社團, 原因]
+        原因見 DROP_REASONS 或命中的限制規則 (Rule.describe())，同一格有多個原因時只列第一個
+        """
+        reasons = np.full(self.all_prefs.shape, None, dtype=object)
+        hit = self.rule_hit >= 0
+        reasons[hit] = np.array([rule.describe() for rule in self.rules], dtype=object)[self.rule_hit[hit]]
+        for key, label in reversed(list(DROP_REASONS.items())):
+            reasons[getattr(self, key)] = label
+        reasons[self.blank] = None
+        rows, cols = np.nonzero(reasons != None)
+        return pd.DataFrame({
+            '學號': np.array(self.ids, dtype=object)[rows],
+            '姓名': np.array(self.names, dtype=object)[rows],
+            '班級': np.array(self.class_strs, dtype=object)[rows],
+            '志願序': cols + 1,
+            '志願社團': np.array(self.club_names, dtype=object)[self.all_prefs[rows, cols]],
+            '原因': reasons[rows, cols],
+        })
+
+class AllocationStats:
+    """
+    分發過程的統計 (Instrumentation)
+    - timings: 各階段耗時 (秒)，依執行順序: setup / ripple / swap / results (精確配對引擎為 setup / match / results；
+      使用最小成本流時以 flow 取代 swap)
+    - dropped_prefs: 輸入編譯時略過的志願格數 (不在缺額表、重複填寫、被限制)
+    - moves: 遞補移動次數; scans: 從候補 heap 取出並檢查的次數; pref_checks: 檢查過的志願格數
+    - swap_attempts: 交換階段檢查的候選組數; swaps / cycle_swaps: 兩兩交換 / 循環交換次數
+    - flow_cycles: 最小成本流找到並執行的負循環數; flow_timeouts: 最小成本流因時間預算提前結束 (1) 或完成 (0)
+    - longest_chain: 最長的連鎖遞補 (一個缺額引發的連續移動人數)
+    - reused_moves: 增量重算時，直接沿用前一次結果的遞補步數 (已計入 moves)
+    """
+    PHASE_LABELS = {'setup': '初始化', 'ripple': '動態遞補', 'swap': '交換最佳化', 'match': '精確配對', 'flow': '最小成本流', 'results': '整理結果'}
+    COUNTER_LABELS = {
+        'students': '學生數',
+        'dropped_prefs': '略過的無效志願',
+        'moves': '遞補移動次數',
+        'scans': '候補檢查次數',
+        'pref_checks': '志願檢查次數',
+        'longest_chain': '最長連鎖遞補',
+        'reused_moves': '沿用前次遞補數',
+        'swap_attempts': '交換候選檢查數',
+        'swaps': '兩兩交換組數',
+        'cycle_swaps': '循環交換次數',
+        'flow_cycles': '最小成本流改善次數',
+        'flow_timeouts': '最小成本流逾時',
+    }
+    
+    def __init__(self):
+        self.timings = {}
+        for key in self.COUNTER_LABELS:
+            setattr(self, key, 0)
+        self._mark = time.perf_counter()
+    
+    def lap(self, name):
+        """結束一個階段: 記錄距離上一次 lap (或建立時) 的耗時"""
+        now = time.perf_counter()
+        self.timings[name] = self.timings.get(name, 0.0) + now - self._mark
+        self._mark = now
+    
+    @property
+    def total_time(self):
+        return sum(self.timings.values())
+    
+    def slowest_phase(self):
+        return max(self.timings, key=self.timings.get) if self.timings else None
+    
+    def to_dict(self):
+        data = {key: getattr(self, key) for key in self.COUNTER_LABELS}
+        data.update({f"{name}_seconds": round(sec, 4) for name, sec in self.timings.items()})
+        return data
+    
+    @classmethod
+    def from_dict(cls, data):
+        """由 to_dict() 的內容還原 (讀回保存的分發紀錄時使用)"""
+        stats = cls()
+        for key, value in data.items():
+            if key.endswith('_seconds'):
+                stats.timings[key[:-len('_seconds')]] = value
+            elif key in cls.COUNTER_LABELS:
+                setattr(stats, key, value)
+        return stats
+    
+    def to_frame(self):
+        """轉成 [項目, 數值] 表格，供介面顯示與匯出"""
+        rows = [{'項目': f"{self.PHASE_LABELS.get(name, name)}耗時 (秒)", '數值': round(sec, 4)}
+                for name, sec in self.timings.items()]
+        rows.append({'項目': '總耗時 (秒)', '數值': round(self.total_time, 4)})
+        rows += [{'項目': label, '數值': getattr(self, key)} for key, label in self.COUNTER_LABELS.items()]
+        return pd.DataFrame(rows)
+
+class EventLog:
+    """
+    分發過程紀錄的共同介面
+    事件以整數陣列 (學生順位、社團 ID) 儲存，不在分發迴圈中組字串；
+    只有取出某一筆 (logs[k]、迭代) 或呼叫 to_frame() 時才轉成文字或表格。
+    行為與字串 list 相同: len()、索引、切片、迭代、與 list 比較。
+    """
+    def __init__(self, table):
+        self.ids = table.ids
+        self.names = table.names
+        self.club_names = table.club_names
+        self.num_clubs = table.num_clubs
+        self._frame = None
+    
+    def format(self, k):
+        raise NotImplementedError
+    
+    def build_frame(self):
+        raise NotImplementedError
+    
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self.format(i) for i in range(*k.indices(len(self)))]
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError(k)
+        return self.format(k)
+    
+    def __iter__(self):
+        return (self.format(k) for k in range(len(self)))
+    
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+    
+    def __repr__(self):
+        return repr(list(self))
+    
+    def to_frame(self):
+        """轉成表格 (每筆事件的學號、姓名、社團)，結果會保留下來重複使用"""
+        if self._frame is None:
+            self._frame = self.build_frame()
+        return self._frame
+
+class MoveLog(EventLog):
+    """遞補日誌: 第幾次移動、學生、從哪個社團轉入哪個社團、錄取第幾志願"""
+    def __init__(self, table):
+        super().__init__(table)
+        self.students = array('i')
+        self.from_clubs = array('i')
+        self.to_clubs = array('i')
+        self.ranks = array('i') # 0 代表第一志願
+        self.provenance = None # 落榜原因索引 (Provenance)，分發完成時設定
+    
+    def __len__(self):
+        return len(self.students)
+    
+    def append(self, idx, old, new, rank):
+        self.students.append(idx)
+        self.from_clubs.append(old)
+        self.to_clubs.append(new)
+        self.ranks.append(rank)
+        self._frame = None
+    
+    def format(self, k):
+        idx = self.students[k]
+        return (f"#{k + 1}: {self.names[idx]} ({self.ids[idx]}) 從 [{self.club_names[self.from_clubs[k]]}] "
+                f"轉入 [{self.club_names[self.to_clubs[k]]}] (志願{self.ranks[k] + 1})")
+    
+    def longest_chain(self):
+        """
+        最長連鎖遞補: 每個社團記錄「由移動釋出、尚未被補上」的名額是第幾層連鎖 (初始缺額為第 0 層)，
+        轉入時取用最近釋出的名額，該次移動即為下一層
+        """
+        freed = {}
+        longest = 0
+        for old, new in zip(self.from_clubs, self.to_clubs):
+            seats = freed.get(new)
+            depth = (seats.pop() if seats else 0) + 1
+            longest = max(longest, depth)
+            if 0 <= old < self.num_clubs:
+                freed.setdefault(old, []).append(depth)
+        return longest
+    
+    def build_frame(self):
+        students = np.array(self.students, dtype=np.int32)
+        clubs = np.array(self.club_names, dtype=object)
+        return pd.DataFrame({
+            '序號': np.arange(1, len(self) + 1),
+            '學號': np.array(self.ids, dtype=object)[students],
+            '姓名': np.array(self.names, dtype=object)[students],
+            '原本社團': clubs[np.array(self.from_clubs, dtype=np.int32)],
+            '轉入社團': clubs[np.array(self.to_clubs, dtype=np.int32)],
+            '志願序': np.array(self.ranks, dtype=np.int32) + 1,
+        })
+
+class SwapLog(EventLog):
+    """
+    交換紀錄: 每筆交換的參與學生與交換前的社團 (兩兩交換 2 人，循環交換 3 人以上)
+    參與者攤平存放，starts[k] 為第 k 筆交換在 students / clubs 中的起點
+    """
+    def __init__(self, table):
+        super().__init__(table)
+        self.starts = array('i', [0])
+        self.students = array('i')
+        self.clubs = array('i')
+        self.cycles = array('b') # 1 代表循環交換
+    
+    def __len__(self):
+        return len(self.cycles)
+    
+    def append(self, members, clubs, cycle=False):
+        # 第 k 位參與者從 clubs[k] 換到 clubs[k+1] (最後一位換到 clubs[0])
+        self.students.extend(members)
+        self.clubs.extend(clubs)
+        self.starts.append(len(self.students))
+        self.cycles.append(1 if cycle else 0)
+        self._frame = None
+    
+    def members(self, k):
+        lo, hi = self.starts[k], self.starts[k + 1]
+        return self.students[lo:hi].tolist(), self.clubs[lo:hi].tolist()
+    
+    def format(self, k):
+        members, clubs = self.members(k)
+        names = [self.names[idx] for idx in members]
+        if not self.cycles[k]:
+            return f"{names[0]} <-> {names[1]} : {self.club_names[clubs[0]]} <-> {self.club_names[clubs[1]]}"
+        chain = " -> ".join(f"{name} ({self.club_names[c]})" for name, c in zip(names, clubs))
+        return f"循環交換: {chain} -> {names[0]}"
+    
+    def build_frame(self):
+        # 每位參與者一列，同一筆交換的序號相同
+        rows = []
+        for k in range(len(self)):
+            members, clubs = self.members(k)
+            kind = '循環交換' if self.cycles[k] else '兩兩交換'
+            for j, idx in enumerate(members):
+                rows.append({
+                    '序號': k + 1,
+                    '類型': kind,
+                    '學號': self.ids[idx],
+                    '姓名': self.names[idx],
+                    '原本社團': self.club_names[clubs[j]],
+                    '轉入社團': self.club_names[clubs[(j + 1) % len(clubs)]],
+                })
+        return pd.DataFrame(rows, columns=['序號', '類型', '學號', '姓名', '原本社團', '轉入社團'])
+
+class Provenance:
+    """
+    落榜原因索引 (Provenance): 回答「學生為什麼沒有錄取前面的志願」
+    分發結束時由 Allocator 建立並掛在遞補日誌上 (MoveLog.provenance)，建立時只保存分發過程陣列的參照，
+    第一次查詢時才整理索引:
+    - 每位學生轉入最後所在社團的事件 (第幾次遞補或交換；志願只會越來越好，同一社團最多轉入一次)
+    - 每個社團最後的名額: 留在原社團的人數，與轉入的學生 (依填寫時間排序)
+    - 每個社團依發生順序的所有轉入事件 (club_entries)
+    之後 explain(學號) 每個志願只需一次二分搜尋，就能列出佔用名額且比該學生優先的學生。
+    - reasons: (學生數, 10) 的志願代碼，PASS 為參與分發，BLANK / UNKNOWN / DUPLICATE 為編譯時略過，
+      0 以上為命中的限制規則 (rule_labels 的索引)
+    """
+    PASS, BLANK, UNKNOWN, DUPLICATE = -1, -2, -3, -4
+    MAX_NAMES = 20 # 每個志願最多列出幾位佔用名額的學生
+    
+    def __init__(self, logs, swap_logs, original, assigned, rank, prefs, reasons, rule_labels, capacity):
+        self.logs = logs
+        self.swap_logs = swap_logs
+        self.original = np.asarray(original)
+        self.assigned = np.asarray(assigned)
+        self.rank = np.asarray(rank)
+        self.prefs = np.asarray(prefs)
+        self.reasons = np.asarray(reasons)
+        self.rule_labels = list(rule_labels)
+        self.capacity = np.asarray(capacity, dtype=np.int64)
+        self._index = None
+    
+    @classmethod
+    def from_table(cls, table, clubs, logs, swap_logs):
+        """由分發完成的 StudentTable 建立 (原因代碼的優先順序同 dropped_entries)"""
+        reasons = table.rule_hit.astype(np.int16)
+        reasons[table.duplicate] = cls.DUPLICATE
+        reasons[table.unknown] = cls.UNKNOWN
+        reasons[table.blank] = cls.BLANK
+        return cls(logs, swap_logs, table.original, table.assigned, table.rank, table.all_prefs, reasons,
+                   [rule.describe() for rule in table.rules], [c.capacity for c in clubs])
+    
+    def _events(self):
+        # 所有轉入事件 (學生, 轉入社團, 轉出社團, 事件代碼)；代碼 k > 0 為第 k 次遞補，-k 為第 k 筆交換
+        # 遞補在前、交換在後 (交換階段在遞補之後)
+        logs, swap_logs = self.logs, self.swap_logs
+        starts = np.array(swap_logs.starts, dtype=np.int64)
+        swap_from = np.array(swap_logs.clubs, dtype=np.int32)
+        nxt = np.arange(1, len(swap_from) + 1)
+        nxt[starts[1:] - 1] = starts[:-1] # 每筆交換的最後一位換到第一位的社團
+        return (np.concatenate([np.array(logs.students, dtype=np.int32), np.array(swap_logs.students, dtype=np.int32)]),
+                np.concatenate([np.array(logs.to_clubs, dtype=np.int32), swap_from[nxt]]),
+                np.concatenate([np.array(logs.from_clubs, dtype=np.int32), swap_from]),
+                np.concatenate([np.arange(1, len(logs) + 1), -np.repeat(np.arange(1, len(swap_logs) + 1), np.diff(starts))]))
+    
+    def _build(self):
+        if self._index is not None:
+            return self._index
+        num_clubs = self.logs.num_clubs
+        assigned = self.assigned
+        students, to_clubs, from_clubs, codes = self._events()
+        
+        # 1. 轉入最後所在社團的事件 (後面的覆蓋前面的)
+        entry = np.zeros(len(assigned), dtype=np.int64)
+        final = assigned[students] == to_clubs
+        entry[students[final]] = codes[final]
+        
+        # 2. 各社團最後的名額: 原社團留任人數、轉入者 (依社團分組，組內依填寫時間)
+        in_club = assigned < num_clubs
+        moved_in = in_club & (assigned != self.original)
+        stayed = np.bincount(assigned[in_club & ~moved_in], minlength=num_clubs)
+        rows = np.nonzero(moved_in)[0]
+        rows = rows[np.argsort(assigned[rows], kind='stable')]
+        bounds = np.searchsorted(assigned[rows], np.arange(num_clubs + 1))
+        
+        # 3. 各社團所有轉入事件 (依發生順序)
+        order = np.argsort(to_clubs, kind='stable')
+        event_bounds = np.searchsorted(to_clubs[order], np.arange(num_clubs + 1))
+        
+        self._index = {
+            'rows': {sid: idx for idx, sid in enumerate(self.logs.ids)},
+            'entry': entry, 'stayed': stayed, 'occupants': rows, 'bounds': bounds,
+            'events': (students[order], from_clubs[order], codes[order]), 'event_bounds': event_bounds,
+        }
+        return self._index
+    
+    def event_label(self, code):
+        """事件代碼轉成文字 (與遞補日誌、交換紀錄的序號相同)"""
+        if code > 0:
+            return f"遞補 #{code}"
+        if code < 0:
+            return f"{'循環交換' if self.swap_logs.cycles[-code - 1] else '交換'} #{-code}"
+        return "原社團"
+    
+    def _student(self, idx, code):
+        return f"{self.logs.names[idx]} ({self.logs.ids[idx]}，{self.event_label(code)})"
+    
+    def explain(self, student_id):
+        """
+        學生 (學號) 錄取的志願之前 (含) 每個有填寫的志願一列:
+        [志願序, 志願社團, 結果, 原因, 原社團留任, 較優先轉入, 較晚轉入, 佔用名額的較優先學生]
+        - 結果: 錄取 / 未錄取 / 留任 (填寫的是目前所在的原社團)
+        - 原因: 錄取時為轉入的事件；未錄取時為 額滿、不在缺額表、重複填寫或命中的限制規則 (Rule.describe())
+        - 額滿時列出最後佔用名額的人數: 留在原社團、比該學生早填寫而轉入 (列出姓名與第幾次遞補 / 交換)、較晚填寫而轉入
+        找不到學號時回傳 None
+        """
+        index = self._build()
+        idx = index['rows'].get(str(student_id).strip())
+        if idx is None:
+            return None
+        rank = int(self.rank[idx])
+        rows = []
+        for i in range(min(rank + 1, PREF_COLS)):
+            code = int(self.reasons[idx, i])
+            if code == self.BLANK:
+                continue
+            cid = int(self.prefs[idx, i])
+            row = {'志願序': i + 1, '志願社團': self.logs.club_names[cid], '結果': '未錄取', '原因': '',
+                   '原社團留任': None, '較優先轉入': None, '較晚轉入': None, '佔用名額的較優先學生': ''}
+            if i == rank:
+                row.update(結果='錄取', 原因=self.event_label(int(index['entry'][idx])))
+            elif code >= 0:
+                row['原因'] = self.rule_labels[code]
+            elif code != self.PASS:
+                row['原因'] = DROP_REASONS['unknown' if code == self.UNKNOWN else 'duplicate']
+            elif cid == self.assigned[idx]:
+                row.update(結果='留任', 原因='已在此社團 (原社團)')
+            else:
+                occupants = index['occupants'][index['bounds'][cid]:index['bounds'][cid + 1]]
+                earlier = occupants[:np.searchsorted(occupants, idx)]
+                stayed = int(index['stayed'][cid])
+                full = stayed + len(occupants) >= self.capacity[cid]
+                names = [self._student(k, index['entry'][k]) for k in earlier[:self.MAX_NAMES].tolist()]
+                if len(earlier) > self.MAX_NAMES:
+                    names.append(f"等 {len(earlier)} 人")
+                row.update(原因=f"額滿 (名額 {self.capacity[cid]} 個)" if full else "尚有空位",
+                           原社團留任=stayed, 較優先轉入=len(earlier), 較晚轉入=len(occupants) - len(earlier),
+                           佔用名額的較優先學生="、".join(names))
+            rows.append(row)
+        counts = ['原社團留任', '較優先轉入', '較晚轉入'] # 只有額滿的志願才有人數
+        return pd.DataFrame(rows, columns=['志願序', '志願社團', '結果', '原因'] + counts + ['佔用名額的較優先學生']).astype(
+            dict.fromkeys(counts, 'Int64'))
+    
+    def club_entries(self, club):
+        """
+        社團 (名稱) 依發生順序的所有轉入事件 [順序, 事件, 學號, 姓名, 轉出社團, 仍在社團]
+        (後來又轉出的學生也會列出)；不是社團時回傳 None
+        """
+        index = self._build()
+        cid = self.logs.club_names.index(club) if club in self.logs.club_names else -1
+        if not 0 <= cid < self.logs.num_clubs:
+            return None
+        lo, hi = index['event_bounds'][cid], index['event_bounds'][cid + 1]
+        students, from_clubs, codes = (values[lo:hi] for values in index['events'])
+        return pd.DataFrame({
+            '順序': np.arange(1, hi - lo + 1),
+            '事件': [self.event_label(code) for code in codes.tolist()],
+            '學號': [self.logs.ids[k] for k in students.tolist()],
+            '姓名': [self.logs.names[k] for k in students.tolist()],
+            '轉出社團': [self.logs.club_names[c] for c in from_clubs.tolist()],
+            '仍在社團': self.assigned[students] == cid,
+        })
+
+def ripple_allocate(table, clubs, logs, on_move=None, stats=None):
+    """
+    動態連鎖分發 (事件驅動版)
+    table 的列必須已依填寫時間排序。每個社團維護一條依填寫時間排序的候補佇列，
+    名額釋出時只喚醒該社團最早的有效候補者；每一步都由「目前有空位可去、且填寫時間最早」
+    的學生轉入他最好的可用志願。結果與「每移動一人就從第 1 位學生重新掃描」完全相同，
+    但不需要迭代上限。回傳移動次數。每次移動記入 logs (MoveLog)。
+    on_move(moves, idx): 每次移動後呼叫 (idx 為剛移動的學生順位)；stats 為 AllocationStats 時一併記錄計數。
+    """
+    choices = table.choices
+    assigned = table.assigned.tolist()
+    rank = table.rank.tolist()
+    
+    # 1. 建立候補佇列: 每位學生登記到各有效志願的社團 (編譯時已去除重複與無效的志願)
+    #    學生已依時間排序，因此依序 append 的佇列本身就是優先順序，不需再排序
+    pref_pos = table.first_positions()
+    waiting = [[] for _ in clubs]
+    for idx, pos in enumerate(pref_pos):
+        for cid in pos:
+            waiting[cid].append(idx)
+    head = [0] * len(clubs)
+    
+    def has_space(cid):
+        return clubs[cid].has_space()
+    
+    pref_checks = 0
+    
+    def still_waiting(idx, cid):
+        # 學生的名次只會越來越好，一旦不再候補此社團就永遠不會再回來
+        nonlocal pref_checks
+        pref_checks += 1
+        return pref_pos[idx][cid] < rank[idx]
+    
+    # ready: (學生順位, 社團ID) 的 min-heap，每個有空位的社團至少有一筆其最早候補者
+    ready = []
+    
+    def wake(cid):
+        if not has_space(cid):
+            return
+        queue = waiting[cid]
+        h = head[cid]
+        while h < len(queue) and not still_waiting(queue[h], cid):
+            h += 1
+        head[cid] = h
+        if h < len(queue):
+            heapq.heappush(ready, (queue[h], cid))
+    
+    for cid in range(len(clubs)):
+        wake(cid)
+    
+    moves = 0
+    scans = 0
+    while ready:
+        idx, cid = heapq.heappop(ready)
+        scans += 1
+        if not has_space(cid):
+            continue # 名額已被拿走，等有人離開時會再喚醒
+        if not still_waiting(idx, cid):
+            wake(cid) # 過期的候補，改喚醒下一位
+            continue
+        
+        # 此學生是目前「有任何可移動志願」的最早學生，轉入他最好的可用志願 (一定比目前錄取的志願好)
+        for checked, (i, target) in enumerate(choices[idx], 1):
+            if has_space(target):
+                break
+        pref_checks += checked
+        
+        # == 移動發生 ==
+        old = assigned[idx]
+        if table.is_club(old):
+            clubs[old].remove(idx)
+        clubs[target].add(idx)
+        assigned[idx] = target
+        rank[idx] = i
+        
+        moves += 1
+        logs.append(idx, old, target, i)
+        if on_move:
+            on_move(moves, idx)
+        
+        # 本社團的候補已被消耗，重新喚醒；舊社團釋出一個名額
+        wake(cid)
+        if table.is_club(old):
+            wake(old)
+    
+    table.assigned[:] = assigned
+    table.rank[:] = rank
+    if stats is not None:
+        stats.moves += moves
+        stats.scans += scans
+        stats.pref_checks += pref_checks
+    return moves
+
+def swap_optimize(table, clubs, swap_logs, cycles=False, stats=None, on_pass=None):
+    """
+    最佳化交換 (索引版)
+    依 (目前社團 → 想去社團) 建立候選索引，只檢查真的可能互換的學生。
+    掃描順序與原本的兩兩比對相同 (依填寫時間，每輪重複到沒有交換為止)，因此結果一致；
+    規則不變: 交換後雙方都必須嚴格變好，沒有人會變差。
+    cycles=True 時，兩兩交換收斂後再尋找三人以上的循環交換 (A→B→C→A)。
+    回傳檢查過的候選組數 (stats 為 AllocationStats 時一併記錄交換次數)。
+    on_pass(交換組數): 每輪兩兩交換、每次尋找循環後呼叫，用來回報進度；在其中拋出例外即可中止 (例如取消背景工作)。
+    """
+    assigned = table.assigned.tolist()
+    rank = table.rank.tolist()
+    pref_pos = table.first_positions()
+    
+    # buckets[(目前社團, 想去社團)] = 依填寫時間排序的學生順位
+    buckets = {}
+    
+    def desired(idx):
+        return [c for c, i in pref_pos[idx].items() if i < rank[idx] and c != assigned[idx]]
+    
+    def index(idx):
+        c = assigned[idx]
+        for d in desired(idx):
+            bisect.insort(buckets.setdefault((c, d), []), idx)
+    
+    def unindex(idx):
+        c = assigned[idx]
+        for d in desired(idx):
+            bucket = buckets[(c, d)]
+            del bucket[bisect.bisect_left(bucket, idx)]
+    
+    def move(idx, new_club):
+        # 換到 new_club (呼叫前須先 unindex，之後再 index)
+        if table.is_club(assigned[idx]):
+            clubs[assigned[idx]].remove(idx)
+        if table.is_club(new_club):
+            clubs[new_club].add(idx)
+        assigned[idx] = new_club
+        rank[idx] = pref_pos[idx][new_club]
+    
+    for idx in range(len(table)):
+        index(idx)
+    
+    checked = 0
+    swaps = 0
+    cycle_swaps = 0
+    
+    def pairwise_pass():
+        # 與原本 for s1 / for s2 的順序相同，但 s2 只從候選索引中取
+        nonlocal checked, swaps
+        swapped = False
+        for idx1 in range(len(table)):
+            if rank[idx1] == 0: continue # 已滿足第一志願
+            after = -1
+            while True:
+                c1 = assigned[idx1]
+                idx2 = None
+                for c2 in desired(idx1):
+                    bucket = buckets.get((c2, c1))
+                    if bucket:
+                        k = bisect.bisect_right(bucket, after)
+                        if k < len(bucket):
+                            checked += 1
+                            if idx2 is None or bucket[k] < idx2:
+                                idx2 = bucket[k]
+                if idx2 is None:
+                    break
+                
+                # == 執行交換 ==
+                c2 = assigned[idx2]
+                unindex(idx1)
+                unindex(idx2)
+                # 先移出再移入，社團名單順序與原本相同 (這裡其實不影響容量，只是交換人頭)
+                move(idx1, c2)
+                move(idx2, c1)
+                index(idx1)
+                index(idx2)
+                
+                swap_logs.append((idx1, idx2), (c1, c2))
+                swaps += 1
+                swapped = True
+                after = idx2
+        return swapped
+    
+    def rotate_cycle():
+        # 在社團圖 (目前社團 → 想去社團) 上找一個循環，每條邊取最早的學生，整圈一起移動
+        nonlocal checked, cycle_swaps
+        graph = {}
+        for (c, d), bucket in buckets.items():
+            if bucket:
+                graph.setdefault(c, []).append(d)
+                checked += 1
+        state = {}
+        for root in graph:
+            if root in state: continue
+            path = [root]
+            state[root] = 1
+            stack = [iter(graph[root])]
+            while stack:
+                d = next(stack[-1], None)
+                if d is None:
+                    state[path.pop()] = 2
+                    stack.pop()
+                elif state.get(d) == 1:
+                    cycle = path[path.index(d):]
+                    members = [buckets[(c, cycle[(k + 1) % len(cycle)])][0] for k, c in enumerate(cycle)]
+                    for idx in members:
+                        unindex(idx)
+                    for k, idx in enumerate(members):
+                        move(idx, cycle[(k + 1) % len(cycle)])
+                    for idx in members:
+                        index(idx)
+                    swap_logs.append(members, cycle, cycle=True)
+                    cycle_swaps += 1
+                    return True
+                elif d not in state:
+                    state[d] = 1
+                    path.append(d)
+                    stack.append(iter(graph.get(d, [])))
+        return False
+    
+    def report():
+        if on_pass:
+            on_pass(swaps + cycle_swaps)
+    
+    while True:
+        while True:
+            swapped = pairwise_pass()
+            report()
+            if not swapped:
+                break
+        if not cycles:
+            break
+        rotated = rotate_cycle()
+        report()
+        if not rotated:
+            break
+    
+    table.assigned[:] = assigned
+    table.rank[:] = rank
+    if stats is not None:
+        stats.swap_attempts += checked
+        stats.swaps += swaps
+        stats.cycle_swaps += cycle_swaps
+    return checked
+
+def exchange_allocate(table, clubs, logs, swap_logs, on_student=None, stats=None):
+    """
+    精確配對引擎 (時間優先交換鏈, YRMH-IGYT: "You Request My House - I Get Your Turn")
+    把每個名額當成一間房: 原社團成員持有自己的名額，缺額是空房，社團依填寫時間決定空房給誰。
+    依填寫時間輪到一位學生時，他要求最好的「還可能拿到」的志願:
+    - 該社團有空位: 直接轉入；要求鏈上的每個人依序拿到下一個人的名額，鏈首的原名額釋出成為空位
+    - 沒有空位但有尚未確定的原成員: 該成員先輪 (I get your turn)，推入要求鏈；
+      若該社團的成員已在鏈上，鏈尾形成循環，循環內的人一起交換名額
+    - 要求自己的原社團 (或志願用完): 留在原社團
+    結果保證沒有人比原社團差、沒有空位被浪費、不存在讓某人變好而無人變差的交換 (Pareto 最適)，
+    且填寫時間越早的學生越優先。每位學生的志願指標只會往後移動，總時間為 O(學生數 + 志願格數)。
+    鏈上的移動記入 logs (MoveLog)，兩人以上的循環記入 swap_logs (SwapLog)。
+    on_student(idx): 依填寫時間處理到第 idx 位學生時呼叫。回傳移動次數。
+    """
+    choices = table.choices
+    original = table.original.tolist()
+    assigned = table.assigned.tolist()
+    rank = table.rank.tolist()
+    n = len(table)
+    
+    vacant = [c.capacity - c.occupancy for c in clubs]
+    # 各社團尚未確定的原成員 (依填寫時間)，head 之前的都已確定
+    tenants = [[] for _ in clubs]
+    for idx, cid in enumerate(original):
+        if table.is_club(cid):
+            tenants[cid].append(idx)
+    head = [0] * len(clubs)
+    settled = [False] * n
+    ptr = [0] * n # 目前要求的是第幾個有效志願 (choices 中的位置)
+    chain = [] # 要求鏈: chain[j] 要求 chain[j+1] 的名額
+    position = [0] * n # 學生在要求鏈上的位置
+    on_chain = [[] for _ in clubs] # 各社團在鏈上的原成員 (與 chain 同為後進先出)
+    
+    moves = 0
+    swaps = 0
+    cycle_swaps = 0
+    requests = 0
+    pref_checks = 0
+    
+    def transfer(idx, target):
+        if table.is_club(assigned[idx]):
+            clubs[assigned[idx]].remove(idx)
+        clubs[target].add(idx)
+        assigned[idx] = target
+        rank[idx] = choices[idx][ptr[idx]][0]
+    
+    def waiting_tenant(cid):
+        # 最早的未確定原成員 (已確定的直接跳過，永遠不會再回來)
+        queue = tenants[cid]
+        h = head[cid]
+        while h < len(queue) and settled[queue[h]]:
+            h += 1
+        head[cid] = h
+        return queue[h] if h < len(queue) else -1
+    
+    def push(idx):
+        position[idx] = len(chain)
+        chain.append(idx)
+        if table.is_club(original[idx]):
+            on_chain[original[idx]].append(idx)
+    
+    def settle(members):
+        for idx in members:
+            settled[idx] = True
+            if table.is_club(original[idx]):
+                on_chain[original[idx]].pop()
+    
+    for first in range(n):
+        if settled[first]:
+            continue
+        if on_student:
+            on_student(first)
+        push(first)
+        while chain:
+            idx = chain[-1]
+            own = original[idx]
+            # 找出目前最好的、還可能拿到的志願
+            target = -1
+            row = choices[idx]
+            while ptr[idx] < len(row):
+                cid = row[ptr[idx]][1]
+                pref_checks += 1
+                if cid == own:
+                    break # 寧可留在原社團，也不去後面的志願
+                if vacant[cid] > 0 or on_chain[cid] or waiting_tenant(cid) >= 0:
+                    target = cid
+                    break
+                ptr[idx] += 1
+            requests += 1
+            
+            if target < 0:
+                # 留在原社團 (自己一人的循環)；沒有原社團的學生維持未分發
+                chain.pop()
+                settle([idx])
+            elif vacant[target] > 0:
+                # 鏈尾轉入空位，其餘的人依序補上下一個人的名額 (與遞補相同的順序記錄)
+                vacant[target] -= 1
+                for j in range(len(chain) - 1, -1, -1):
+                    member = chain[j]
+                    new = target if j == len(chain) - 1 else original[chain[j + 1]]
+                    old = assigned[member]
+                    transfer(member, new)
+                    logs.append(member, old, new, rank[member])
+                    moves += 1
+                if table.is_club(original[chain[0]]):
+                    vacant[original[chain[0]]] += 1 # 鏈首的原名額釋出
+                settle(reversed(chain))
+                chain.clear()
+            elif on_chain[target]:
+                # 形成循環: 從該社團在鏈上的成員到鏈尾，每人拿到下一個人的名額
+                # (鏈尾要的不是自己的原社團，所以循環至少兩人)
+                start = position[on_chain[target][-1]]
+                members = chain[start:]
+                cycle_clubs = [original[m] for m in members]
+                for k, member in enumerate(members):
+                    clubs[cycle_clubs[k]].remove(member)
+                for k, member in enumerate(members):
+                    new = cycle_clubs[(k + 1) % len(members)]
+                    clubs[new].add(member)
+                    assigned[member] = new
+                    rank[member] = choices[member][ptr[member]][0]
+                swap_logs.append(members, cycle_clubs, cycle=len(members) > 2)
+                if len(members) > 2:
+                    cycle_swaps += 1
+                else:
+                    swaps += 1
+                del chain[start:]
+                settle(reversed(members))
+            else:
+                # 社團已滿: 最早的未確定原成員先輪
+                push(waiting_tenant(target))
+    
+    table.assigned[:] = assigned
+    table.rank[:] = rank
+    if stats is not None:
+        stats.moves += moves
+        stats.swaps += swaps
+        stats.cycle_swaps += cycle_swaps
+        stats.scans += requests
+        stats.pref_checks += pref_checks
+    return moves
+
+def flow_optimize(table, clubs, logs, swap_logs, objective='sum', time_budget=None, on_cycle=None, stats=None):
+    """
+    最小成本流最佳化 (取代交換階段)
+    把整個重新分配視為社團之間的最小成本循環流: 每位學生可以換到「不比目前結果差」的任何社團
+    (志願序不超過目前錄取的志願，或留在目前的社團)，社團人數不超過容量。
+    從目前的分配出發，反覆以 Bellman-Ford 在社團圖上找負成本循環並沿循環移動學生，直到沒有負循環 (即最佳解)。
+    - 圖的節點: 各社團、NONE (沒有社團的學生)、SLACK (空位: SLACK→社團 代表該社團少一人，社團→SLACK 代表占用一個空位)
+    - 社團 u→v 的邊: 目前在 u、可以換到 v 的學生中成本增加最少的一位 (各邊以 heap 維護，學生移動後才更新)
+    objective='sum' 時最小化志願序總和 (最大化整體滿意度)；'lex' 時依志願序優先 (rank-maximal):
+    先讓最多人錄取第 1 志願，其次第 2 志願...，以大整數權重精確比較。
+    time_budget (秒) 用完時停在目前的分配 (仍保證沒有人變差)。on_cycle(改善次數) 在每次改善後呼叫。
+    每找一次負循環為 O(社團數^3)，循環次數不超過總成本可下降的量，與交換需要跑幾輪無關。
+    紀錄的是最後相對於開始時的淨變化 (中途換過又換回的不記): 占用空位的連鎖移動記入 logs，
+    社團之間的循環記入 swap_logs。回傳 (改善次數, 是否在時間內完成)。
+    """
+    started = time.perf_counter()
+    k = table.num_clubs
+    NONE, SLACK = k, k + 1
+    size = k + 2
+    assigned = table.assigned.tolist()
+    start = list(assigned)
+    original = table.original.tolist()
+    rank = table.rank.tolist()
+    pref_pos = table.first_positions()
+    
+    def node(cid):
+        return cid if table.is_club(cid) else NONE
+    
+    def level(idx, cid):
+        # 志願序 (0 起算)；不在志願中的目前社團 (原社團或沒有社團) 視為比所有志願都差
+        return pref_pos[idx].get(cid, PREF_COLS) if table.is_club(cid) else PREF_COLS
+    
+    if objective == 'lex':
+        # 一條路徑最多經過 size 位學生，每一層的人數變化不超過 size，因此以 2*size+1 為進位即可精確比較
+        base = 2 * size + 1
+        weights = [-(base ** (PREF_COLS - r)) for r in range(PREF_COLS + 1)]
+        dtype, INF = object, float('inf')
+    else:
+        weights = list(range(PREF_COLS + 1))
+        dtype, INF = np.int64, np.int64(2**62)
+    
+    # 每位學生可去的節點與成本: 不比目前結果差 (第一次出現的志願序 <= 目前的志願序)
+    options = {}
+    for idx in range(len(table)):
+        limit = level(idx, assigned[idx])
+        choices = {node(assigned[idx]): (assigned[idx], weights[limit])}
+        for cid, i in pref_pos[idx].items():
+            if i <= limit:
+                choices.setdefault(cid, (cid, weights[i]))
+        if len(choices) > 1:
+            options[idx] = choices
+    
+    free = [c.capacity - c.occupancy for c in clubs] + [len(table), 0] # NONE 沒有人數上限
+    W = np.full((size, size), INF, dtype=dtype)
+    heaps = {}
+    version = [0] * len(table)
+    
+    def push_arcs(idx):
+        u = node(assigned[idx])
+        current = options[idx][u][1]
+        for v, (_, cost) in options[idx].items():
+            if v != u:
+                delta = cost - current
+                heapq.heappush(heaps.setdefault((u, v), []), (delta, idx, version[idx]))
+                if delta < W[u, v]:
+                    W[u, v] = delta
+    
+    def best(u, v):
+        heap = heaps.get((u, v))
+        while heap and heap[0][2] != version[heap[0][1]]:
+            heapq.heappop(heap) # 學生已移動，過期的邊
+        return heap[0] if heap else None
+    
+    def refresh(u, v):
+        top = best(u, v)
+        W[u, v] = top[0] if top else INF
+    
+    def refresh_slack(u):
+        W[SLACK, u] = 0
+        W[u, SLACK] = 0 if free[u] > 0 else INF
+    
+    for idx in options:
+        push_arcs(idx)
+    for u in range(k + 1):
+        refresh_slack(u)
+    
+    def negative_cycle():
+        # Bellman-Ford (所有節點距離從 0 開始)；前驅圖一出現循環就是負循環
+        dist = np.zeros(size, dtype=dtype)
+        pred = np.full(size, -1, dtype=np.int64)
+        for _ in range(size):
+            cand = dist[:, None] + W
+            arg = cand.argmin(axis=0)
+            low = cand[arg, np.arange(size)]
+            better = np.nonzero(low < dist)[0]
+            if len(better) == 0:
+                return None
+            dist[better] = low[better]
+            pred[better] = arg[better]
+            parent = pred.tolist()
+            seen = [0] * size
+            for start in better.tolist():
+                v = start
+                while v >= 0 and not seen[v]:
+                    seen[v] = start + 1
+                    v = parent[v]
+                if v >= 0 and seen[v] == start + 1:
+                    cycle = [v] # 依前驅往回走，反轉後為邊的方向
+                    u = parent[v]
+                    while u != v:
+                        cycle.append(u)
+                        u = parent[u]
+                    return cycle[::-1]
+            if time_budget is not None and time.perf_counter() - started > time_budget:
+                return None
+        return None
+    
+    improved = 0
+    finished = True
+    while True:
+        if time_budget is not None and time.perf_counter() - started > time_budget:
+            finished = False
+            break
+        cycle = negative_cycle()
+        if cycle is None:
+            finished = time_budget is None or time.perf_counter() - started <= time_budget
+            break
+        # 由 SLACK 之後的節點開始排列，經過 SLACK 的是一條鏈 (第一個社團少一人，最後一人占用空位)
+        chain = SLACK in cycle
+        if chain:
+            at = cycle.index(SLACK)
+            cycle = cycle[at + 1:] + cycle[:at]
+            arcs = list(zip(cycle, cycle[1:]))
+        else:
+            arcs = list(zip(cycle, cycle[1:] + cycle[:1]))
+        movers = [best(u, v)[1] for u, v in arcs]
+        
+        for idx in movers:
+            if table.is_club(assigned[idx]):
+                clubs[assigned[idx]].remove(idx)
+        for idx, (u, v) in zip(movers, arcs):
+            new = options[idx][v][0]
+            if table.is_club(new):
+                clubs[new].add(idx)
+            assigned[idx] = new
+            rank[idx] = NO_RANK if new == original[idx] else pref_pos[idx][new]
+            version[idx] += 1
+        for idx, (u, v) in zip(movers, arcs):
+            for w in options[idx]:
+                if w != u:
+                    refresh(u, w)
+            push_arcs(idx)
+        if chain:
+            free[arcs[0][0]] += 1
+            free[arcs[-1][1]] -= 1
+            refresh_slack(arcs[0][0])
+            refresh_slack(arcs[-1][1])
+        improved += 1
+        if on_cycle:
+            on_cycle(improved)
+    
+    # 將淨變化拆成連鎖 (從淨減少人數的社團出發) 與循環
+    leaving = {}
+    arriving = {}
+    for idx in range(len(table)):
+        if assigned[idx] != start[idx]:
+            leaving.setdefault(node(start[idx]), []).append(idx)
+            arriving[node(assigned[idx])] = arriving.get(node(assigned[idx]), 0) + 1
+    excess = {u: len(out) - arriving.get(u, 0) for u, out in leaving.items()}
+    while leaving:
+        head = next((u for u, extra in excess.items() if extra > 0), None)
+        u = head if head is not None else next(iter(leaving))
+        path = [] # 依序移動的學生，每人轉入下一人離開的社團
+        seen = {}
+        while leaving.get(u) and u not in seen:
+            seen[u] = len(path)
+            idx = leaving[u].pop()
+            if not leaving[u]:
+                del leaving[u]
+            path.append(idx)
+            u = node(assigned[idx])
+        if u in seen:
+            # 回到走過的社團: 從該處起為一個循環，之前的部分放回去之後再處理
+            loop = path[seen[u]:]
+            for idx in path[:seen[u]]:
+                leaving.setdefault(node(start[idx]), []).append(idx)
+            swap_logs.append(loop, [start[idx] for idx in loop], cycle=len(loop) > 2)
+        else:
+            # 連鎖: 最後一人占用空位，依遞補的順序 (由後往前) 記錄
+            excess[head] -= 1
+            for idx in reversed(path):
+                logs.append(idx, start[idx], assigned[idx], rank[idx])
+    
+    table.assigned[:] = assigned
+    table.rank[:] = rank
+    if stats is not None:
+        stats.flow_cycles += improved
+        stats.flow_timeouts += 0 if finished else 1
+    return improved, finished
+
+def build_results(table):
+    """分發結果表: 每位學生一列，錄取志願序為 1 起算的整數 (未錄取任何志願為「未轉社」)"""
+    club_names = np.array(table.club_names, dtype=object)
+    moved = table.assigned != table.original
+    admitted = table.rank.astype(np.int64) + 1
+    unplaced = table.rank == NO_RANK
+    if unplaced.any():
+        admitted = admitted.astype(object) # 整數與文字混合的欄位
+        admitted[unplaced] = '未轉社'
+    return pd.DataFrame({
+        '學號': table.ids,
+        '姓名': table.names,
+        '班級': table.class_strs,
+        '原社團': club_names[table.original],
+        '分發結果': club_names[table.assigned],
+        '錄取志願序': admitted,
+        '狀態': np.where(moved, '成功', '未變更').astype(object),
+    })
+
+def split_results(result_df):
+    """依狀態一次切出 (成功名單, 未變更名單)"""
+    moved = (result_df['狀態'] == '成功').to_numpy()
+    return result_df[moved], result_df[~moved]
+
+def replay_moves(table, clubs, logs, old_capacity, old_prefs, old_log, old_steps=None):
+    """
+    增量重算: 依序重播前一次的遞補 (old_log 的前 old_steps 步)，直到第一個「這次會不一樣」的步驟為止，回傳沿用的步數。
+    table 須為初始狀態、clubs 已放入原社團並算好新容量。某一步會不同的情況:
+    - 這位學生的該志願被新的限制擋掉，或轉入的社團在新缺額下已經沒有空位
+    - 某個增加缺額的社團原本已滿、現在有空位，而有更早 (或同一位但更想去) 的學生在候補它
+    解除限制會讓學生多出新的選擇，無法逐步判斷，因此直接從頭分發 (回傳 0)。
+    """
+    if ((old_prefs < 0) & (table.prefs >= 0)).any():
+        return 0
+    prefs = table.prefs.tolist()
+    assigned = table.assigned.tolist()
+    rank = table.rank.tolist()
+    
+    # 增加缺額的社團: 依填寫時間排列的候補名單 (學生順位, 第一次出現的志願序)
+    gained = {}
+    for cid, c in enumerate(clubs):
+        if c.capacity > old_capacity[cid]:
+            hit = table.prefs == cid
+            rows = np.nonzero(hit.any(axis=1))[0]
+            gained[cid] = [list(zip(rows.tolist(), hit[rows].argmax(axis=1).tolist())), 0]
+    
+    steps = 0
+    history = zip(old_log.students, old_log.from_clubs, old_log.to_clubs, old_log.ranks)
+    for idx, old, new, r in itertools.islice(history, old_steps):
+        if prefs[idx][r] != new or not clubs[new].has_space():
+            break
+        diverged = False
+        for cid, (queue, h) in gained.items():
+            c = clubs[cid]
+            if c.occupancy < old_capacity[cid] or not c.has_space():
+                continue # 前一次也有空位，或這次同樣沒有空位: 不影響這一步
+            while h < len(queue) and queue[h][1] >= rank[queue[h][0]]:
+                h += 1 # 名次只會越來越好，不再候補的學生永遠不會回來
+            gained[cid][1] = h
+            if h < len(queue) and (queue[h][0] < idx or (queue[h][0] == idx and queue[h][1] < r)):
+                diverged = True
+                break
+        if diverged:
+            break
+        
+        if table.is_club(old):
+            clubs[old].remove(idx)
+        clubs[new].add(idx)
+        assigned[idx] = new
+        rank[idx] = r
+        logs.append(idx, old, new, r)
+        steps += 1
+    
+    table.assigned[:] = assigned
+    table.rank[:] = rank
+    return steps
+
+def free_seats(clubs):
+    """目前所有社團的空位總數 (進度回報用)"""
+    return sum(max(c.capacity - c.occupancy, 0) for c in clubs)
+
+def process_allocation(students_df, clubs_df, h1_forbidden=[], h2_forbidden=[], h1_ban_all=False, h2_ban_all=False, swap_cycles=False, on_progress=None, engine='ripple',
+                       optimizer='swap', time_budget=FLOW_TIME_BUDGET, rules=()):
+    """
+    執行轉社分發邏輯 (Columnar Version)
+    包含: 動態遞補 (Ripple Effect) + 最佳化交換 (Swapping) + 完整過程紀錄
+    swap_cycles=True 時，交換階段另外嘗試三人以上的循環交換
+    engine='exact' 時改用精確配對引擎 (exchange_allocate)，不需要交換階段，swap_cycles 不影響結果
+    optimizer='sum' / 'lex' 時以最小成本流 (flow_optimize) 取代交換階段，time_budget 為其時間預算 (秒)
+    on_progress(text, percent): 選填的進度回報 (percent 為 0~100 或 None)，由介面端決定如何顯示
+    rules: 額外的限制規則 (rules.Rule 的 list)，與高一 / 高二設定一起套用
+    回傳 (分發結果, 剩餘缺額, 遞補日誌 MoveLog, 交換紀錄 SwapLog, AllocationStats)；
+    遞補日誌的 provenance 為落榜原因索引 (Provenance.explain(學號))
+    """
+    return Allocator(students_df).run(clubs_df, h1_forbidden, h2_forbidden, h1_ban_all, h2_ban_all,
+                                      swap_cycles=swap_cycles, on_progress=on_progress, engine=engine,
+                                      optimizer=optimizer, time_budget=time_budget, rules=rules)
+
+class Allocator:
+    """
+    可重複執行的分發器 (增量重算)
+    同一份學生資料只建立一次 StudentTable。之後只修改缺額或新增限制時，重播前一次的遞補紀錄，
+    找出第一個會因為變更而不同的步驟，之前的移動直接套用，之後再接續事件驅動分發。
+    遞補每一步只取決於當下狀態 (最早有空位可去的學生轉入最好的可用志願)，所以結果與整個重跑完全相同。
+    社團名單改變或解除限制時，仍會沿用學生資料表，但遞補從頭開始。交換階段每次都完整執行。
+    精確配對引擎本身就是線性時間，每次都完整執行，也不會覆蓋遞補引擎可沿用的紀錄。
+    """
+    def __init__(self, students):
+        """students: 學生資料表，或已整理好的 StudentInput (例如由快照載入)"""
+        if not isinstance(students, StudentInput):
+            students = StudentInput.from_frame(students)
+        self.students = students
+        self.original_clubs = students.original_clubs()
+        self.table = None
+        self._last = None # 前一次的 (各社團容量, 志願矩陣, 遞補日誌)
+    
+    def build_clubs(self, clubs_df):
+        clubs = {}
+        # 1. 建立社團物件 (從缺額設定)
+        # 確保社團名稱唯一: 名稱先正規化 (全形/半形、空白)，空白的名稱略過
+        if '社團名稱' in clubs_df.columns:
+            # 加總重複的社團缺額 (防呆)
+            grouped_clubs = clubs_df['目前缺額'].groupby(clubs_df['社團名稱'].map(normalize_club_name).to_numpy()).sum()
+            for c_name, vac in grouped_clubs.items():
+                if c_name != NO_CLUB:
+                    clubs[c_name] = Club(c_name, vac)
+        else:
+            # Fallback
+            for c_name, vac in clubs_df['目前缺額'].items():
+                c_name = normalize_club_name(c_name)
+                if c_name != NO_CLUB:
+                    clubs[c_name] = Club(c_name, vac)
+        
+        # 2. 原社團不在缺額表中的，新增一個 initial_vacancy=0 的社團
+        for c_name in self.original_clubs:
+            if c_name != NO_CLUB and c_name not in clubs:
+                clubs[c_name] = Club(c_name, 0)
+        return clubs
+    
+    def compile(self, clubs_df, h1_forbidden=[], h2_forbidden=[], h1_ban_all=False, h2_ban_all=False, rules=()):
+        """
+        輸入編譯 (上傳與分發之間): 建立社團、正規化社團名稱、將每個志願解析成社團 ID 並去除永遠不可能錄取的志願，
+        再套用限制。社團名單與前一次相同時沿用學生資料表，只重新套用限制。
+        回傳 (StudentTable, {社團名稱: Club})；被略過的志願見 StudentTable.dropped_entries()
+        """
+        clubs = self.build_clubs(clubs_df)
+        table = self.table
+        if table is None or list(clubs) != table.club_names[:table.num_clubs]:
+            table = self.table = StudentTable(self.students, clubs, h1_forbidden, h2_forbidden, h1_ban_all, h2_ban_all, rules)
+            self._last = None # 社團 ID 已改變，前一次的遞補紀錄不能沿用
+        else:
+            table.apply_restrictions(h1_forbidden, h2_forbidden, h1_ban_all, h2_ban_all, rules)
+        return table, clubs
+    
+    def run(self, clubs_df, h1_forbidden=[], h2_forbidden=[], h1_ban_all=False, h2_ban_all=False, swap_cycles=False, on_progress=None, engine='ripple',
+            optimizer='swap', time_budget=FLOW_TIME_BUDGET, rules=()):
+        """參數與回傳值同 process_allocation；第二次以後的呼叫會盡量沿用前一次的遞補過程"""
+        if engine not in ENGINES:
+            raise ValueError(f"未知的分發引擎: {engine} (可用: {', '.join(ENGINES)})")
+        if optimizer not in OPTIMIZERS:
+            raise ValueError(f"未知的最佳化方式: {optimizer} (可用: {', '.join(OPTIMIZERS)})")
+        
+        # --- A. 初始化環境 ---
+        stats = AllocationStats()
+        # 3. 輸入編譯: 建立學生資料表 (社團名單相同時只需重新套用限制)
+        table, clubs = self.compile(clubs_df, h1_forbidden, h2_forbidden, h1_ban_all, h2_ban_all, rules)
+        previous = self._last
+        logs = MoveLog(table)
+        swap_logs = SwapLog(table)
+        clubs = list(clubs.values()) # 之後一律以社團 ID 存取
+        
+        # 將學生放入原社團名單 (如果原社團有效)
+        for idx, cid in enumerate(table.original.tolist()):
+            if table.is_club(cid):
+                clubs[cid].add(idx)
+                
+        # 4. 計算社團總容量 (Capacity)
+        # 容量 = 該社團初始缺額 + 該社團的初始原有學生數
+        for c in clubs:
+            c.capacity = c.initial_vacancy + c.occupancy
+        stats.students = len(table)
+        stats.dropped_prefs = table.num_dropped
+        stats.lap('setup')
+        
+        def report(text, percent=None):
+            if on_progress:
+                on_progress(text, percent)
+        
+        if engine == 'exact':
+            # --- B'. 精確配對 (取代 B、C) ---
+            # 進度: 依填寫時間處理到第幾位學生 (0~95%)
+            progress = {'percent': 0}
+            def on_student(idx):
+                percent = 95 * idx // len(table)
+                if percent > progress['percent']:
+                    progress['percent'] = percent
+                    report(f"正在進行精確配對 (處理到第 {idx + 1}/{len(table)} 位學生，剩餘缺額 {free_seats(clubs)} 個)...", percent)
+            
+            report("開始精確配對...", 0)
+            exchange_allocate(table, clubs, logs, swap_logs, on_student=on_student, stats=stats)
+            stats.longest_chain = logs.longest_chain()
+            stats.lap('match')
+            report(f"精確配對完成 (轉入空位 {stats.moves} 次，交換 {len(swap_logs)} 組)", 80)
+        else:
+            self._ripple(table, clubs, logs, stats, previous, report)
+        
+        # --- C. 最佳化 (Post-Optimization) ---
+        if optimizer != 'swap':
+            # 最小成本流: 整體重新分配，沒有人比上一階段的結果差
+            report(f"進行最小成本流最佳化 ({OPTIMIZERS[optimizer]})...", 80)
+            improved, finished = flow_optimize(
+                table, clubs, logs, swap_logs, objective=optimizer, time_budget=time_budget, stats=stats,
+                on_cycle=lambda n: report(f"進行最小成本流最佳化 ({OPTIMIZERS[optimizer]}，已改善 {n} 次)..."))
+            stats.lap('flow')
+            note = "" if finished else f"，已達時間預算 {time_budget} 秒"
+            report(f"最小成本流最佳化完成 (改善 {improved} 次{note})", 95)
+        elif engine == 'ripple':
+            report(f"進行交換最佳化... (遞補 {stats.moves} 次，最長連鎖 {stats.longest_chain} 人)", 80)
+            checked = swap_optimize(table, clubs, swap_logs, cycles=swap_cycles, stats=stats,
+                                    on_pass=lambda n: report(f"進行交換最佳化... (已交換 {n} 組)"))
+            stats.lap('swap')
+            report(f"交換最佳化完成 (檢查 {checked} 組候選)", 95)
+        
+        # --- D. 整理結果 (直接由陣列組成各欄) ---
+        result_df = build_results(table)
+        
+        # 計算剩餘缺額
+        remaining = np.array([c.capacity - c.occupancy for c in clubs], dtype=np.int64)
+        vac_df = pd.DataFrame({'社團名稱': [c.name for c in clubs], '剩餘缺額': np.maximum(remaining, 0)})
+        logs.provenance = Provenance.from_table(table, clubs, logs, swap_logs)
+        stats.lap('results')
+        report("分發完成", 100)
+        return result_df, vac_df, logs, swap_logs, stats
+    
+    def _ripple(self, table, clubs, logs, stats, previous, report):
+        # --- B. 動態連鎖分發 (Chain Reaction) ---
+        if previous is not None:
+            stats.reused_moves = replay_moves(table, clubs, logs, *previous)
+            stats.moves += stats.reused_moves
+            report(f"沿用前次結果的前 {stats.reused_moves} 次遞補", 0)
+        
+        # 進度: 動態遞補佔 0~80%，以「已處理到第幾位學生」估計 (遞補會回頭處理較早的學生，所以取最遠的位置)；
+        # 只在百分比改變時回報，避免拖慢效能
+        progress = {'furthest': -1, 'percent': 0}
+        def on_move(moves, idx):
+            if idx <= progress['furthest']:
+                return
+            progress['furthest'] = idx
+            percent = 80 * (idx + 1) // len(table)
+            if percent > progress['percent']:
+                progress['percent'] = percent
+                report(f"正在進行動態分發 (已完成 {moves} 次遞補，處理到第 {idx + 1}/{len(table)} 位學生，"
+                       f"剩餘缺額 {free_seats(clubs)} 個)...", percent)
+        
+        report("開始動態分發...", 0)
+        ripple_allocate(table, clubs, logs, on_move=on_move, stats=stats)
+        stats.longest_chain = logs.longest_chain()
+        # 最小成本流可能在 logs 之後再加入移動，因此一併記下遞補的步數
+        self._last = ([c.capacity for c in clubs], table.prefs, logs, len(logs))
+        stats.lap('ripple')
+
+# --- 2. 結果快取 (Result Cache) ---
+RESULT_CACHE_SIZE = 8 # 最多保留幾組分發結果
+
+class ResultCache:
+    """
+    分發結果快取 (LRU)
+    以輸入內容的雜湊為 key，超過 max_entries 時淘汰最久沒用到的結果。
+    多位使用者共用同一個 Streamlit 伺服器，因此存取時需加鎖。
+    """
+    def __init__(self, max_entries=RESULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+def allocation_key(students_key, clubs_df, h1_forbidden=[], h2_forbidden=[], h1_ban_all=False, h2_ban_all=False, swap_cycles=False, engine='ripple',
+                   optimizer='swap', time_budget=FLOW_TIME_BUDGET, rules=()):
+    """
+    分發結果的快取 key: 學生檔內容雜湊 + 缺額表內容 + 高一/高二限制設定 + 分發引擎與最佳化方式 + 限制規則
+    (禁止社團的勾選順序不影響結果，因此先排序；沒有額外規則時 key 與先前的版本相同)
+    """
+    h = hashlib.sha256(students_key.encode())
+    h.update(repr(list(clubs_df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(clubs_df, index=False).values.tobytes())
+    settings = (sorted(map(str, h1_forbidden)), sorted(map(str, h2_forbidden)), bool(h1_ban_all), bool(h2_ban_all), bool(swap_cycles), engine,
+                optimizer, time_budget if optimizer != 'swap' else None)
+    if rules:
+        settings += ([rule.to_dict() for rule in rules],)
+    h.update(repr(settings).encode())
+    return h.hexdigest()
+
+# --- 3. 輸入檢查與匯出 (Input Validation & Export) ---
+REQUIRED_COLUMNS = ['學號', '班級', '填寫時間', '原社團'] # 姓名不再是必填
+STUDENT_COLUMNS = REQUIRED_COLUMNS + ['姓名'] + [f'志願{i}' for i in range(1, PREF_COLS + 1)] # 分發會用到的欄位
+
+class InputError(ValueError):
+    """學生資料格式錯誤: missing 為缺少的必要欄位，duplicates 為重複的學號"""
+    def __init__(self, message, missing=(), columns=(), duplicates=()):
+        super().__init__(message)
+        self.missing = list(missing)
+        self.columns = list(columns)
+        self.duplicates = list(duplicates)
+
+def missing_columns(columns):
+    return [c for c in REQUIRED_COLUMNS if c not in columns]
+
+def duplicate_ids(students_df):
+    return list(students_df[students_df['學號'].duplicated()]['學號'].unique())
+
+def prepare_students(students_df):
+    """
+    整理學生資料 (會直接修改傳入的 DataFrame 並回傳)
+    清除欄位名稱前後空白、補上姓名欄、學號轉字串；必要欄位缺漏或學號重複時丟出 InputError。
+    """
+    # 清除欄位名稱前後空白 (避免使用者不小心多打空白)
+    students_df.columns = students_df.columns.str.strip()
+    missing = missing_columns(students_df.columns)
+    if missing:
+        raise InputError(f"缺少必要欄位: {missing}", missing=missing, columns=students_df.columns)
+    dup_ids = duplicate_ids(students_df)
+    if dup_ids:
+        raise InputError(f"發現重複學號，無法處理: {dup_ids}", duplicates=dup_ids)
+    # 若無姓名欄位，自動填補 (為了顯示方便)
+    if '姓名' not in students_df.columns:
+        students_df['姓名'] = ""
+    # 再次確保學號轉為字串比較安全
+    students_df['學號'] = students_df['學號'].astype(str).str.strip()
+    return students_df
+
+def prepare_vacancies(clubs_df):
+    """取出 [社團名稱, 目前缺額] 並將缺額轉成整數 (無法辨識的值視為 0)"""
+    if '社團名稱' not in clubs_df.columns or '目前缺額' not in clubs_df.columns:
+        raise ValueError("缺額表需包含 [社團名稱, 目前缺額]")
+    clubs_df = clubs_df[['社團名稱', '目前缺額']].copy()
+    clubs_df['目前缺額'] = pd.to_numeric(clubs_df['目前缺額'], errors='coerce').fillna(0).astype(int)
+    return clubs_df
+
+# 匯出的工作表 (依此順序)；遞補日誌、交換紀錄與執行統計只在有資料時匯出
+EXPORT_SHEETS = ['分發結果', '剩餘缺額', '成功名單', '遞補日誌', '交換紀錄', '執行統計']
+
+def _export_builders(result_df, vac_df, logs, swap_logs, stats):
+    builders = {
+        '分發結果': lambda: result_df,
+        '剩餘缺額': lambda: vac_df,
+        '成功名單': lambda: split_results(result_df)[0],
+    }
+    if logs:
+        builders['遞補日誌'] = logs.to_frame
+    if swap_logs:
+        builders['交換紀錄'] = swap_logs.to_frame
+    if stats is not None:
+        builders['執行統計'] = stats.to_frame
+    return builders
+
+def available_sheets(logs, swap_logs, stats=None):
+    """這次結果可以匯出的工作表 (依 EXPORT_SHEETS 順序)"""
+    builders = _export_builders(None, None, logs, swap_logs, stats)
+    return [name for name in EXPORT_SHEETS if name in builders]
+
+def export_tables(result_df, vac_df, logs, swap_logs, stats=None, sheets=None):
+    """
+    依 EXPORT_SHEETS 的順序回傳 {工作表名稱: DataFrame}
+    sheets 為要匯出的工作表 (預設全部)；只有被選到的表才會建立，日誌表格不會白做。
+    """
+    builders = _export_builders(result_df, vac_df, logs, swap_logs, stats)
+    wanted = EXPORT_SHEETS if sheets is None else sheets
+    return {name: builders[name]() for name in EXPORT_SHEETS if name in wanted and name in builders}
+
+def _write_sheet(workbook, name, df, header_format):
+    # constant_memory 模式只能逐列往下寫，因此直接以 write_row 寫入 (pandas 的 to_excel 是逐欄寫入)
+    worksheet = workbook.add_worksheet(name)
+    worksheet.write_row(0, 0, [str(c) for c in df.columns], header_format)
+    columns = [df[c].tolist() for c in df.columns] # 轉成 Python 原生型別
+    for r, row in enumerate(zip(*columns), start=1):
+        worksheet.write_row(r, 0, [None if v != v else v for v in row]) # NaN 寫成空白格
+
+def write_workbook(target, result_df, vac_df, logs, swap_logs, stats=None, sheets=None):
+    """
+    將分發結果寫成 Excel (target 可為檔案路徑或 BytesIO)；有 stats 時另附「執行統計」工作表
+    以 xlsxwriter 的 constant_memory 模式逐列寫出，記憶體用量不隨資料列數增加。sheets 可指定要匯出的工作表。
+    """
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(target, {'constant_memory': True})
+    try:
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+        for name, df in export_tables(result_df, vac_df, logs, swap_logs, stats, sheets).items():
+            _write_sheet(workbook, name, df, header_format)
+    finally:
+        workbook.close()
+
+def write_csv_zip(target, result_df, vac_df, logs, swap_logs, stats=None, sheets=None):
+    """將每個工作表寫成一個 CSV (UTF-8 含 BOM，Excel 可直接開啟) 並打包成 ZIP，比 Excel 快得多"""
+    import zipfile
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, df in export_tables(result_df, vac_df, logs, swap_logs, stats, sheets).items():
+            archive.writestr(f"{name}.csv", df.to_csv(index=False).encode('utf-8-sig'))
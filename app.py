@@ -1,248 +1,83 @@
 import streamlit as st
 import pandas as pd
 import io
+import hashlib
+import sqlite3
+
+from allocation import (ENGINES, FLOW_TIME_BUDGET, NO_CLUB, OPTIMIZERS, Allocator, InputError, ResultCache, allocation_key,
+                        available_sheets, normalize_club_name, prepare_vacancies, split_results, write_csv_zip, write_workbook)
+from ingest import UPLOAD_TYPES, read_vacancies
+from jobs import STATUS_LABELS, JobManager
+from rules import RULE_COLUMNS, dump_rules, load_rules, rules_from_frame, rules_to_frame
+from scenarios import build_scenarios, compare_engines, diff_results, run_sweep
+from snapshot import SNAPSHOT_DIR, SnapshotStore
+from store import STORE_FILE, ResultStore
 
 # 設定頁面配置
 st.set_page_config(page_title="學生轉社系統", layout="wide")
 
-# --- 1. 資料模型類別 (Class Definitions) ---
-class Student:
-    def __init__(self, data, h1_forbidden, h2_forbidden, h1_ban_all, h2_ban_all):
-        self.id = str(data['學號']).strip()
-        self.name = data.get('姓名', '')
-        self.original_club = str(data.get('原社團', '')).strip()
-        self.class_str = str(data.get('班級', '')).strip() # Store original class string
-        
-        # 處理班級與年級判斷
-        self.grade = None
-        try:
-            cls_num = int(''.join(filter(str.isdigit, self.class_str))[:3])
-            if 101 <= cls_num <= 115:
-                self.grade = 1
-            elif 201 <= cls_num <= 215:
-                self.grade = 2
-        except:
-            pass
-            
-        # 處理志願 (套用限制)
-        self.prefs = []
-        forbidden = set()
-        ban = False
-        
-        if self.grade == 1:
-            if h1_ban_all: ban = True
-            else: forbidden = set(h1_forbidden)
-        elif self.grade == 2:
-            if h2_ban_all: ban = True
-            else: forbidden = set(h2_forbidden)
-            
-        if not ban:
-            for i in range(1, 11):
-                col = f'志願{i}'
-                if col in data:
-                    p = str(data[col]).strip()
-                    if p and p not in forbidden:
-                        self.prefs.append(p)
-
-        self.current_assigned = self.original_club # 初始狀態在原社團
-        self.status = "原社團留任" 
-        self.rank = 999 # 999代表未錄取任何志願，0代表第一志願
-
-# -- Skipping Club definition as it is fine --
-
-# ... inside process_allocation ...
-# (We need to make sure process_allocation uses handling logic, but we can't redefine it fully here easily without context)
-# Instead, since I already replaced process_allocation in previous step, I will target the areas that need fix.
-
-# Update UI section to handle 4 return values
-# Finding the line where process_allocation is called.
-
-# First, let's fix the Student class definition at the top
-
-
-class Club:
-    def __init__(self, name, initial_vacancy):
-        self.name = str(name).strip()
-        self.initial_vacancy = int(initial_vacancy)
-        self.current_students = [] # 存放目前在此社團的學生ID
-        self.capacity = 0 # 將在初始化時計算: 初始缺額 + 初始成員數
-
-def process_allocation(students_df, clubs_df, h1_forbidden=[], h2_forbidden=[], h1_ban_all=False, h2_ban_all=False):
-    """
-    執行轉社分發邏輯 (Object-Oriented Version)
-    包含: 動態遞補 (Ripple Effect) + 最佳化交換 (Swapping) + 完整過程紀錄
-    """
-    
-    # --- A. 初始化環境 ---
-    students = []
-    clubs = {}
-    logs = []
-    swap_logs = []
-    
-    # 1. 建立社團物件 (從缺額設定)
-    # 確保社團名稱唯一
-    if '社團名稱' in clubs_df.columns:
-        # 加總重複的社團缺額 (防呆)
-        grouped_clubs = clubs_df.groupby('社團名稱')['目前缺額'].sum()
-        for c_name, vac in grouped_clubs.items():
-            clubs[str(c_name).strip()] = Club(c_name, vac)
-    else:
-        # Fallback
-        for c_name, vac in clubs_df['目前缺額'].items():
-            clubs[str(c_name).strip()] = Club(c_name, vac)
-
-    # 2. 自動發現隱藏社團 (Critical Fix: 確保所有原社團都被追蹤)
-    # 掃描學生的原社團，若不在 clubs 中，則新增一個 initial_vacancy=0 的社團
-    all_original = students_df['原社團'].dropna().astype(str).unique()
-    for c_name in all_original:
-        c_name = str(c_name).strip()
-        if c_name and c_name not in clubs:
-            clubs[c_name] = Club(c_name, 0)
-            # print(f"Auto-discovered club: {c_name}")
-
-    # 3. 建立學生物件並放入原社團
-    # 確保依照時間排序
-    if '填寫時間' in students_df.columns:
-        students_df['填寫時間'] = pd.to_datetime(students_df['填寫時間'], errors='coerce')
-        students_df = students_df.sort_values(by="填寫時間")
-        
-    for _, row in students_df.iterrows():
-        s = Student(row, h1_forbidden, h2_forbidden, h1_ban_all, h2_ban_all)
-        students.append(s)
-        
-        # 將學生放入原社團名單 (如果原社團有效)
-        if s.original_club in clubs:
-            clubs[s.original_club].current_students.append(s.id)
-            
-    # 4. 計算社團總容量 (Capacity)
-    # 容量 = 該社團初始缺額 + 該社團的初始原有學生數
-    for c in clubs.values():
-        c.capacity = c.initial_vacancy + len(c.current_students)
-    
-    # --- B. 動態連鎖分發 (Chain Reaction) ---
-    changed = True
-    iteration = 0
-    max_iterations = len(students) * 10 + 2000 # 增加上限，因為每次只移動一人就重來
+# --- 快取 (Caching) ---
+# Streamlit 每次操作都會重跑整個腳本，以下快取讓相同的輸入不必重新讀檔或重新分發
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_vacancies_cached(data, name):
+    # 以檔案內容 (bytes) 為 key，同一個檔案只解析一次；name 用來判斷格式
+    return read_vacancies(io.BytesIO(data), name)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def load_students_cached(students_key, name, _data):
+    # 以檔案內容的雜湊為 key；同一份檔案在伺服器重新啟動後也直接由快照 (SNAPSHOT_DIR) 載入，不需再解析 Excel
+    # 回傳 (StudentSnapshot, 是否由快照載入)，所有使用者共用，不可修改
+    return SnapshotStore(SNAPSHOT_DIR).load_students(io.BytesIO(_data), name)
+
+@st.cache_resource
+def get_result_cache():
+    return ResultCache()
+
+@st.cache_resource
+def get_result_store():
+    # 保存在伺服器硬碟上的分發紀錄 (工作階段過期或重新啟動後仍可取回，所有使用者共用)
+    return ResultStore(STORE_FILE)
+
+@st.cache_resource
+def get_job_manager():
+    # 所有使用者共用的背景分發工作 (固定大小的執行緒池)，彼此不會互相阻塞
+    return JobManager()
+
+@st.cache_resource
+def get_export_cache():
+    # 匯出檔 (bytes) 以 (分發結果 key, 格式, 工作表) 為 key，同一份結果只產生一次
+    return ResultCache()
+
+EXPORT_FORMATS = {
+    "Excel (.xlsx)": (write_workbook, "轉社結果.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV 壓縮檔 (.zip，較快)": (write_csv_zip, "轉社結果.zip", "application/zip"),
+}
+
+# --- 紀錄表格 (分頁 + 篩選) ---
+def show_events(frame, key):
+    """以可篩選、分頁的表格顯示遞補日誌或交換紀錄 (同一筆事件的所有列一起顯示)"""
+    f1, f2, f3 = st.columns([2, 2, 1])
+    query = f1.text_input("搜尋學號或姓名", key=f"{key}_query").strip()
+    club_options = sorted(set(frame['原本社團']).union(frame['轉入社團']), key=str)
+    selected = f2.multiselect("社團 (轉出或轉入)", options=club_options, key=f"{key}_clubs")
+    page_size = f3.selectbox("每頁筆數", [50, 100, 500], key=f"{key}_size")
     
-    status_container = st.empty()
-    bar = st.progress(0)
-    
-    while changed and iteration < max_iterations:
-        changed = False
-        iteration += 1
-        
-        # UI 更新頻率控制 (每 5 輪更新一次，避免拖慢效能)
-        if iteration % 5 == 0:
-            status_container.text(f"正在進行第 {iteration} 輪動態分發 (優先權掃描)...")
-            bar.progress(min(iteration % 100, 100))
-        
-        for s in students:
-            # 檢查每個志願
-            for i, p_club_name in enumerate(s.prefs):
-                
-                # 如果這個志願比目前的結果更差或一樣，跳過
-                if i >= s.rank:
-                    continue
-                
-                # 檢查社團是否存在
-                if p_club_name not in clubs:
-                    continue
-                
-                target_club = clubs[p_club_name]
-                
-                # 檢查是否有空位 (目前人數 < 總容量)
-                # 總容量 = 初始願意收的人 + 原本就在裡面的人
-                # 只要有人離開 (remove)，len(current) 就會減少，名額就釋出
-                if len(target_club.current_students) < target_club.capacity:
-                    # == 移動發生 ==
-                    old_club_name = s.current_assigned
-                    
-                    # 1. 從舊社團移除
-                    if old_club_name in clubs:
-                        clubs[old_club_name].current_students.remove(s.id)
-                    
-                    # 2. 加入新社團
-                    target_club.current_students.append(s.id)
-                    
-                    # 3. 更新狀態
-                    s.current_assigned = p_club_name
-                    s.rank = i
-                    s.status = "成功"
-                    
-                    logs.append(f"#{iteration}: {s.name} ({s.id}) 從 [{old_club_name}] 轉入 [{p_club_name}] (志願{i+1})")
-                    changed = True
-                    break # 跳出志願迴圈
-            
-            if changed:
-                break # !!! 關鍵修正：跳出學生迴圈，重新從第 1 位學生開始掃描 (Strict Priority)
-
-    status_container.text("進行交換最佳化...")
+    mask = pd.Series(True, index=frame.index)
+    if query:
+        mask &= (frame['學號'].astype(str).str.contains(query, regex=False)
+                 | frame['姓名'].astype(str).str.contains(query, regex=False))
+    if selected:
+        mask &= frame['原本社團'].isin(selected) | frame['轉入社團'].isin(selected)
+    if query or selected:
+        frame = frame[frame['序號'].isin(frame.loc[mask, '序號'])]
     
-    # --- C. 最佳化交換 (Post-Optimization) ---
-    swapped = True
-    while swapped:
-        swapped = False
-        for s1 in students:
-            if s1.rank == 0: continue # 已滿足第一志願
-            
-            for s2 in students:
-                if s1.id == s2.id: continue
-                if s2.rank == 0: continue
-                
-                c1 = s1.current_assigned
-                c2 = s2.current_assigned
-                
-                if c1 == c2: continue
-                
-                # 檢查 s1 是否想去 c2 且更好
-                if c2 in s1.prefs:
-                    r1 = s1.prefs.index(c2)
-                    if r1 < s1.rank:
-                        # 檢查 s2 是否想去 c1 且更好
-                        if c1 in s2.prefs:
-                            r2 = s2.prefs.index(c1)
-                            if r2 < s2.rank:
-                                # == 執行交換 ==
-                                s1.current_assigned = c2
-                                s1.rank = r1
-                                
-                                s2.current_assigned = c1
-                                s2.rank = r2
-                                
-                                # 更新社團名單 (這裡其實不影響容量，只是交換人頭)
-                                if c1 in clubs:
-                                    clubs[c1].current_students.remove(s1.id)
-                                    clubs[c1].current_students.append(s2.id)
-                                if c2 in clubs:
-                                    clubs[c2].current_students.remove(s2.id)
-                                    clubs[c2].current_students.append(s1.id)
-                                    
-                                swap_logs.append(f"{s1.name} <-> {s2.name} : {c1} <-> {c2}")
-                                swapped = True
-
-    status_container.empty()
-    bar.empty()
-    
-    # --- D. 整理結果 ---
-    results = []
-    for s in students:
-        results.append({
-            '學號': s.id,
-            '姓名': s.name,
-            '班級': s.class_str,
-            '原社團': s.original_club,
-            '分發結果': s.current_assigned,
-            '錄取志願序': s.rank + 1 if s.rank != 999 else '未轉社',
-            '狀態': '成功' if s.current_assigned != s.original_club else '未變更'
-        })
-        
-    # 計算剩餘缺額
-    vac_data = []
-    for c in clubs.values():
-        remaining = c.capacity - len(c.current_students)
-        vac_data.append({'社團名稱': c.name, '剩餘缺額': max(0, remaining)})
-        
-    return pd.DataFrame(results), pd.DataFrame(vac_data), logs, swap_logs
+    pages = max(1, -(-len(frame) // page_size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = 1 # 篩選後頁數變少時回到第一頁
+    page = st.number_input("頁碼", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page")
+    start = (page - 1) * page_size
+    st.dataframe(frame.iloc[start:start + page_size], hide_index=True)
+    st.caption(f"符合 {len(frame)} 筆，第 {page} / {pages} 頁")
 
 
 # === UI 部分 ===
@@ -252,7 +87,7 @@ st.markdown("---")
 with st.expander("📖 系統使用說明 (User Guide)", expanded=False):
     st.markdown("""
     ### 1. 準備資料
-    請準備一個 Excel 檔案，包含以下欄位（標題需準確）：
+    請準備一個 Excel 檔案 (也接受 CSV、Parquet 或 Arrow/Feather，欄位相同)，包含以下欄位（標題需準確）：
     - **必要欄位**：`學號`、`班級`、`原社團`、`填寫時間`
     - **志願欄位**：`志願1`、`志願2` ... `志願10` (可依需求增減)
     - **選填欄位**：`姓名` (若無則顯示空白)
@@ -279,75 +114,50 @@ with st.expander("📖 系統使用說明 (User Guide)", expanded=False):
 st.sidebar.header("1. 上傳資料")
 
 # 學生資料上傳
-uploaded_students = st.sidebar.file_uploader("上傳學生志願 (Excel)", type=['xlsx'])
-students_df = None
+uploaded_students = st.sidebar.file_uploader("上傳學生志願 (Excel / CSV / Parquet / Arrow)", type=UPLOAD_TYPES)
+students = None # StudentInput (依填寫時間排序、整理好的學生資料)
+students_key = None
+all_clubs_found = set() # 準備所有社團列表供選單使用
 if uploaded_students:
     try:
-        students_df = pd.read_excel(uploaded_students)
-        
-        # 清除欄位名稱前後空白 (避免使用者不小心多打空白)
-        students_df.columns = students_df.columns.str.strip()
-        
-        # 基本欄位檢查
-        req_cols = ['學號', '班級', '填寫時間', '原社團'] # 姓名不再是必填
-        missing_cols = [c for c in req_cols if c not in students_df.columns]
-        
-        if missing_cols:
-            st.sidebar.error(f"Excel 缺少必要欄位: {missing_cols}")
-            st.sidebar.warning(f"目前讀取到的欄位: {list(students_df.columns)}")
-            st.sidebar.info("請檢查 Excel 標題列是否包含上述欄位，且沒有多餘的空白或錯字。")
-            students_df = None
+        students_bytes = uploaded_students.getvalue()
+        students_key = hashlib.sha256(students_bytes).hexdigest()
+        # 逐列讀取: 同時完成欄位檢查、重複學號偵測與社團名稱收集 (相同內容的檔案直接載入快照)
+        snapshot, from_snapshot = load_students_cached(students_key, uploaded_students.name, students_bytes)
+        students = snapshot.students
+        all_clubs_found = set(snapshot.clubs)
+        st.sidebar.success(f"已讀取 {len(students)} 名學生資料" + (" (由快照載入)" if from_snapshot else ""))
+    except InputError as e:
+        if e.missing:
+            st.sidebar.error(f"檔案缺少必要欄位: {e.missing}")
+            st.sidebar.warning(f"目前讀取到的欄位: {e.columns}")
+            st.sidebar.info("請檢查標題列是否包含上述欄位，且沒有多餘的空白或錯字。")
         else:
-            # 檢查學號是否重複
-            if students_df['學號'].duplicated().any():
-                dup_ids = students_df[students_df['學號'].duplicated()]['學號'].unique()
-                st.sidebar.error(f"發現重複學號，無法處理: {list(dup_ids)}")
-                st.sidebar.warning("請修正 Excel 中的重複學號後重新上傳。")
-                students_df = None
-            else:
-                # 若無姓名欄位，自動填補 (為了顯示方便)
-                if '姓名' not in students_df.columns:
-                    students_df['姓名'] = ""
-                
-                # 再次確保學號轉為字串比較安全
-                students_df['學號'] = students_df['學號'].astype(str).str.strip()
-
-                st.sidebar.success(f"已讀取 {len(students_df)} 名學生資料")
+            st.sidebar.error(f"發現重複學號，無法處理: {e.duplicates}")
+            st.sidebar.warning("請修正檔案中的重複學號後重新上傳。")
     except Exception as e:
         st.sidebar.error(f"讀取錯誤: {e}")
 
-# 準備所有社團列表供選單使用
-all_clubs_found = set()
-if students_df is not None:
-    if '原社團' in students_df.columns:
-        all_clubs_found.update(students_df['原社團'].dropna().unique())
-    for i in range(1, 11):
-        if f'志願{i}' in students_df.columns:
-            all_clubs_found.update(students_df[f'志願{i}'].dropna().astype(str).unique())
-    all_clubs_found = {c for c in all_clubs_found if c and str(c).strip()}
-
 # 社團缺額設定
 st.sidebar.header("2. 社團缺額設定")
-quota_mode = st.sidebar.radio("缺額來源", ["手動輸入/修改", "上傳 Excel"])
+quota_mode = st.sidebar.radio("缺額來源", ["手動輸入/修改", "上傳檔案"])
 
 clubs_df = pd.DataFrame(columns=['社團名稱', '目前缺額'])
 
-if quota_mode == "上傳 Excel":
-    uploaded_clubs = st.sidebar.file_uploader("上傳社團缺額 (Excel)", type=['xlsx'])
+if quota_mode == "上傳檔案":
+    uploaded_clubs = st.sidebar.file_uploader("上傳社團缺額 (Excel / CSV / Parquet / Arrow)", type=UPLOAD_TYPES)
     if uploaded_clubs:
         try:
-            d = pd.read_excel(uploaded_clubs)
-            if '社團名稱' in d.columns and '目前缺額' in d.columns:
-                clubs_df = d[['社團名稱', '目前缺額']]
-                st.sidebar.success(f"已讀取 {len(clubs_df)} 個社團設定")
-            else:
-                st.sidebar.error("Excel 需包含 [社團名稱, 目前缺額]")
+            clubs_df = load_vacancies_cached(uploaded_clubs.getvalue(), uploaded_clubs.name)
+            st.sidebar.success(f"已讀取 {len(clubs_df)} 個社團設定")
+        except ValueError as e:
+            st.sidebar.error(f"{e}")
         except Exception as e:
             st.sidebar.error(f"讀取錯誤: {e}")
 else:
     st.sidebar.info("請在右側主畫面表格輸入社團缺額")
     
-    if students_df is not None:
+    if students is not None:
         # 如果 session state 還沒存，就初始化
         if 'editor_clubs' not in st.session_state:
             init_data = [{'社團名稱': c, '目前缺額': 0} for c in sorted(list(all_clubs_found))]
@@ -360,14 +170,15 @@ else:
 st.sidebar.header("3. 限制設定")
 st.sidebar.caption("設定特定年級無法轉入的社團 (將自動略過該志願)")
 
-# 整合所有來源的社團名單 (學生資料 + 社團缺額設定)
+# 整合所有來源的社團名單 (學生資料 + 社團缺額設定)；名稱與分發時相同，先正規化
 if '社團名稱' in clubs_df.columns: 
     # 注意: 若是手動輸入模式且尚未存入 clubs_df (例如剛啟動)，可能要看 session_state
     if not clubs_df.empty:
-        all_clubs_found.update(clubs_df['社團名稱'].dropna().astype(str).unique())
+        all_clubs_found.update(clubs_df['社團名稱'].map(normalize_club_name))
 
 if 'editor_clubs' in st.session_state and not st.session_state['editor_clubs'].empty:
-    all_clubs_found.update(st.session_state['editor_clubs']['社團名稱'].dropna().astype(str).unique())
+    all_clubs_found.update(st.session_state['editor_clubs']['社團名稱'].map(normalize_club_name))
+all_clubs_found.discard(NO_CLUB)
 
 available_clubs_list = sorted(list(all_clubs_found)) if all_clubs_found else []
 
@@ -389,11 +200,55 @@ if not h2_ban_all:
         options=available_clubs_list
     )
 
+# 進階規則: 依年級 (含高三)、班級或原社團限制，可在表格編輯或由檔案載入
+st.sidebar.subheader("進階規則")
+st.sidebar.caption("同一列的條件需同時符合；「禁止轉入」留空代表完全凍結。多個值以逗號或頓號分隔，班級可寫範圍 (例如 301-305)")
+rules_file = st.sidebar.file_uploader("載入規則檔 (.json / .csv / .xlsx)", type=['json', 'csv', 'xlsx'], key="rules_file")
+rules_file_id = hashlib.sha256(rules_file.getvalue()).hexdigest()[:16] if rules_file is not None else None
+if rules_file_id is not None and st.session_state.get('rules_file_id') != rules_file_id:
+    # 同一個檔案只載入一次，之後的修改保留在表格中
+    try:
+        st.session_state['editor_rules'] = rules_to_frame(load_rules(rules_file, rules_file.name))
+        st.session_state['rules_file_id'] = rules_file_id
+    except Exception as e:
+        st.sidebar.error(f"規則檔讀取錯誤: {e}")
+if 'editor_rules' not in st.session_state:
+    st.session_state['editor_rules'] = rules_to_frame([])
+# 載入新的規則檔時換一個 key，表格才會以新的內容重新開始編輯
+edited_rules = st.sidebar.data_editor(st.session_state['editor_rules'], num_rows="dynamic",
+                                      key=f"rules_editor_{st.session_state.get('rules_file_id', '')}",
+                                      column_config={c: st.column_config.TextColumn(c) for c in RULE_COLUMNS})
+rules_error = None
+try:
+    extra_rules = rules_from_frame(edited_rules)
+except ValueError as e:
+    rules_error = str(e)
+    extra_rules = []
+    st.sidebar.error(f"規則設定錯誤: {rules_error}")
+if extra_rules:
+    st.sidebar.caption("\n".join(f"- {rule.describe()}" for rule in extra_rules))
+st.sidebar.download_button("💾 下載規則 (JSON)", dump_rules(extra_rules), file_name="rules.json", mime="application/json",
+                           disabled=not extra_rules, key="rules_download")
+restrictions = dict(h1_forbidden=h1_forbidden, h2_forbidden=h2_forbidden, h1_ban_all=h1_ban_all, h2_ban_all=h2_ban_all,
+                    rules=extra_rules)
+
 # Main Area
-if students_df is not None:
-    with st.expander("📄 檢視已上傳學生資料 (前 5 筆)", expanded=True):
-        st.dataframe(students_df.head())
-        st.caption(f"共 {len(students_df)} 筆資料。")
+if students is not None:
+    with st.expander("📄 檢視已上傳學生資料 (依填寫時間排序的前 5 筆)", expanded=True):
+        st.dataframe(students.to_frame().head())
+        st.caption(f"共 {len(students)} 筆資料。")
+
+# 背景分發工作 (重新整理頁面後，由網址中的工作 ID 找回)；已結束的工作在這裡收尾
+jobs = get_job_manager()
+if 'job_id' not in st.session_state and 'job' in st.query_params and jobs.get(st.query_params['job']) is not None:
+    st.session_state['job_id'] = st.query_params['job']
+job_id = st.session_state.get('job_id')
+finished_job = None
+if job_id is not None and (jobs.get(job_id) is None or jobs.get(job_id).done):
+    finished_job = jobs.get(job_id) or 'missing'
+    del st.session_state['job_id']
+    st.query_params.pop('job', None)
+    job_id = None
 
 c1, c2 = st.columns([2, 1])
 
@@ -408,29 +263,225 @@ with c1:
 
 with c2:
     st.subheader("操作")
-    start_btn = st.button("🚀 開始分發", type="primary", disabled=(students_df is None or clubs_df.empty))
+    engine = st.radio("分發引擎", options=list(ENGINES), format_func=ENGINES.get, key="engine",
+                      help="動態遞補 + 交換: 原本的遞補後再交換；精確配對: 依填寫時間的交換鏈配對，"
+                           "保證沒有人比原社團差、沒有浪費的空位、也不存在讓大家都不變差的交換，速度也較快")
+    optimizer = st.selectbox("最佳化階段", options=list(OPTIMIZERS), format_func=OPTIMIZERS.get, key="optimizer",
+                             help="最小成本流: 把整個重新分配當成最小成本流問題，在沒有人變差的前提下求最佳解 "
+                                  "(志願序總和最小，或先讓最多人錄取第 1 志願、再來第 2 志願...)")
+    time_budget = FLOW_TIME_BUDGET
+    if optimizer != 'swap':
+        time_budget = st.number_input("時間預算 (秒)", min_value=1.0, value=FLOW_TIME_BUDGET, step=1.0, key="time_budget")
+    swap_cycles = st.checkbox("🔁 允許三人以上循環交換", value=False, disabled=(engine == 'exact' or optimizer != 'swap'),
+                              help="兩兩交換完成後，再嘗試 A→B→C→A 的循環交換 (每個人都會變好)；精確配對與最小成本流本身已包含循環交換")
+    start_btn = st.button("🚀 開始分發", type="primary", disabled=(students is None or clubs_df.empty or job_id is not None or rules_error is not None))
 
 # Logic Execution
-if start_btn and students_df is not None and not clubs_df.empty:
-    with st.spinner("正在進行演算法分發..."):
-        # 確保 clubs_df 格式正確 (如果是 data_editor 回傳的，可能型別要轉)
-        clubs_df['目前缺額'] = pd.to_numeric(clubs_df['目前缺額'], errors='coerce').fillna(0).astype(int)
+def store_result(run_key, cached):
+    result_df, vacancies_df, logs, swap_logs, stats = cached
+    st.session_state['run_key'] = run_key
+    st.session_state['result_df'] = result_df
+    # 成功 / 未變更名單只在分發後切一次，之後切換分頁或重跑畫面都直接沿用
+    st.session_state['success_df'], st.session_state['fail_df'] = split_results(result_df)
+    st.session_state['final_vacancies'] = vacancies_df
+    st.session_state['logs'] = logs
+    st.session_state['swap_logs'] = swap_logs
+    st.session_state['stats'] = stats
+
+@st.fragment(run_every=0.5)
+def show_job(job_id):
+    # 定期查詢背景工作的進度；結束後重跑整頁以顯示結果
+    job = jobs.get(job_id)
+    if job is None or job.done:
+        st.rerun()
+    st.progress(job.percent, text=f"{STATUS_LABELS[job.status]}: {job.text}")
+    st.caption(f"工作 ID: {job.id}，已執行 {job.elapsed:.1f} 秒 (可重新整理頁面，分發會在背景繼續)")
+    if st.button("⏹️ 取消分發", key="cancel_job", disabled=job.cancel_requested):
+        job.cancel()
+
+if start_btn and students is not None and not clubs_df.empty:
+    # 確保 clubs_df 格式正確 (如果是 data_editor 回傳的，可能型別要轉)
+    clubs_df = prepare_vacancies(clubs_df)
+    
+    # 相同的學生檔 + 缺額表 + 限制設定，直接取回先前的結果
+    result_cache = get_result_cache()
+    run_key = allocation_key(students_key, clubs_df, h1_forbidden, h2_forbidden, h1_ban_all, h2_ban_all, swap_cycles, engine,
+                             optimizer, time_budget, rules=extra_rules)
+    result_store = get_result_store()
+    cached = result_cache.get(run_key)
+    from_store = False
+    if cached is None and run_key in result_store:
+        # 先前 (或其他使用者) 已用相同的輸入與設定分發過，直接讀回保存的紀錄
+        # (較早保存、沒有落榜原因索引的紀錄則重新分發一次並覆蓋)
+        cached = result_store.load(run_key)
+        if cached is not None and cached[2].provenance is None:
+            cached = None
+        else:
+            result_cache.put(run_key, cached)
+            from_store = True
+    
+    if cached is None:
+        # 同一份學生資料沿用上一次的分發器: 只改缺額或限制時會增量重算 (結果與重跑相同)
+        allocator_key, allocator = st.session_state.get('allocator', (None, None))
+        if allocator_key != students_key:
+            allocator = Allocator(students)
+            st.session_state['allocator'] = (students_key, allocator)
+        settings = dict(restrictions, swap_cycles=swap_cycles, engine=engine, optimizer=optimizer, time_budget=time_budget)
+        label = f"{uploaded_students.name} ({ENGINES[engine]}，{OPTIMIZERS[optimizer]})"
         
-        result_df, vacancies_df, logs, swap_logs = process_allocation(
-            students_df, 
-            clubs_df, 
-            h1_forbidden=h1_forbidden, 
-            h2_forbidden=h2_forbidden,
-            h1_ban_all=h1_ban_all,
-            h2_ban_all=h2_ban_all
-        )
+        def work(on_progress):
+            # 在背景執行緒執行，不可使用 st.* 指令
+            result = allocator.run(clubs_df, on_progress=on_progress, **settings)
+            result_cache.put(run_key, result)
+            try:
+                result_store.save(run_key, result, label=label, settings=settings)
+            except (sqlite3.Error, OSError):
+                pass # 無法寫入分發紀錄時，本次結果仍可使用
+            return result
         
-        st.session_state['result_df'] = result_df
-        st.session_state['final_vacancies'] = vacancies_df
-        st.session_state['logs'] = logs
-        st.session_state['swap_logs'] = swap_logs
+        job = jobs.submit(work, key=run_key)
+        st.session_state['job_id'] = job.id
+        st.query_params['job'] = job.id
+        job_id = job.id
+    else:
+        st.success("分發完成！(與先前保存的分發紀錄相同，直接取回結果)" if from_store
+                   else "分發完成！(與先前的設定相同，直接使用已計算的結果)")
+        store_result(run_key, cached)
+
+if job_id is not None:
+    show_job(job_id)
+elif finished_job == 'missing':
+    st.warning("找不到這個分發工作 (伺服器可能已重新啟動)，請重新分發")
+elif finished_job is not None:
+    if finished_job.status == 'done':
+        store_result(finished_job.key, finished_job.result)
+        stats = finished_job.result[-1]
+        reused = stats.reused_moves
+        st.success(f"分發完成！(增量重算，沿用前次的 {reused} 次遞補)" if reused else "分發完成！")
+        if stats.flow_timeouts:
+            st.warning("最小成本流已達時間預算，結果已改善但不一定是最佳解，可提高時間預算後重新分發")
+    elif finished_job.status == 'cancelled':
+        st.info("已取消分發")
+    else:
+        st.error(finished_job.text)
+
+# What-if 情境比較
+FREEZE_CHOICES = {"不凍結": (), "凍結高一": (1,), "凍結高二": (2,), "凍結高三": (3,), "凍結高一+高二": (1, 2)}
+MAX_SCENARIOS = 64
+
+if students is not None and not clubs_df.empty:
+    with st.expander("🔬 情境比較 (What-if)", expanded=False):
+        st.caption("在確定缺額前，一次比較多種設定 (以目前的缺額表與限制為基準，平行分發所有組合)")
+        w1, w2, w3 = st.columns([2, 1, 2])
+        sweep_clubs = w1.multiselect("要調整名額的社團", options=available_clubs_list, key="sweep_clubs")
+        sweep_deltas = w2.text_input("增加名額 (逗號分隔)", value="0, 3", key="sweep_deltas")
+        sweep_freeze = w3.multiselect("凍結年級", options=list(FREEZE_CHOICES), default=["不凍結"], key="sweep_freeze")
         
-        st.success("分發完成！")
+        try:
+            deltas = [int(d) for d in sweep_deltas.replace('，', ',').split(',') if d.strip()] or [0]
+        except ValueError:
+            st.error("增加名額請輸入整數，例如: 0, 3")
+            deltas = None
+        if deltas is not None:
+            scenarios = build_scenarios({c: deltas for c in sweep_clubs},
+                                        [FREEZE_CHOICES[f] for f in sweep_freeze] or [()])
+            st.caption(f"共 {len(scenarios)} 個情境")
+            if len(scenarios) > MAX_SCENARIOS:
+                st.warning(f"情境過多 (上限 {MAX_SCENARIOS} 個)，請減少社團或名額選項")
+            elif st.button("▶️ 執行情境比較", key="sweep_btn"):
+                sweep_bar = st.progress(0)
+                st.session_state['sweep'] = run_sweep(
+                    students,
+                    prepare_vacancies(clubs_df),
+                    scenarios,
+                    restrictions=restrictions,
+                    swap_cycles=swap_cycles,
+                    on_done=lambda done, total: sweep_bar.progress(done / total),
+                    engine=engine,
+                    optimizer=optimizer,
+                    time_budget=time_budget
+                )
+                sweep_bar.empty()
+        
+        if 'sweep' in st.session_state:
+            summary, leftover = st.session_state['sweep']
+            st.dataframe(summary, hide_index=True)
+            st.bar_chart(summary.set_index('情境')['成功轉社'])
+            st.caption("各社團剩餘缺額")
+            st.dataframe(leftover)
+    
+    with st.expander("🧹 志願檢查", expanded=False):
+        st.caption("分發前先檢查: 社團名稱統一 (全形/半形、空白) 的對照，以及因不在缺額表、重複填寫或被限制而不會參與分發的志願")
+        if st.button("▶️ 檢查志願", key="check_btn"):
+            table, _ = Allocator(students).compile(prepare_vacancies(clubs_df), **restrictions)
+            renamed = pd.DataFrame(list(table.renamed.items()), columns=['檔案中的名稱', '統一後的名稱'])
+            st.session_state['compile_report'] = (renamed, table.dropped_entries())
+        if 'compile_report' in st.session_state:
+            renamed, dropped = st.session_state['compile_report']
+            if not renamed.empty:
+                st.caption(f"統一名稱的社團: {len(renamed)} 個")
+                st.dataframe(renamed, hide_index=True)
+            if dropped.empty:
+                st.success("所有填寫的志願都會參與分發")
+            else:
+                st.caption(f"略過的志願: {len(dropped)} 個")
+                st.dataframe(dropped['原因'].value_counts().rename_axis('原因').reset_index(name='志願數'), hide_index=True)
+                st.dataframe(dropped, hide_index=True)
+    
+    with st.expander("⚖️ 分發引擎比較", expanded=False):
+        st.caption("以目前的缺額表與限制，分別用兩種分發引擎分發，列出結果不同的學生")
+        if st.button("▶️ 比較分發引擎", key="compare_btn"):
+            with st.spinner("正在比較..."):
+                st.session_state['engine_compare'] = compare_engines(
+                    students,
+                    prepare_vacancies(clubs_df),
+                    restrictions=restrictions,
+                    swap_cycles=swap_cycles
+                )
+        if 'engine_compare' in st.session_state:
+            summary, diff = st.session_state['engine_compare']
+            st.dataframe(summary, hide_index=True)
+            st.caption(f"分發結果不同的學生: {len(diff)} 人")
+            st.dataframe(diff, hide_index=True)
+
+# 分發紀錄 (保存在伺服器上，不需上傳檔案即可開啟或比較)
+with st.expander("📚 分發紀錄", expanded=False):
+    result_store = get_result_store()
+    runs = result_store.runs()
+    if runs.empty:
+        st.info("尚無保存的分發紀錄")
+    else:
+        st.caption(f"共 {len(runs)} 筆 (保存在伺服器的 {STORE_FILE}，其他使用者也看得到)")
+        st.dataframe(runs.drop(columns='key'), hide_index=True)
+        run_labels = {key: f"{created} {label}" for key, created, label in zip(runs['key'], runs['建立時間'], runs['說明'])}
+        r1, r2 = st.columns(2)
+        open_key = r1.selectbox("開啟紀錄", options=list(run_labels), format_func=run_labels.get, key="history_open")
+        if r1.button("📂 開啟", key="history_open_btn"):
+            stored = result_store.load(open_key)
+            if stored is None:
+                st.warning("找不到這筆紀錄 (可能已被刪除)")
+            else:
+                get_result_cache().put(open_key, stored)
+                store_result(open_key, stored)
+                st.success(f"已開啟: {run_labels[open_key]}")
+        diff_keys = r2.multiselect("比較兩筆紀錄", options=list(run_labels), format_func=run_labels.get,
+                                   max_selections=2, key="history_diff")
+        if r2.button("⚖️ 比較", key="history_diff_btn", disabled=len(diff_keys) != 2):
+            stored = [result_store.load(key) for key in diff_keys]
+            if any(s is None for s in stored):
+                st.warning("找不到要比較的紀錄 (可能已被刪除)")
+            else:
+                names = [f"紀錄{i}" for i in (1, 2)]
+                metrics = runs.set_index('key').loc[diff_keys].drop(columns='設定').T
+                metrics.columns = names
+                diff = diff_results({name: s[0] for name, s in zip(names, stored)}, winner_column='較好的紀錄')
+                st.session_state['history_compare'] = ([run_labels[k] for k in diff_keys], metrics, diff)
+        if 'history_compare' in st.session_state:
+            compared, metrics, diff = st.session_state['history_compare']
+            st.caption("；".join(f"紀錄{i}: {label}" for i, label in enumerate(compared, 1)))
+            st.dataframe(metrics.astype(str))
+            st.caption(f"分發結果不同的學生: {len(diff)} 人")
+            st.dataframe(diff, hide_index=True)
 
 # Results Display
 if 'result_df' in st.session_state:
@@ -441,48 +492,99 @@ if 'result_df' in st.session_state:
     vac = st.session_state['final_vacancies']
     logs = st.session_state.get('logs', [])
     swap_logs = st.session_state.get('swap_logs', [])
+    stats = st.session_state.get('stats')
     
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📋 成功名單", "⚠️ 未變更/失敗名單", "📊 社團餘額", "📜 遞補日誌", "🔄 交換紀錄"])
+    tab1, tab2, tab_why, tab3, tab4, tab_stats, tab5 = st.tabs(["📋 成功名單", "⚠️ 未變更/失敗名單", "🔎 落榜原因查詢", "📊 社團餘額", "📜 遞補日誌", "⏱️ 執行統計", "🔄 交換紀錄"])
     
     with tab1:
-        success_list = res[res['狀態'] == '成功']
+        success_list = st.session_state['success_df']
         st.info(f"共有 {len(success_list)} 人成功轉社")
         st.dataframe(success_list)
         
     with tab2:
-        fail_list = res[res['狀態'] != '成功']
+        fail_list = st.session_state['fail_df']
         st.warning(f"共有 {len(fail_list)} 人維持原社團 (或未填寫有效志願)")
         st.dataframe(fail_list)
         
+    with tab_why:
+        st.caption("輸入學號，列出該學生錄取的志願之前，每個志願沒有錄取的原因 (額滿時列出佔用名額、比他早填寫的學生)")
+        provenance = getattr(logs, 'provenance', None)
+        if provenance is None:
+            st.info("這筆分發紀錄沒有落榜原因索引，請重新分發")
+        else:
+            query = st.text_input("學號", key="explain_id").strip()
+            explained = provenance.explain(query) if query else None
+            if query and explained is None:
+                st.warning(f"找不到學號: {query}")
+            elif explained is not None:
+                student = res[res['學號'] == query].iloc[0]
+                st.markdown(f"**{student['姓名']}** ({student['班級']})：原社團 {student['原社團']} → "
+                            f"{student['分發結果']} (錄取志願序: {student['錄取志願序']})")
+                if explained.empty:
+                    st.info("這位學生沒有填寫志願")
+                else:
+                    st.dataframe(explained, hide_index=True)
+                    club = st.selectbox("社團的轉入順序", options=list(dict.fromkeys(explained['志願社團'])), key="explain_club")
+                    entries = provenance.club_entries(club)
+                    if entries is None:
+                        st.caption(f"{club} 不在缺額表")
+                    elif entries.empty:
+                        st.caption(f"{club} 沒有學生轉入")
+                    else:
+                        st.dataframe(entries, hide_index=True)
+    
     with tab3:
         st.dataframe(vac)
         
     with tab4:
         st.caption("顯示名額釋出後的動態遞補過程")
-        st.text_area("遞補過程", "\n".join(logs), height=300)
+        if logs:
+            show_events(logs.to_frame(), "logs")
+        else:
+            st.info("本次沒有發生遞補")
+    
+    with tab_stats:
+        if stats is not None:
+            st.caption("各階段耗時與計數，可用來判斷分發變慢的原因")
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("總耗時", f"{stats.total_time:.2f} 秒")
+            m2.metric("最慢階段", stats.PHASE_LABELS[stats.slowest_phase()])
+            m3.metric("遞補移動", stats.moves)
+            m4.metric("最長連鎖遞補", f"{stats.longest_chain} 人")
+            st.bar_chart(pd.Series({stats.PHASE_LABELS[k]: v for k, v in stats.timings.items()}, name="秒"))
+            st.dataframe(stats.to_frame(), hide_index=True)
         
     with tab5:
         if swap_logs:
             st.success(f"系統自動執行了 {len(swap_logs)} 組交換")
-            st.text_area("交換紀錄", "\n".join(swap_logs), height=300)
+            show_events(swap_logs.to_frame(), "swaps")
         else:
             st.info("本次無可進行的最佳化交換")
 
-    # Download
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        res.to_excel(writer, sheet_name='分發結果', index=False)
-        vac.to_excel(writer, sheet_name='剩餘缺額', index=False)
-        success_list.to_excel(writer, sheet_name='成功名單', index=False)
-        if logs:
-             pd.DataFrame({'Log': logs}).to_excel(writer, sheet_name='遞補日誌', index=False)
-        if swap_logs:
-             pd.DataFrame({'Swap': swap_logs}).to_excel(writer, sheet_name='交換紀錄', index=False)
+    # Download: 按下按鈕時才產生檔案 (切換分頁不會重做)，同一份結果與設定只產生一次
+    d1, d2 = st.columns([3, 2])
+    sheet_options = available_sheets(logs, swap_logs, stats)
+    sheets = d1.multiselect("匯出的工作表", options=sheet_options, default=sheet_options, key="export_sheets")
+    export_format = d2.radio("匯出格式", list(EXPORT_FORMATS), key="export_format")
+    writer, file_name, mime = EXPORT_FORMATS[export_format]
+    export_key = (st.session_state.get('run_key'), export_format, tuple(sheets))
+    export_cache = get_export_cache()
+    
+    def build_export():
+        data = export_cache.get(export_key)
+        if data is None:
+            output = io.BytesIO()
+            writer(output, res, vac, logs, swap_logs, stats, sheets=sheets)
+            data = output.getvalue()
+            export_cache.put(export_key, data)
+        return data
     
     st.download_button(
-        label="📥 下載完整結果 Excel",
-        data=output.getvalue(),
-        file_name="轉社結果.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        label="📥 下載完整結果 Excel" if file_name.endswith(".xlsx") else "📥 下載完整結果 CSV (ZIP)",
+        data=build_export,
+        file_name=file_name,
+        mime=mime,
+        on_click="ignore",
+        disabled=not sheets
     )
 
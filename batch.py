@@ -0,0 +1,196 @@
+"""
+學生轉社系統 - 多校批次分發 (Batch Runner)
+以 process pool 平行處理整個學區，每校輸出一份結果 Excel，另附一份批次摘要：
+
+    python batch.py 學區資料夾 -o 輸出資料夾
+    python batch.py 批次清單.csv -o 輸出資料夾 --workers 8
+
+資料夾模式: 每個子資料夾代表一所學校，內含學生志願檔與檔名含「缺額」的社團缺額檔 (Excel/CSV/Parquet/Arrow)，
+可另放 限制.json ({"h1_forbidden": [...], "h2_forbidden": [...], "h1_ban_all": false, ..., "rules": [{...}]}，
+rules 的格式見 rules.py)。
+清單模式: CSV 欄位為 學校, 學生檔, 缺額檔, 高一禁止, 高二禁止, 高一凍結, 高二凍結, 規則檔 (選填，.json/.csv/.xlsx)
+(禁止社團以逗號或頓號分隔，路徑相對於清單檔所在位置)。
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+RESTRICTION_FILE = "限制.json"
+SUMMARY_FILE = "批次摘要.xlsx"
+INPUT_EXTENSIONS = (".xlsx", ".csv", ".parquet", ".arrow", ".feather", ".ipc") # 與 ingest.FORMATS 相同
+
+
+def _split_clubs(value):
+    if value is None or str(value).strip() in ("", "nan"):
+        return []
+    return [c.strip() for c in re.split(r"[,，、]", str(value)) if c.strip()]
+
+
+def _flag(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "是", "v")
+
+
+def jobs_from_directory(root):
+    """每個子資料夾一所學校: 檔名含「缺額」者為缺額表，另一份 (xlsx/csv/parquet/arrow) 為學生志願"""
+    jobs = []
+    for school in sorted(os.listdir(root)):
+        folder = os.path.join(root, school)
+        if not os.path.isdir(folder):
+            continue
+        workbooks = sorted(f for f in os.listdir(folder)
+                           if os.path.splitext(f)[1].lower() in INPUT_EXTENSIONS and not f.startswith("~$"))
+        vacancies = [f for f in workbooks if "缺額" in f]
+        students = [f for f in workbooks if "缺額" not in f]
+        job = {"school": school, "students": None, "vacancies": None}
+        if len(students) == 1 and len(vacancies) == 1:
+            job["students"] = os.path.join(folder, students[0])
+            job["vacancies"] = os.path.join(folder, vacancies[0])
+        else:
+            job["error"] = f"資料夾內需剛好一份學生志願與一份缺額檔 (找到 {workbooks})"
+        restriction_path = os.path.join(folder, RESTRICTION_FILE)
+        if os.path.exists(restriction_path):
+            # 限制檔有誤只讓這所學校失敗，不中斷整個批次
+            try:
+                with open(restriction_path, encoding="utf-8") as f:
+                    restrictions = json.load(f)
+                if not isinstance(restrictions, dict):
+                    raise ValueError("內容必須是 JSON 物件")
+                job.update(restrictions)
+            except (OSError, ValueError) as e: # json.JSONDecodeError 是 ValueError 的子類別
+                job.setdefault("error", f"{RESTRICTION_FILE} 讀取失敗: {type(e).__name__}: {e}")
+        jobs.append(job)
+    return jobs
+
+
+def jobs_from_manifest(path):
+    import pandas as pd
+    base = os.path.dirname(os.path.abspath(path))
+    manifest = pd.read_csv(path, dtype=str).fillna("")
+    jobs = []
+    for _, row in manifest.iterrows():
+        jobs.append({
+            "school": row["學校"].strip(),
+            "students": os.path.join(base, row["學生檔"].strip()),
+            "vacancies": os.path.join(base, row["缺額檔"].strip()),
+            "h1_forbidden": _split_clubs(row.get("高一禁止")),
+            "h2_forbidden": _split_clubs(row.get("高二禁止")),
+            "h1_ban_all": _flag(row.get("高一凍結", "")),
+            "h2_ban_all": _flag(row.get("高二凍結", "")),
+            "rules_file": os.path.join(base, row["規則檔"].strip()) if row.get("規則檔", "").strip() else None,
+        })
+    return jobs
+
+
+def run_job(job, output_dir, swap_cycles=False):
+    """
+    分發單一學校 (在 worker process 中執行)
+    任何錯誤都轉成摘要中的一列，不影響其他學校。
+    """
+    started = time.perf_counter()
+    summary = {"學校": job["school"], "狀態": "失敗", "學生數": None, "成功轉社": None,
+               "交換組數": None, "剩餘缺額": None, "最長連鎖": None, "最慢階段": None,
+               "耗時(秒)": None, "錯誤訊息": "", "結果檔": ""}
+    try:
+        if job.get("error"):
+            raise ValueError(job["error"])
+
+        from allocation import process_allocation, write_workbook
+        from ingest import read_students, read_vacancies
+        from rules import load_rules, rules_from_dicts
+
+        rules = rules_from_dicts(job.get("rules", []))
+        if job.get("rules_file"):
+            rules += load_rules(job["rules_file"])
+
+        students_df = read_students(job["students"]).df
+        clubs_df = read_vacancies(job["vacancies"])
+        result_df, vac_df, logs, swap_logs, stats = process_allocation(
+            students_df,
+            clubs_df,
+            h1_forbidden=job.get("h1_forbidden", []),
+            h2_forbidden=job.get("h2_forbidden", []),
+            h1_ban_all=job.get("h1_ban_all", False),
+            h2_ban_all=job.get("h2_ban_all", False),
+            swap_cycles=job.get("swap_cycles", swap_cycles),
+            rules=rules
+        )
+        output = os.path.join(output_dir, f"{job['school']}_轉社結果.xlsx")
+        write_workbook(output, result_df, vac_df, logs, swap_logs, stats)
+
+        summary.update({
+            "狀態": "成功",
+            "學生數": len(result_df),
+            "成功轉社": int((result_df['狀態'] == '成功').sum()),
+            "交換組數": len(swap_logs),
+            "剩餘缺額": int(vac_df['剩餘缺額'].sum()) if len(vac_df) else 0,
+            "最長連鎖": stats.longest_chain,
+            "最慢階段": stats.PHASE_LABELS[stats.slowest_phase()],
+            "結果檔": output,
+        })
+    except Exception as e:
+        summary["錯誤訊息"] = f"{type(e).__name__}: {e}"
+    summary["耗時(秒)"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def run_batch(jobs, output_dir, workers=None, swap_cycles=False, on_done=None):
+    """以 process pool 平行分發所有學校，回傳依輸入順序排列的摘要列表"""
+    os.makedirs(output_dir, exist_ok=True)
+    summaries = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(run_job, job, output_dir, swap_cycles): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                summaries[i] = future.result()
+            except Exception as e:
+                # worker 本身掛掉 (例如記憶體不足)，仍記錄下來繼續處理其他學校
+                summaries[i] = {"學校": jobs[i]["school"], "狀態": "失敗", "錯誤訊息": f"{type(e).__name__}: {e}"}
+            if on_done:
+                on_done(summaries[i])
+    return summaries
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="學生轉社多校批次分發")
+    parser.add_argument("source", help="學區資料夾 (每校一個子資料夾) 或批次清單 CSV")
+    parser.add_argument("-o", "--output", default="批次結果", help="輸出資料夾 (預設: 批次結果)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="平行處理的 process 數 (預設: CPU 核心數)")
+    parser.add_argument("--swap-cycles", action="store_true", help="交換階段另外嘗試三人以上的循環交換")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不顯示每校進度")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if os.path.isdir(args.source):
+        jobs = jobs_from_directory(args.source)
+    else:
+        jobs = jobs_from_manifest(args.source)
+    if not jobs:
+        print("找不到任何學校資料", file=sys.stderr)
+        return 2
+
+    def on_done(summary):
+        if not args.quiet:
+            detail = summary.get("結果檔") or summary.get("錯誤訊息")
+            print(f"[{summary['狀態']}] {summary['學校']}: {detail}", file=sys.stderr)
+
+    started = time.perf_counter()
+    summaries = run_batch(jobs, args.output, workers=args.workers, swap_cycles=args.swap_cycles, on_done=on_done)
+
+    import pandas as pd
+    summary_path = os.path.join(args.output, SUMMARY_FILE)
+    pd.DataFrame(summaries).to_excel(summary_path, sheet_name='批次摘要', index=False)
+
+    failed = sum(1 for s in summaries if s["狀態"] != "成功")
+    print(f"完成: {len(jobs)} 所學校，失敗 {failed} 所，耗時 {time.perf_counter() - started:.1f}s -> {summary_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
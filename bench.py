@@ -0,0 +1,238 @@
+"""
+學生轉社系統 - 效能基準測試 (Benchmark)
+以可調參數產生模擬學校，量測 process_allocation 各階段耗時與記憶體峰值，並與儲存的基準比較：
+
+    python bench.py                        # 執行所有情境並與 bench_baseline.json 比較
+    python bench.py medium deep_chain -r 5 # 只跑指定情境，每個情境重複 5 次取最快
+    python bench.py --save-baseline        # 將本次結果存為新的基準
+
+階段: 初始化 (setup) / 動態遞補 (ripple) / 交換最佳化 (swap) / 整理結果 (results) / 匯出 Excel (export)
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from allocation import process_allocation, write_workbook
+
+BASELINE_FILE = "bench_baseline.json"
+PHASES = ["setup", "ripple", "swap", "results", "export"]
+NOISE_FLOOR = 0.05 # 秒；低於此差距的變慢視為量測誤差
+
+# 預設情境 (未列出的參數使用 make_school 的預設值)
+SCENARIOS = {
+    "small": dict(students=300, clubs=20),
+    "medium": dict(students=3000, clubs=60),
+    "large": dict(students=20000, clubs=150),
+    "scarce": dict(students=3000, clubs=60, scarcity=0.1),
+    "popular": dict(students=3000, clubs=60, popularity=2.0),
+    "deep_chain": dict(students=3000, clubs=60, chain_depth=50),
+    "restricted": dict(students=3000, clubs=60, forbid_ratio=0.3, ban_grades=[2]),
+}
+
+
+# --- 1. 模擬學校產生器 ---
+def make_school(students=1000, clubs=40, movers=0.3, scarcity=0.5, popularity=1.0,
+                chain_depth=0, forbid_ratio=0.0, ban_grades=(), seed=0):
+    """
+    產生一所模擬學校，回傳 (學生志願 DataFrame, 社團缺額 DataFrame, 限制設定 dict)
+    - movers: 有填志願的學生比例
+    - scarcity: 總缺額 / 有填志願人數 (越小越搶手)
+    - popularity: 熱門程度的 Zipf 指數，0 為各社團一樣熱門，越大志願越集中在少數社團
+    - chain_depth: 另外放入的遞補鏈長度 (A 等 B 的位子、B 等 C 的位子...，只有鏈尾社團有缺額)
+    - forbid_ratio: 高一、高二各自禁止轉入的社團比例
+    - ban_grades: 完全凍結的年級，例如 [1] 或 [1, 2]
+    相同參數與 seed 一定產生相同資料。
+    """
+    rng = np.random.default_rng(seed)
+    n, k = int(students), int(clubs)
+    names = np.array([f"社團{j + 1:03d}" for j in range(k)], dtype=object)
+
+    grade = rng.choice([1, 2, 3], size=n, p=[0.4, 0.4, 0.2])
+    class_no = rng.integers(1, 16, size=n)
+    original = rng.integers(0, k, size=n)
+    no_club = rng.random(n) < 0.05 # 少數學生沒有原社團
+    submitted = np.datetime64("2024-09-01T08:00:00") + rng.integers(0, 7 * 86400, size=n).astype("timedelta64[s]")
+
+    # 依熱門程度加權、不重複抽出志願 (Gumbel top-k)，並排除自己的原社團
+    movers_mask = rng.random(n) < movers
+    counts = np.where(movers_mask, rng.integers(1, 11, size=n), 0)
+    keys = -np.log(np.arange(1, k + 1)) * popularity + rng.gumbel(size=(n, k))
+    keys[np.arange(n), original] = -np.inf
+    order = np.argsort(-keys, axis=1)[:, :10]
+
+    prefs = np.full((n, 10), None, dtype=object)
+    for i in range(10):
+        pick = counts > i
+        pick &= i < k - 1 # 社團數不足 10 個時，志願數最多為 k-1
+        if pick.any():
+            prefs[pick, i] = names[order[pick, i]]
+
+    vacancy = np.bincount(rng.integers(0, k, size=int(round(scarcity * movers_mask.sum()))), minlength=k)
+
+    # 遞補鏈: 鏈上的學生最早填寫，依序等待下一個社團的位子
+    depth = min(int(chain_depth), k - 1, n)
+    if depth > 0:
+        chain = rng.permutation(k)[:depth + 1]
+        members = rng.permutation(n)[:depth]
+        vacancy[chain[:-1]] = 0
+        vacancy[chain[-1]] += 1
+        earliest = submitted.min()
+        for j, idx in enumerate(members):
+            original[idx] = chain[j]
+            no_club[idx] = False
+            prefs[idx, :] = None
+            prefs[idx, 0] = names[chain[j + 1]]
+            submitted[idx] = earliest - np.timedelta64(depth - j, "s")
+
+    df = pd.DataFrame({
+        '學號': [f"S{i:06d}" for i in range(n)],
+        '姓名': [f"學生{i}" for i in range(n)],
+        '班級': [f"{g}{c:02d}" for g, c in zip(grade, class_no)],
+        '原社團': np.where(no_club, None, names[original]),
+        '填寫時間': submitted,
+    })
+    for i in range(10):
+        df[f'志願{i + 1}'] = prefs[:, i]
+    clubs_df = pd.DataFrame({'社團名稱': names, '目前缺額': vacancy})
+
+    n_forbid = int(round(forbid_ratio * k))
+    restrictions = {
+        "h1_forbidden": list(names[rng.permutation(k)[:n_forbid]]),
+        "h2_forbidden": list(names[rng.permutation(k)[:n_forbid]]),
+        "h1_ban_all": 1 in ban_grades,
+        "h2_ban_all": 2 in ban_grades,
+    }
+    return df, clubs_df, restrictions
+
+
+# --- 2. 量測 ---
+def time_phases(students_df, clubs_df, restrictions, swap_cycles=False):
+    """執行一次分發與匯出，回傳 (各階段秒數 dict, 分發結果)；分發各階段耗時取自 AllocationStats"""
+    result = process_allocation(students_df.copy(), clubs_df, swap_cycles=swap_cycles, **restrictions)
+    started = time.perf_counter()
+    write_workbook(io.BytesIO(), *result)
+    timings = dict(result[-1].timings, export=time.perf_counter() - started)
+    return timings, result
+
+def run_scenario(params, repeat=3, swap_cycles=False, measure_memory=True):
+    """產生資料並量測，回傳一列報表 (各階段取 repeat 次中最快的一次)"""
+    students_df, clubs_df, restrictions = make_school(**params)
+    best = {}
+    for _ in range(max(1, repeat)):
+        timings, result = time_phases(students_df, clubs_df, restrictions, swap_cycles)
+        for phase, seconds in timings.items():
+            best[phase] = min(seconds, best.get(phase, seconds))
+
+    result_df, vac_df, logs, swap_logs, stats = result
+    row = {phase: round(best.get(phase, 0.0), 4) for phase in PHASES}
+    row["total"] = round(sum(row[p] for p in PHASES), 4)
+
+    if measure_memory:
+        # tracemalloc 會拖慢執行，所以另外跑一次只量記憶體
+        tracemalloc.start()
+        time_phases(students_df, clubs_df, restrictions, swap_cycles)
+        row["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+
+    # 分發結果的摘要: 同一份資料在演算法未改變時應完全相同
+    row["moved"] = int((result_df['狀態'] == '成功').sum())
+    row["moves"] = len(logs)
+    row["swaps"] = len(swap_logs)
+    row["longest_chain"] = stats.longest_chain
+    return row
+
+
+# --- 3. 基準比較 ---
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_baseline(path, report):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+def compare(report, baseline, tolerance=0.25):
+    """
+    與基準比較，回傳問題清單 [(情境, 說明)]
+    - 總耗時或記憶體峰值超過基準 (1 + tolerance) 倍視為退步 (耗時差距需大於 NOISE_FLOOR)
+    - 相同參數下分發結果的摘要不同，代表演算法行為改變
+    """
+    problems = []
+    for name, row in report.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if base.get("params") != row.get("params"):
+            problems.append((name, "參數與基準不同，略過比較"))
+            continue
+        if row["total"] > base["total"] * (1 + tolerance) and row["total"] - base["total"] > NOISE_FLOOR:
+            slowest = max(PHASES, key=lambda p: row[p] - base.get(p, 0.0))
+            problems.append((name, f"變慢: {base['total']:.3f}s -> {row['total']:.3f}s (主要在 {slowest})"))
+        if "peak_mb" in row and "peak_mb" in base and row["peak_mb"] > base["peak_mb"] * (1 + tolerance):
+            problems.append((name, f"記憶體增加: {base['peak_mb']:.1f}MB -> {row['peak_mb']:.1f}MB"))
+        for key in ("moved", "moves", "swaps"):
+            if key in base and row[key] != base[key]:
+                problems.append((name, f"結果不同: {key} {base[key]} -> {row[key]}"))
+    return problems
+
+
+# --- 4. 命令列 ---
+def build_parser():
+    parser = argparse.ArgumentParser(description="學生轉社分發效能基準測試")
+    parser.add_argument("scenarios", nargs="*", help=f"要執行的情境 (預設全部: {', '.join(SCENARIOS)})")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="每個情境重複次數，取最快的一次 (預設 3)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help=f"基準檔 (預設: {BASELINE_FILE})")
+    parser.add_argument("--save-baseline", action="store_true", help="將本次結果存為基準")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允許的退步比例 (預設 0.25)")
+    parser.add_argument("--swap-cycles", action="store_true", help="交換階段另外嘗試三人以上的循環交換")
+    parser.add_argument("--no-memory", action="store_true", help="不量測記憶體峰值 (較快)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        print(f"未知的情境: {unknown} (可用: {', '.join(SCENARIOS)})", file=sys.stderr)
+        return 2
+
+    report = {}
+    print(f"{'情境':<12}" + "".join(f"{p:>9}" for p in PHASES + ["total"]) + f"{'peak_mb':>9}{'moves':>8}{'chain':>7}{'swaps':>7}")
+    for name in names:
+        row = run_scenario(SCENARIOS[name], repeat=args.repeat, swap_cycles=args.swap_cycles,
+                           measure_memory=not args.no_memory)
+        row["params"] = dict(SCENARIOS[name], swap_cycles=args.swap_cycles)
+        report[name] = row
+        print(f"{name:<12}" + "".join(f"{row[p]:>9.3f}" for p in PHASES + ["total"])
+              + f"{row.get('peak_mb', 0):>9.1f}{row['moves']:>8}{row['longest_chain']:>7}{row['swaps']:>7}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, dict(load_baseline(args.baseline), **report))
+        print(f"已儲存基準 -> {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print(f"找不到基準檔 {args.baseline}，可用 --save-baseline 建立")
+        return 0
+    problems = compare(report, baseline, args.tolerance)
+    for name, message in problems:
+        print(f"[{name}] {message}")
+    regressed = [p for p in problems if not p[1].startswith("參數")]
+    if not regressed:
+        print("與基準相比沒有退步")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
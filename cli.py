@@ -0,0 +1,128 @@
+"""
+學生轉社系統 - 命令列版本 (Headless CLI)
+不需啟動 Streamlit 伺服器即可執行分發，適合排程批次作業：
+
+    python cli.py 學生志願.xlsx 社團缺額.xlsx -o 轉社結果.xlsx --h1-forbid 熱舞社 --h2-ban-all
+"""
+import argparse
+import sys
+import time
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="學生轉社分發 (命令列版本)")
+    parser.add_argument("students", help="學生志願 (.xlsx/.csv/.parquet/.arrow，需含 學號/班級/填寫時間/原社團/志願1..10)")
+    parser.add_argument("vacancies", help="社團缺額 (.xlsx/.csv/.parquet/.arrow，需含 社團名稱/目前缺額)")
+    parser.add_argument("-o", "--output", default="轉社結果.xlsx",
+                        help="輸出的結果 Excel (預設: 轉社結果.xlsx)；副檔名為 .zip 時改為輸出 CSV 壓縮檔 (較快)")
+    parser.add_argument("--sheet", action="append", default=None, metavar="工作表",
+                        help="只匯出指定的工作表 (可重複指定，預設全部)")
+    parser.add_argument("--h1-forbid", action="append", default=[], metavar="社團", help="高一禁止轉入的社團 (可重複指定)")
+    parser.add_argument("--h2-forbid", action="append", default=[], metavar="社團", help="高二禁止轉入的社團 (可重複指定)")
+    parser.add_argument("--h1-ban-all", action="store_true", help="禁止高一所有轉社 (完全凍結)")
+    parser.add_argument("--h2-ban-all", action="store_true", help="禁止高二所有轉社 (完全凍結)")
+    parser.add_argument("--rules", metavar="檔案",
+                        help="限制規則檔 (.json/.csv/.xlsx)，可依年級 (含高三)、班級或原社團限制轉入，格式見 rules.py")
+    parser.add_argument("--swap-cycles", action="store_true", help="交換階段另外嘗試三人以上的循環交換")
+    parser.add_argument("--engine", choices=["ripple", "exact"], default="ripple",
+                        help="分發引擎: ripple 動態遞補 + 交換 (預設)；exact 精確配對 (時間優先交換鏈)")
+    parser.add_argument("--optimizer", choices=["swap", "sum", "lex"], default="swap",
+                        help="最佳化階段: swap 兩兩交換 (預設)；sum 最小成本流 (志願序總和最小)；lex 最小成本流 (志願序優先)")
+    parser.add_argument("--time-budget", type=float, default=10.0, metavar="秒",
+                        help="最小成本流的時間預算 (預設 10 秒)，用完時保留目前已改善的結果")
+    parser.add_argument("--snapshot-dir", default="snapshots", metavar="資料夾",
+                        help="學生資料快照的資料夾 (預設: snapshots)；同一份學生檔第二次起直接載入快照，不需再解析檔案")
+    parser.add_argument("--no-snapshot", action="store_true", help="不使用也不寫入學生資料快照")
+    parser.add_argument("--explain", action="append", default=[], metavar="學號",
+                        help="分發後列出該學生前面志願沒有錄取的原因 (可重複指定)")
+    parser.add_argument("--timing", action="store_true", help="顯示各階段耗時 (含模組載入時間)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不顯示進度")
+    return parser
+
+
+def main(argv=None):
+    started = time.perf_counter()
+    args = build_parser().parse_args(argv)
+    timings = []
+
+    def lap(label, since):
+        now = time.perf_counter()
+        timings.append((label, now - since))
+        return now
+
+    # 延後載入分發核心 (含 pandas)，讓 --help 與參數錯誤可以立即回應
+    from allocation import EXPORT_SHEETS, process_allocation, write_csv_zip, write_workbook
+    from ingest import read_students, read_vacancies
+    from rules import load_rules
+    from snapshot import SnapshotStore
+    t = lap("載入模組", started)
+
+    unknown = [s for s in args.sheet or [] if s not in EXPORT_SHEETS]
+    if unknown:
+        print(f"未知的工作表: {unknown} (可用: {', '.join(EXPORT_SHEETS)})", file=sys.stderr)
+        return 2
+
+    try:
+        if args.no_snapshot:
+            students = read_students(args.students).df
+        else:
+            snapshot, from_snapshot = SnapshotStore(args.snapshot_dir).load_students(args.students)
+            students = snapshot.students
+            if from_snapshot and not args.quiet:
+                print("學生資料未變更，由快照載入", file=sys.stderr)
+        clubs_df = read_vacancies(args.vacancies)
+        rules = load_rules(args.rules) if args.rules else []
+    except (OSError, ValueError) as e:
+        print(f"讀取錯誤: {e}", file=sys.stderr)
+        return 2
+    t = lap("讀取資料", t)
+
+    def on_progress(text, percent=None):
+        if not args.quiet:
+            print(text, file=sys.stderr)
+
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(
+        students,
+        clubs_df,
+        h1_forbidden=args.h1_forbid,
+        h2_forbidden=args.h2_forbid,
+        h1_ban_all=args.h1_ban_all,
+        h2_ban_all=args.h2_ban_all,
+        swap_cycles=args.swap_cycles,
+        on_progress=on_progress,
+        engine=args.engine,
+        optimizer=args.optimizer,
+        time_budget=args.time_budget,
+        rules=rules
+    )
+    t = lap("分發", t)
+
+    writer = write_csv_zip if args.output.lower().endswith(".zip") else write_workbook
+    writer(args.output, result_df, vac_df, logs, swap_logs, stats, sheets=args.sheet)
+    lap("寫出結果", t)
+
+    moved = int((result_df['狀態'] == '成功').sum())
+    print(f"完成: 共 {len(result_df)} 名學生，{moved} 人成功轉社，{len(swap_logs)} 組交換 -> {args.output}")
+    if stats.dropped_prefs and not args.quiet:
+        print(f"略過 {stats.dropped_prefs} 個無效志願 (不在缺額表、重複填寫或被限制)", file=sys.stderr)
+    if args.timing:
+        for label, seconds in timings:
+            print(f"  {label}: {seconds:.3f}s", file=sys.stderr)
+            if label == "分發":
+                for name, sec in stats.timings.items():
+                    print(f"    {stats.PHASE_LABELS[name]}: {sec:.3f}s", file=sys.stderr)
+        print(f"  總計: {time.perf_counter() - started:.3f}s", file=sys.stderr)
+        print(f"  遞補 {stats.moves} 次 (最長連鎖 {stats.longest_chain} 人)，候補檢查 {stats.scans} 次，"
+              f"志願檢查 {stats.pref_checks} 次，交換候選 {stats.swap_attempts} 組", file=sys.stderr)
+    for student_id in args.explain:
+        explained = logs.provenance.explain(student_id)
+        if explained is None:
+            print(f"\n找不到學號: {student_id}")
+        else:
+            print(f"\n學號 {student_id}:")
+            print(explained.to_string(index=False) if not explained.empty else "  沒有填寫志願")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,522 @@
+"""
+學生轉社系統 - 差異測試 (Differential Testing)
+以 reference.py 凍結的參考分發為標準答案，隨機產生各種學校 (小型、中型與大型學校，並刻意加入同時填寫、
+空白與重複的志願、全形社團名稱、不在缺額表的社團、限制規則等輸入)，檢查較快的分發方式 (CANDIDATES) 的
+分發結果、錄取志願序與剩餘缺額是否與參考答案完全相同。每個案例另有幾次「只改缺額或限制」的重算，
+用來檢查增量重算。發現差異時自動縮小 (shrink) 成仍然有差異的最小案例。各案例以 process pool 平行執行:
+
+    python differential.py --cases 500 --workers 8
+    python differential.py --cases 50 --seed 1000 --max-students 5000 -o 差異案例
+    python differential.py --replay 差異案例/case_1017_incremental.json
+
+精確配對與最小成本流的結果本來就與參考分發不同 (見 ENGINES / OPTIMIZERS)，不在這裡比較。
+參考分發本身另外與原始版本 (reference.baseline_allocation) 比對，只使用兩者規則相同的輸入 (plain_case / is_plain):
+
+    python differential.py --baseline --cases 500
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from allocation import NO_RANK, PREF_COLS, Allocator, StudentInput, normalize_club_name, process_allocation
+from bench import make_school
+from reference import baseline_allocation, reference_allocation
+from rules import Rule, legacy_rules, rules_from_dicts
+
+MAX_STUDENTS = 2000 # 大型案例的學生數上限 (參考分發是 O(n²)，太大會很慢)
+SHRINK_CHECKS = 2000 # 縮小一個案例時最多重新比對幾次
+PREF_COLUMNS = [f'志願{i}' for i in range(1, PREF_COLS + 1)]
+FULLWIDTH = str.maketrans('0123456789', '０１２３４５６７８９')
+BASELINE = 'baseline' # check_case 中代表「參考分發與原始版本比對」的名稱
+
+
+# --- 1. 隨機案例 ---
+def random_case(seed, max_students=MAX_STUDENTS):
+    """
+    產生一個案例 {'seed', 'students', 'steps'}；相同 seed 一定產生相同案例
+    steps 為依序重算的 [{'clubs': 缺額表, 'restrictions': 限制設定}]，第一個是基準，之後只改缺額或限制
+    """
+    rng = np.random.default_rng(seed)
+    size = rng.random()
+    if size < 0.6:
+        n = int(rng.integers(1, 30))
+    elif size < 0.95:
+        n = int(rng.integers(30, 400))
+    else:
+        n = int(rng.integers(400, max(max_students, 401)))
+    n = min(n, max_students)
+    k = int(rng.integers(1, 30))
+    students, clubs, restrictions = make_school(
+        students=n, clubs=k, movers=rng.uniform(0.3, 1.0), scarcity=rng.uniform(0.05, 1.2),
+        popularity=rng.uniform(0, 2), chain_depth=int(rng.integers(0, 6)),
+        forbid_ratio=rng.uniform(0, 0.3) if rng.random() < 0.5 else 0.0,
+        ban_grades=[g for g in (1, 2) if rng.random() < 0.1], seed=seed)
+    names = clubs['社團名稱'].tolist()
+
+    # 志願: 不在缺額表、重複填寫、中間的空白、全形或多餘空白的名稱、填自己的原社團
+    cells = students[PREF_COLUMNS].to_numpy(dtype=object)
+    noise = rng.random(cells.shape)
+    original = students['原社團'].to_numpy(dtype=object)
+    for r, i in zip(*np.nonzero(noise < 0.15)):
+        kind = noise[r, i]
+        if kind < 0.03:
+            cells[r, i] = '不存在社'
+        elif kind < 0.06 and i > 0:
+            cells[r, i] = cells[r, rng.integers(0, i)]
+        elif kind < 0.09:
+            cells[r, i] = [None, '', 'nan', ' '][rng.integers(0, 4)]
+        elif kind < 0.12 and isinstance(cells[r, i], str):
+            cells[r, i] = cells[r, i].translate(FULLWIDTH) if rng.random() < 0.5 else f" {cells[r, i]}  "
+        elif kind >= 0.12:
+            cells[r, i] = original[r]
+    students[PREF_COLUMNS] = cells
+
+    # 填寫時間相同 (排序後的先後) 或無法解析；班級無法判斷年級
+    if rng.random() < 0.3:
+        students['填寫時間'] = students['填寫時間'].dt.floor('D' if rng.random() < 0.5 else 'h')
+    if rng.random() < 0.1:
+        students.loc[rng.random(n) < 0.05, '填寫時間'] = pd.NaT
+    if rng.random() < 0.2:
+        students.loc[rng.random(n) < 0.1, '班級'] = ['資優班', '', '3年5班'][rng.integers(0, 3)]
+
+    # 缺額表: 同一個社團分成兩列、名稱多了空白，或缺少某個原社團 (缺額視為 0)
+    if rng.random() < 0.2 and k > 1:
+        j = int(rng.integers(0, k))
+        extra = int(rng.integers(0, 3))
+        clubs = pd.concat([clubs, pd.DataFrame({'社團名稱': [f" {names[j]}"], '目前缺額': [extra]})], ignore_index=True)
+    if rng.random() < 0.2 and k > 1:
+        clubs = clubs.drop(index=int(rng.integers(0, k))).reset_index(drop=True)
+
+    restrictions['rules'] = random_rules(rng, names) if rng.random() < 0.3 else []
+    steps = [{'clubs': clubs, 'restrictions': restrictions}]
+    for _ in range(int(rng.integers(0, 3))):
+        clubs = clubs.copy()
+        change = rng.random(len(clubs)) < 0.3
+        clubs.loc[change, '目前缺額'] = (clubs.loc[change, '目前缺額'] + rng.integers(-1, 3, change.sum())).clip(lower=0)
+        restrictions = dict(restrictions)
+        if rng.random() < 0.3:
+            restrictions['h1_forbidden'] = list(rng.choice(names, size=int(rng.integers(0, 3))))
+        if rng.random() < 0.2:
+            restrictions['rules'] = random_rules(rng, names)
+        steps.append({'clubs': clubs, 'restrictions': restrictions})
+    return {'seed': seed, 'students': students, 'steps': steps}
+
+def random_rules(rng, names):
+    """1~2 條隨機的限制規則 (高三、班級範圍、原社團)"""
+    def some_clubs():
+        return list(rng.choice(names, size=int(rng.integers(1, min(3, len(names)) + 1)), replace=False))
+    options = [
+        lambda: Rule(grades=[3]),
+        lambda: Rule(grades=[3], clubs=some_clubs()),
+        lambda: Rule(classes=[f"{rng.integers(1, 4)}01-{rng.integers(1, 4)}08"], clubs=some_clubs()),
+        lambda: Rule(classes=[f"{rng.integers(1, 4)}{rng.integers(1, 16):02d}"]),
+        lambda: Rule(from_clubs=some_clubs(), clubs=some_clubs()),
+    ]
+    return [options[rng.integers(0, len(options))]() for _ in range(int(rng.integers(1, 3)))]
+
+def plain_case(seed, max_students=MAX_STUDENTS):
+    """
+    只含 is_plain 輸入的案例 (格式同 random_case)，用來比對參考分發與原始版本:
+    沒有原社團的學生改為名叫 'None' 的社團，並有學生想轉入 'None'；另有不在缺額表的社團、重複與中間空白的志願
+    """
+    rng = np.random.default_rng(seed)
+    n = min(int(rng.integers(1, 30)) if rng.random() < 0.7 else int(rng.integers(30, 300)), max_students)
+    k = int(rng.integers(1, 15))
+    students, clubs, restrictions = make_school(
+        students=n, clubs=k, movers=rng.uniform(0.3, 1.0), scarcity=rng.uniform(0.05, 1.2),
+        popularity=rng.uniform(0, 2), chain_depth=int(rng.integers(0, 6)),
+        forbid_ratio=rng.uniform(0, 0.3) if rng.random() < 0.5 else 0.0,
+        ban_grades=[g for g in (1, 2) if rng.random() < 0.1], seed=seed)
+    students['原社團'] = students['原社團'].fillna('None')
+
+    cells = students[PREF_COLUMNS].to_numpy(dtype=object)
+    noise = rng.random(cells.shape)
+    for r, i in zip(*np.nonzero(noise < 0.12)):
+        kind = noise[r, i]
+        if kind < 0.03:
+            cells[r, i] = '不存在社'
+        elif kind < 0.06 and i > 0:
+            cells[r, i] = cells[r, rng.integers(0, i)]
+        elif kind < 0.08:
+            cells[r, i] = None
+        else:
+            cells[r, i] = 'None'
+    students[PREF_COLUMNS] = cells
+    if rng.random() < 0.3:
+        students['填寫時間'] = students['填寫時間'].dt.floor('D')
+
+    if rng.random() < 0.3 and k > 1:
+        clubs = clubs.drop(index=int(rng.integers(0, k))).reset_index(drop=True)
+    if rng.random() < 0.3:
+        clubs = pd.concat([clubs, pd.DataFrame({'社團名稱': ['None'], '目前缺額': [int(rng.integers(0, 3))]})], ignore_index=True)
+    steps = [{'clubs': clubs, 'restrictions': restrictions}]
+    for _ in range(int(rng.integers(0, 3))):
+        clubs = clubs.copy()
+        change = rng.random(len(clubs)) < 0.3
+        clubs.loc[change, '目前缺額'] = (clubs.loc[change, '目前缺額'] + rng.integers(-1, 3, change.sum())).clip(lower=0)
+        steps.append({'clubs': clubs, 'restrictions': restrictions})
+    return {'seed': seed, 'students': students, 'steps': steps}
+
+def is_plain(case):
+    """
+    案例是否避開了參考分發與原始版本刻意不同之處 (見 reference.py): 每位學生都有原社團，名稱都已是正規化後的寫法
+    (不是空字串或 'nan')，缺額表沒有重複的社團，班級只有半形數字，也沒有限制規則
+    """
+    def plain(name):
+        return isinstance(name, str) and name not in ('', 'nan') and ' '.join(unicodedata.normalize('NFKC', name).split()) == name
+
+    students = case['students']
+    if not all(plain(c) for c in students['原社團']):
+        return False
+    for column in PREF_COLUMNS:
+        if column in students.columns and not all(plain(c) or (not isinstance(c, str) and pd.isna(c)) for c in students[column]):
+            return False
+    if '班級' in students.columns and not all(str(c).isascii() for c in students['班級']):
+        return False
+    for step in case['steps']:
+        names = step['clubs']['社團名稱'].tolist()
+        if not all(plain(c) for c in names) or len(set(names)) != len(names):
+            return False
+        restrictions = step['restrictions']
+        if restrictions.get('rules') or not all(plain(c) for key in ('h1_forbidden', 'h2_forbidden') for c in restrictions.get(key, [])):
+            return False
+    return True
+
+
+# --- 2. 比較 ---
+def canonical(result_df, vac_df):
+    """分發結果轉成與 reference_allocation 相同的形式: ([學號, 分發結果 (正規化), 錄取志願序 (0 起算)], {社團: 剩餘缺額})"""
+    ranks = pd.to_numeric(result_df['錄取志願序'], errors='coerce')
+    frame = pd.DataFrame({
+        '學號': result_df['學號'].tolist(),
+        '分發結果': [normalize_club_name(c) for c in result_df['分發結果']],
+        '錄取志願序': np.where(ranks.isna(), NO_RANK, ranks.fillna(0) - 1).astype(int).tolist(),
+    })
+    return frame, dict(zip(vac_df['社團名稱'], vac_df['剩餘缺額'].astype(int).tolist()))
+
+def first_difference(expected, actual, columns=('分發結果', '錄取志願序')):
+    """兩份結果 (只比較 columns 與剩餘缺額) 的第一個差異 (文字說明)；完全相同時回傳 None"""
+    (expected_df, expected_left), (actual_df, actual_left) = expected, actual
+    if expected_df['學號'].tolist() != actual_df['學號'].tolist():
+        return f"學生順序不同: 應為 {expected_df['學號'].tolist()[:10]}...，實際為 {actual_df['學號'].tolist()[:10]}..."
+    for column in columns:
+        diff = expected_df[column].to_numpy() != actual_df[column].to_numpy()
+        if diff.any():
+            k = int(diff.argmax())
+            return (f"學號 {expected_df['學號'].iloc[k]} 的{column}不同: 應為 {expected_df[column].iloc[k]}，"
+                    f"實際為 {actual_df[column].iloc[k]} (共 {int(diff.sum())} 人不同)")
+    if expected_left != actual_left:
+        club = next(c for c in sorted(set(expected_left) | set(actual_left)) if expected_left.get(c) != actual_left.get(c))
+        return f"{club} 的剩餘缺額不同: 應為 {expected_left.get(club)}，實際為 {actual_left.get(club)}"
+    return None
+
+def expected_results(case):
+    return [reference_allocation(case['students'], step['clubs'], **step['restrictions']) for step in case['steps']]
+
+
+# --- 3. 受測的分發方式 (每個都要與參考分發完全相同) ---
+def _each_step(case, run):
+    return [canonical(*run(step['clubs'], step['restrictions'])[:2]) for step in case['steps']]
+
+def run_ripple(case):
+    """預設引擎 (事件驅動遞補 + 索引交換)，每次都重新分發"""
+    return _each_step(case, lambda clubs, restrictions: process_allocation(case['students'].copy(), clubs, **restrictions))
+
+def run_incremental(case):
+    """同一個 Allocator 依序重算各步驟 (沿用前一次的遞補紀錄)"""
+    allocator = Allocator(case['students'].copy())
+    return _each_step(case, lambda clubs, restrictions: allocator.run(clubs, **restrictions))
+
+def run_snapshot(case):
+    """學生資料寫成快照再以 memory map 讀回後分發"""
+    from snapshot import StudentSnapshot, read_snapshot, write_snapshot
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "case.snap")
+        write_snapshot(path, StudentSnapshot(StudentInput.from_frame(case['students'].copy()), set(), [], "case"))
+        students = read_snapshot(path).students
+        results = _each_step(case, lambda clubs, restrictions: process_allocation(students, clubs, **restrictions))
+        del students
+    return results
+
+def run_store(case):
+    """分發紀錄保存格式 (store.pack_result) 讀回的結果"""
+    from store import pack_result, unpack_result
+    return _each_step(case, lambda clubs, restrictions: unpack_result(pack_result(
+        process_allocation(case['students'].copy(), clubs, **restrictions))))
+
+def run_rules(case):
+    """高一 / 高二設定先轉成限制規則 (rules.legacy_rules) 再分發"""
+    def run(clubs, restrictions):
+        restrictions = dict(restrictions)
+        rules = list(restrictions.pop('rules', []))
+        return process_allocation(case['students'].copy(), clubs, rules=legacy_rules(**restrictions) + rules)
+    return _each_step(case, run)
+
+CANDIDATES = {
+    'ripple': run_ripple,
+    'incremental': run_incremental,
+    'snapshot': run_snapshot,
+    'store': run_store,
+    'rules': run_rules,
+}
+
+def check_baseline(case):
+    """
+    比對參考分發與原始版本 (只適用於 is_plain 的案例)，回傳格式同 check_case
+    原始版本的志願序不算被禁止的志願，有禁止社團時只比對分發結果與剩餘缺額
+    """
+    for step_no, step in enumerate(case['steps']):
+        restrictions = {key: value for key, value in step['restrictions'].items() if key != 'rules'}
+        try:
+            expected = reference_allocation(case['students'], step['clubs'], **step['restrictions'])
+            actual = baseline_allocation(case['students'], step['clubs'], **restrictions)
+        except Exception as e:
+            return [{'candidate': BASELINE, 'step': step_no, 'message': f"執行錯誤 {type(e).__name__}: {e}"}]
+        forbidden = restrictions.get('h1_forbidden') or restrictions.get('h2_forbidden')
+        message = first_difference(expected, actual, ('分發結果',) if forbidden else ('分發結果', '錄取志願序'))
+        if message:
+            return [{'candidate': BASELINE, 'step': step_no, 'message': message}]
+    return []
+
+def check_case(case, candidates=None, expected=None):
+    """
+    比對各分發方式與參考分發，回傳差異 [{'candidate', 'step', 'message'}] (沒有差異時為空)
+    candidates 可包含 BASELINE: 改為比對參考分發與原始版本 (check_baseline)
+    """
+    if BASELINE in (candidates or ()):
+        others = [name for name in candidates if name != BASELINE]
+        return check_baseline(case) + (check_case(case, others, expected) if others else [])
+    expected = expected if expected is not None else expected_results(case)
+    failures = []
+    for name in candidates or CANDIDATES:
+        try:
+            actual = CANDIDATES[name](case)
+        except Exception as e:
+            failures.append({'candidate': name, 'step': None, 'message': f"執行錯誤 {type(e).__name__}: {e}"})
+            continue
+        for step, (want, got) in enumerate(zip(expected, actual)):
+            message = first_difference(want, got)
+            if message:
+                failures.append({'candidate': name, 'step': step, 'message': message})
+                break
+    return failures
+
+
+# --- 4. 縮小案例 (Shrinking) ---
+def _with(case, students=None, steps=None):
+    return {'seed': case['seed'],
+            'students': case['students'] if students is None else students.reset_index(drop=True),
+            'steps': case['steps'] if steps is None else steps}
+
+def _simplifications(case):
+    # 由大到小的簡化: 少一次重算、少一群學生、少一個社團、少一條限制、少一個志願、少一個缺額
+    steps = case['steps']
+    for i in range(len(steps) - 1, -1, -1):
+        if len(steps) > 1:
+            yield _with(case, steps=steps[:i] + steps[i + 1:])
+
+    students = case['students']
+    n = len(students)
+    size = n // 2
+    while size >= 1:
+        for start in range(0, n, size):
+            yield _with(case, students=students.drop(index=students.index[start:start + size]))
+        size //= 2
+
+    for name in sorted({normalize_club_name(c) for step in steps for c in step['clubs']['社團名稱']}):
+        yield _with(case, steps=[dict(step, clubs=step['clubs'][step['clubs']['社團名稱'].map(normalize_club_name) != name]
+                                      .reset_index(drop=True)) for step in steps])
+
+    for i, step in enumerate(steps):
+        for key, value in step['restrictions'].items():
+            options = []
+            if isinstance(value, (list, tuple)):
+                options = [list(value[:j]) + list(value[j + 1:]) for j in range(len(value))]
+            elif value:
+                options = [False]
+            for option in options:
+                restrictions = dict(step['restrictions'], **{key: option})
+                yield _with(case, steps=steps[:i] + [dict(step, restrictions=restrictions)] + steps[i + 1:])
+
+    for column in reversed(PREF_COLUMNS):
+        if column not in students.columns:
+            continue
+        filled = students.index[students[column].notna()]
+        if len(filled) == 0:
+            simpler = students.drop(columns=column)
+            yield _with(case, students=simpler)
+        for row in filled:
+            simpler = students.copy()
+            simpler.loc[row, column] = None
+            yield _with(case, students=simpler)
+
+    for i, step in enumerate(steps):
+        for row in step['clubs'].index[step['clubs']['目前缺額'] > 0]:
+            clubs = step['clubs'].copy()
+            clubs.loc[row, '目前缺額'] -= 1
+            yield _with(case, steps=steps[:i] + [dict(step, clubs=clubs)] + steps[i + 1:])
+
+def shrink(case, candidate, max_checks=SHRINK_CHECKS):
+    """
+    將 candidate 有差異的案例縮小: 反覆套用第一個仍有差異的簡化，直到沒有簡化能保留差異 (或達到比對次數上限)
+    candidate 為 BASELINE 時只使用仍然 is_plain 的簡化；回傳 (最小案例, 比對次數)
+    """
+    checks = 0
+    progress = True
+    while progress and checks < max_checks:
+        progress = False
+        for simpler in _simplifications(case):
+            if candidate == BASELINE and not is_plain(simpler):
+                continue
+            if checks >= max_checks:
+                break
+            checks += 1
+            if check_case(simpler, [candidate]):
+                case = simpler
+                progress = True
+                break
+    return case, checks
+
+
+# --- 5. 案例存檔 (JSON，可用 --replay 重現) ---
+def _records(df):
+    df = df.copy()
+    if '填寫時間' in df.columns:
+        df['填寫時間'] = pd.to_datetime(df['填寫時間'], errors='coerce').map(lambda t: None if pd.isna(t) else t.isoformat())
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def case_to_json(case):
+    steps = []
+    for step in case['steps']:
+        restrictions = dict(step['restrictions'])
+        restrictions['rules'] = [rule.to_dict() for rule in restrictions.get('rules', [])]
+        steps.append({'clubs': _records(step['clubs']), 'restrictions': restrictions})
+    return json.dumps({'seed': case['seed'], 'students': _records(case['students']), 'steps': steps},
+                      ensure_ascii=False, indent=1, default=str)
+
+def case_from_json(text):
+    data = json.loads(text)
+    students = pd.DataFrame(data['students'])
+    if '填寫時間' in students.columns:
+        students['填寫時間'] = pd.to_datetime(students['填寫時間'], errors='coerce')
+    steps = []
+    for step in data['steps']:
+        restrictions = dict(step['restrictions'])
+        restrictions['rules'] = rules_from_dicts(restrictions.get('rules', []))
+        steps.append({'clubs': pd.DataFrame(step['clubs'], columns=['社團名稱', '目前缺額']), 'restrictions': restrictions})
+    return {'seed': data['seed'], 'students': students, 'steps': steps}
+
+
+# --- 6. 平行執行 ---
+def check_seed(seed, candidates=None, max_students=MAX_STUDENTS, shrink_cases=True):
+    """
+    產生並檢查一個案例 (在 worker process 中執行)，回傳 {'seed', 'students', 'seconds', 'failures'}
+    candidates 為 [BASELINE] 時改用 plain_case 產生案例
+    """
+    started = time.perf_counter()
+    case = plain_case(seed, max_students) if candidates == [BASELINE] else random_case(seed, max_students)
+    failures = check_case(case, candidates)
+    for failure in failures:
+        if shrink_cases:
+            small, checks = shrink(case, failure['candidate'])
+            failure['checks'] = checks
+            smaller = check_case(small, [failure['candidate']])
+            if smaller:
+                failure.update(step=smaller[0]['step'], message=smaller[0]['message'])
+        else:
+            small = case
+        failure['case'] = case_to_json(small)
+        failure['students'] = len(small['students'])
+    return {'seed': seed, 'students': len(case['students']), 'seconds': time.perf_counter() - started, 'failures': failures}
+
+def run_cases(seeds, candidates=None, max_students=MAX_STUDENTS, workers=None, shrink_cases=True, on_done=None):
+    """平行檢查多個案例，回傳依 seeds 順序的 check_seed 結果；workers=1 時在目前的 process 依序執行"""
+    seeds = list(seeds)
+    reports = {}
+    workers = min(workers or os.cpu_count() or 1, len(seeds)) or 1
+    if workers == 1:
+        for seed in seeds:
+            reports[seed] = check_seed(seed, candidates, max_students, shrink_cases)
+            if on_done:
+                on_done(reports[seed], len(reports), len(seeds))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(check_seed, seed, candidates, max_students, shrink_cases) for seed in seeds]
+            for future in as_completed(futures):
+                report = future.result()
+                reports[report['seed']] = report
+                if on_done:
+                    on_done(report, len(reports), len(seeds))
+    return [reports[seed] for seed in seeds]
+
+
+# --- 7. 命令列 ---
+def build_parser():
+    parser = argparse.ArgumentParser(description="差異測試: 比較各分發方式與參考分發的結果")
+    parser.add_argument("--cases", type=int, default=200, help="隨機案例數 (預設 200)")
+    parser.add_argument("--seed", type=int, default=0, help="第一個案例的 seed (預設 0)，案例為 seed ~ seed+cases-1")
+    parser.add_argument("--max-students", type=int, default=MAX_STUDENTS, help=f"大型案例的學生數上限 (預設 {MAX_STUDENTS})")
+    parser.add_argument("--candidates", nargs="+", choices=list(CANDIDATES), default=None, help="只檢查指定的分發方式 (預設全部)")
+    parser.add_argument("--baseline", action="store_true", help="改為以 plain_case 比對參考分發與原始版本")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="同時執行的 process 數 (預設為 CPU 核心數)")
+    parser.add_argument("--no-shrink", action="store_true", help="發現差異時不縮小案例")
+    parser.add_argument("-o", "--output", default=None, metavar="資料夾", help="將有差異的 (縮小後) 案例存成 JSON")
+    parser.add_argument("--replay", default=None, metavar="案例.json", help="重新檢查一個存下來的案例並列出內容")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不顯示進度")
+    return parser
+
+def print_case(case, file=sys.stdout):
+    print(case['students'].to_string(index=False), file=file)
+    for k, step in enumerate(case['steps']):
+        restrictions = {key: value for key, value in step['restrictions'].items() if value}
+        print(f"[第 {k} 次分發] 缺額 {dict(zip(step['clubs']['社團名稱'], step['clubs']['目前缺額']))} 限制 {restrictions}", file=file)
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.baseline:
+        args.candidates = [BASELINE]
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as f:
+            case = case_from_json(f.read())
+        print_case(case)
+        failures = check_case(case, args.candidates)
+        for failure in failures:
+            print(f"✗ {failure['candidate']} (第 {failure['step']} 次分發): {failure['message']}")
+        print("與參考分發相同" if not failures else f"{len(failures)} 個分發方式有差異")
+        return 1 if failures else 0
+
+    started = time.perf_counter()
+
+    def on_done(report, done, total):
+        if not args.quiet:
+            mark = "✗" if report['failures'] else "✓"
+            print(f"[{done}/{total}] {mark} seed {report['seed']}: {report['students']} 名學生，{report['seconds']:.2f}s", file=sys.stderr)
+
+    reports = run_cases(range(args.seed, args.seed + args.cases), args.candidates, args.max_students, args.workers,
+                        shrink_cases=not args.no_shrink, on_done=on_done)
+    failures = [(report['seed'], failure) for report in reports for failure in report['failures']]
+    largest = max((report['students'] for report in reports), default=0)
+    print(f"完成: {len(reports)} 個案例 (最大 {largest} 名學生)，{len(failures)} 個差異，耗時 {time.perf_counter() - started:.1f}s")
+    for seed, failure in failures:
+        print(f"\n✗ seed {seed} / {failure['candidate']} (第 {failure['step']} 次分發): {failure['message']}")
+        print(f"  縮小後 {failure['students']} 名學生 (python differential.py --replay ... 可重現)")
+        print_case(case_from_json(failure['case']))
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            path = os.path.join(args.output, f"case_{seed}_{failure['candidate']}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(failure['case'])
+            print(f"  已存檔: {path}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
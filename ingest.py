@@ -0,0 +1,188 @@
+"""
+學生志願檔與社團缺額檔的讀取 (Ingestion)
+- Excel: 以 openpyxl 唯讀模式逐列讀取，一次完成欄位檢查、重複學號偵測與社團名稱收集，
+  只保留分發會用到的欄位，避免 pd.read_excel 之後再多次複製整份資料。
+- CSV / Parquet / Arrow IPC (Feather): 欄位格式與 Excel 相同，檢查方式也相同；
+  從檔案路徑讀取二進位格式時使用 memory map，重複載入同一個檔案幾乎不需額外時間。
+"""
+import math
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from allocation import (NO_CLUB, PREF_COLS, STUDENT_COLUMNS, InputError, missing_columns, normalize_club_name, prepare_students,
+                        prepare_vacancies)
+
+BLANK = math.nan # 空白格與 pd.read_excel 相同，以 NaN 表示
+# pd.read_excel 預設視為空白的字串 (與 pandas 的 na_values 預設值相同，讀取結果才會一致)
+NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+
+class StudentSheet:
+    """
+    串流讀取的結果
+    - df: 只含分發所需欄位的 DataFrame (學號已轉為去除空白的字串，無姓名欄時補空字串)
+    - clubs: 原社團與各志願中出現過的社團名稱 (已正規化，與分發時相同；供限制設定與缺額表使用)
+    - columns: 原始標題列 (已去除前後空白)
+    """
+    def __init__(self, df, clubs, columns):
+        self.df = df
+        self.clubs = clubs
+        self.columns = columns
+
+
+def club_names(values):
+    """檔案中出現過的社團名稱 (原值) 正規化後的集合，空白不算"""
+    return {normalize_club_name(v) for v in values} - {NO_CLUB}
+
+
+def read_students_xlsx(source):
+    """
+    逐列讀取學生志願 Excel (第一個工作表，第一列為標題)
+    source 可為檔案路徑或 file-like 物件。缺少必要欄位或學號重複時丟出 InputError。
+    """
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        columns = ['' if h is None else str(h).strip() for h in header]
+        missing = missing_columns(columns)
+        if missing:
+            raise InputError(f"缺少必要欄位: {missing}", missing=missing, columns=columns)
+        
+        # 只保留會用到的欄位 (同名欄位以第一個為準)
+        wanted = {}
+        for pos, name in enumerate(columns):
+            if name in STUDENT_COLUMNS and name not in wanted:
+                wanted[name] = pos
+        data = {name: [] for name in wanted}
+        club_cols = [name for name in wanted if name == '原社團' or name.startswith('志願')]
+        
+        interned = {} # 相同的字串 (社團名稱、班級) 共用同一個物件
+        seen_ids = set()
+        duplicates = []
+        clubs = set()
+        
+        for row in rows:
+            if all(v is None or (isinstance(v, str) and v in NA_STRINGS) for v in row):
+                continue # 略過整列空白
+            for name, pos in wanted.items():
+                v = row[pos] if pos < len(row) else None
+                if v is None:
+                    v = BLANK
+                elif isinstance(v, str):
+                    v = BLANK if v in NA_STRINGS else interned.setdefault(v, v)
+                data[name].append(v)
+            
+            sid = str(data['學號'][-1]).strip()
+            data['學號'][-1] = sid
+            if sid in seen_ids:
+                duplicates.append(sid)
+            seen_ids.add(sid)
+            
+            for name in club_cols:
+                v = data[name][-1]
+                if v is not BLANK:
+                    clubs.add(v)
+    finally:
+        wb.close()
+    
+    if duplicates:
+        dup_ids = list(dict.fromkeys(duplicates))
+        raise InputError(f"發現重複學號，無法處理: {dup_ids}", duplicates=dup_ids)
+    
+    df = pd.DataFrame(data)
+    if '姓名' not in df.columns:
+        df['姓名'] = "" # 若無姓名欄位，自動填補 (為了顯示方便)
+    return StudentSheet(df, club_names(clubs), columns)
+
+
+# --- 其他格式 (CSV / Parquet / Arrow IPC) ---
+FORMATS = {
+    '.xlsx': 'excel',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+UPLOAD_TYPES = [ext.lstrip('.') for ext in FORMATS] # 供 st.file_uploader 使用
+CSV_ENCODINGS = ('utf-8-sig', 'cp950') # 校務系統匯出的 CSV 常見 UTF-8 (含 BOM) 或 Big5
+
+def detect_format(source, name=None):
+    """依副檔名判斷格式；source 為 file-like 物件時請提供原始檔名 name"""
+    name = name or (source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', ''))
+    ext = os.path.splitext(str(name))[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"不支援的檔案格式: {ext or name} (支援 {', '.join(FORMATS)})")
+    return FORMATS[ext]
+
+def _read_csv(source):
+    # 一律以字串讀入 (學號開頭的 0 不會消失)，空白格與 Excel 相同視為 NaN
+    for encoding in CSV_ENCODINGS:
+        try:
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            return pd.read_csv(source, dtype=str, encoding=encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"無法辨識 CSV 編碼 (支援 {', '.join(CSV_ENCODINGS)})")
+
+def _read_arrow(source):
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError:
+        raise ValueError("讀取 Arrow / Parquet 檔需要安裝 pyarrow")
+    if isinstance(source, (str, os.PathLike)):
+        stream = pa.memory_map(str(source), 'r')
+    else:
+        stream = pa.BufferReader(source.getvalue() if hasattr(source, 'getvalue') else source.read())
+    try:
+        return pa.ipc.open_file(stream).read_pandas()
+    except pa.ArrowInvalid:
+        stream.seek(0)
+        return pa.ipc.open_stream(stream).read_pandas() # Arrow IPC stream 格式
+
+def read_table(source, name=None):
+    """依格式讀成 DataFrame (Excel 走 pd.read_excel，學生檔請改用 read_students)"""
+    fmt = detect_format(source, name)
+    if fmt == 'excel':
+        return pd.read_excel(source)
+    if fmt == 'csv':
+        return _read_csv(source)
+    if fmt == 'parquet':
+        try:
+            if isinstance(source, (str, os.PathLike)):
+                return pd.read_parquet(source, memory_map=True)
+            return pd.read_parquet(source)
+        except ImportError:
+            raise ValueError("讀取 Arrow / Parquet 檔需要安裝 pyarrow")
+    return _read_arrow(source)
+
+def sheet_from_dataframe(df):
+    """以與 Excel 串流讀取相同的規則整理已讀入的學生資料 (欄位檢查、重複學號、社團名稱)"""
+    df = prepare_students(df)
+    columns = list(df.columns)
+    df = df[[c for c in dict.fromkeys(columns) if c in STUDENT_COLUMNS]].copy()
+    clubs = set(df['原社團'].dropna().unique())
+    for i in range(1, PREF_COLS + 1):
+        if f'志願{i}' in df.columns:
+            clubs.update(df[f'志願{i}'].dropna().unique())
+    return StudentSheet(df, club_names(clubs), columns)
+
+def read_students(source, name=None):
+    """讀取學生志願 (Excel / CSV / Parquet / Arrow)，回傳 StudentSheet"""
+    if detect_format(source, name) == 'excel':
+        return read_students_xlsx(source)
+    return sheet_from_dataframe(read_table(source, name))
+
+def read_vacancies(source, name=None):
+    """讀取社團缺額表 (Excel / CSV / Parquet / Arrow)，需包含 [社團名稱, 目前缺額]"""
+    df = read_table(source, name)
+    df.columns = [str(c).strip() for c in df.columns]
+    return prepare_vacancies(df)
@@ -0,0 +1,146 @@
+"""
+學生轉社系統 - 背景分發工作 (Background Jobs)
+按下「開始分發」後，分發在共用的背景執行緒中執行，介面只保存工作 ID 並定期查詢進度，
+瀏覽器不會被卡住，重新整理頁面後也能以 ID 找回同一個工作。多位使用者共用同一個伺服器時，
+工作依序排入固定大小的執行緒池，彼此不會互相阻塞；相同輸入的工作只會執行一次。
+取消採合作式: 分發過程每次回報進度 (on_progress) 時檢查是否已要求取消。
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = 4 # 同時執行的分發工作數
+JOB_HISTORY = 32 # 最多保留幾個已結束的工作 (供重新整理後取回結果)
+
+STATUS_LABELS = {
+    'queued': '排隊中',
+    'running': '執行中',
+    'done': '完成',
+    'failed': '失敗',
+    'cancelled': '已取消',
+}
+
+
+class JobCancelled(Exception):
+    """工作被要求取消 (由進度回報時拋出，中斷分發)"""
+
+
+class Job:
+    """
+    一個背景工作的狀態: status 為 STATUS_LABELS 其中之一，text / percent 為最近一次回報的進度，
+    完成後 result 為工作函式的回傳值，失敗時 error 為例外訊息
+    """
+    def __init__(self, key=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = 'queued'
+        self.text = "排隊等待中..."
+        self.percent = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._future = None
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def report(self, text, percent=None):
+        """進度回報 (與 process_allocation 的 on_progress 相同)；已要求取消時拋出 JobCancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.text = text
+        if percent is not None:
+            self.percent = percent
+
+    def cancel(self):
+        """要求取消: 尚未開始的工作直接取消，執行中的工作在下一次回報進度時停止"""
+        self._cancel.set()
+        if self._future is not None and self._future.cancel():
+            self._finish('cancelled', text="已取消")
+
+    def _finish(self, status, text=None):
+        self.status = status
+        if text is not None:
+            self.text = text
+        self.finished = time.time()
+
+    def _run(self, fn):
+        if self._cancel.is_set():
+            self._finish('cancelled', text="已取消")
+            return
+        self.status = 'running'
+        self.started = time.time()
+        try:
+            self.result = fn(self.report)
+        except JobCancelled:
+            self._finish('cancelled', text="已取消")
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            self._finish('failed', text=f"分發失敗: {self.error}")
+        else:
+            self.percent = 100
+            self._finish('done')
+
+
+class JobManager:
+    """
+    背景工作管理 (所有使用者共用一個)
+    submit(fn, key) 排入工作並回傳 Job；fn(on_progress) 在背景執行緒中執行。
+    同一個 key 已有未結束的工作時直接回傳該工作，不重複執行。
+    """
+    def __init__(self, max_workers=JOB_WORKERS, max_jobs=JOB_HISTORY):
+        self.max_jobs = max_jobs
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="allocation-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def submit(self, fn, key=None):
+        with self._lock:
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and not job.done and not job.cancel_requested:
+                        return job
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._prune()
+            job._future = self._pool.submit(job._run, fn)
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self):
+        """尚未結束的工作 (依送出順序)"""
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.done]
+
+    def _prune(self):
+        # 只淘汰已結束的工作，從最舊的開始
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        for job in self.active():
+            job.cancel()
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,276 @@
+"""
+學生轉社系統 - 參考分發 (Reference Oracle)
+以最直接的寫法寫出目前的分發規則 (動態遞補 + 兩兩交換)，作為差異測試 (differential.py) 的標準答案。
+這裡刻意不做任何最佳化，也不共用 allocation.py 的分發程式碼: 每移動一人就從第 1 位學生重新掃描，
+交換階段逐對比較所有學生。只為了加速的修改不要動這個檔案；分發規則真的改變時，才同時修改這裡並說明原因。
+
+規則 (與 process_allocation 的預設引擎相同):
+1. 學生依填寫時間排序 (與 Allocator 相同的 sort_values)，越早填寫越優先。
+2. 社團名稱一律正規化 (normalize_club_name)；缺額表同名的社團缺額相加，原社團不在缺額表的社團缺額為 0。
+   容量 = 缺額 + 原本在社團的人數。
+3. 志願依欄位順序，略過: 空白、不在社團名單、已填過的社團、被限制規則禁止的社團。志願序為欄位位置 (0 起算)。
+4. 動態遞補: 找出第一位「有比目前更好的志願、且該社團還有空位」的學生，轉入最好的那個，然後從頭重新掃描。
+5. 兩兩交換: 依序對每位學生 s1 (已錄取第一志願者略過) 掃描所有學生 s2，兩人交換社團後都拿到更好的志願就交換，
+   交換後 s1 以新的社團繼續掃描後面的學生；整輪沒有任何交換時結束。
+
+與原始版本 (baseline_allocation，原本 app.py 的 process_allocation) 刻意不同之處:
+- 社團名稱經過 NFKC 與空白正規化，全形、多餘空白的名稱視為同一個社團；原始版本只去除前後空白。
+- 缺額表的名稱正規化後才相加；原始版本依原始名稱相加，去除空白後同名的列會互相覆蓋。
+- 沒有原社團的學生 (空白格) 不會被交換到「空白」這個假社團；原始版本中，填了空白志願的學生
+  可能與沒有社團的學生交換而失去社團 (見 [user-002] 的修正)。
+- 空白格、空字串與 'nan' 都是「沒有社團」(NO_CLUB)；原始版本中原社團為空字串的學生分發結果顯示為 ''，
+  缺額表中名為 'nan' 的列則是一個社團。
+- 志願序為欄位位置；原始版本略過空字串與被禁止的志願後重新編號。
+- 限制改用規則 (rules.py)，可限制高三、班級範圍與原社團；班級只認半形數字。
+只有這些差異時兩者的結果應該相同: differential.py --baseline 以不會觸發上述差異的輸入 (is_plain)
+比對 reference_allocation 與 baseline_allocation。名為 'None'、'null' 等文字的社團在兩者都是一般的社團。
+"""
+import re
+
+import pandas as pd
+
+from allocation import GRADE_RANGES, NO_CLUB, NO_RANK, PREF_COLS, normalize_club_name
+from rules import legacy_rules
+
+
+def _class_num(class_str):
+    # 班級代碼: 只取半形數字的前 3 位 (全形數字不算，與分發時相同)
+    digits = re.sub(r'[^0-9]', '', class_str)[:3]
+    return int(digits) if digits else None
+
+def _grade(class_num):
+    for grade, (lo, hi) in GRADE_RANGES.items():
+        if class_num is not None and lo <= class_num <= hi:
+            return grade
+    return 0
+
+def _rule_matches(rule, student):
+    if rule.grades and student['grade'] not in rule.grades:
+        return False
+    if rule.classes:
+        hit = False
+        for c in rule.classes:
+            bounds = rule.class_range(c)
+            if bounds is not None:
+                hit |= student['class_num'] is not None and bounds[0] <= student['class_num'] <= bounds[1]
+            else:
+                hit |= student['class_str'] == c or (c.isdigit() and student['class_num'] == int(c))
+        if not hit:
+            return False
+    if rule.from_clubs and student['original'] not in {normalize_club_name(c) for c in rule.from_clubs}:
+        return False
+    return True
+
+def reference_allocation(students_df, clubs_df, h1_forbidden=(), h2_forbidden=(), h1_ban_all=False, h2_ban_all=False, rules=()):
+    """
+    參考答案，參數同 process_allocation
+    回傳 (分發結果, 剩餘缺額):
+    - 分發結果: DataFrame [學號, 分發結果, 錄取志願序]，依填寫時間排序；分發結果為正規化後的社團名稱
+      (沒有社團為 NO_CLUB)，錄取志願序 0 起算，未錄取任何志願為 NO_RANK
+    - 剩餘缺額: {社團名稱: 剩餘缺額}
+    """
+    students_df = students_df.copy()
+    if '填寫時間' in students_df.columns:
+        students_df['填寫時間'] = pd.to_datetime(students_df['填寫時間'], errors='coerce')
+        students_df = students_df.sort_values(by="填寫時間")
+
+    # 社團與容量
+    vacancy = {}
+    names = clubs_df['社團名稱'] if '社團名稱' in clubs_df.columns else clubs_df.index
+    for name, seats in zip(names, clubs_df['目前缺額']):
+        name = normalize_club_name(name)
+        if name != NO_CLUB:
+            vacancy[name] = vacancy.get(name, 0) + int(seats)
+
+    def text(row, column):
+        return str(row[column]).strip() if column in row.index else ''
+
+    students = []
+    for _, row in students_df.iterrows():
+        class_str = text(row, '班級')
+        student = {'id': text(row, '學號'), 'class_str': class_str, 'class_num': _class_num(class_str),
+                   'original': normalize_club_name(text(row, '原社團')), 'rank': NO_RANK}
+        student['grade'] = _grade(student['class_num'])
+        student['assigned'] = student['original']
+        if student['original'] != NO_CLUB:
+            vacancy.setdefault(student['original'], 0)
+        student['raw_prefs'] = [normalize_club_name(text(row, f'志願{i}')) for i in range(1, PREF_COLS + 1)]
+        students.append(student)
+
+    occupancy = {name: 0 for name in vacancy}
+    for s in students:
+        if s['assigned'] != NO_CLUB:
+            occupancy[s['assigned']] += 1
+    capacity = {name: vacancy[name] + occupancy[name] for name in vacancy}
+
+    # 有效志願 [(志願序, 社團)]
+    rules = legacy_rules(h1_forbidden, h2_forbidden, h1_ban_all, h2_ban_all) + list(rules)
+    for s in students:
+        matched = [rule for rule in rules if _rule_matches(rule, s)]
+        s['prefs'] = []
+        seen = set()
+        for i, name in enumerate(s['raw_prefs']):
+            if name == NO_CLUB or name in seen:
+                continue
+            seen.add(name)
+            if name not in capacity:
+                continue
+            if any(rule.bans_all or name in {normalize_club_name(c) for c in rule.clubs} for rule in matched):
+                continue
+            s['prefs'].append((i, name))
+        s['first'] = {name: i for i, name in s['prefs']}
+
+    def move(s, club, rank):
+        if s['assigned'] != NO_CLUB:
+            occupancy[s['assigned']] -= 1
+        occupancy[club] += 1
+        s['assigned'] = club
+        s['rank'] = rank
+
+    # 動態遞補: 每移動一人就從第 1 位學生重新掃描
+    moved = True
+    while moved:
+        moved = False
+        for s in students:
+            for i, club in s['prefs']:
+                if i < s['rank'] and occupancy[club] < capacity[club]:
+                    move(s, club, i)
+                    moved = True
+                    break
+            if moved:
+                break
+
+    # 兩兩交換
+    swapped = True
+    while swapped:
+        swapped = False
+        for s1 in students:
+            if s1['rank'] == 0:
+                continue
+            for s2 in students:
+                if s2 is s1 or s2['rank'] == 0:
+                    continue
+                c1, c2 = s1['assigned'], s2['assigned']
+                if c1 == c2:
+                    continue
+                r1, r2 = s1['first'].get(c2), s2['first'].get(c1)
+                if r1 is not None and r1 < s1['rank'] and r2 is not None and r2 < s2['rank']:
+                    s1['assigned'], s1['rank'] = c2, r1
+                    s2['assigned'], s2['rank'] = c1, r2
+                    swapped = True
+
+    result_df = pd.DataFrame({
+        '學號': [s['id'] for s in students],
+        '分發結果': [s['assigned'] for s in students],
+        '錄取志願序': [s['rank'] for s in students],
+    })
+    return result_df, {name: max(0, capacity[name] - occupancy[name]) for name in capacity}
+
+
+def baseline_allocation(students_df, clubs_df, h1_forbidden=(), h2_forbidden=(), h1_ban_all=False, h2_ban_all=False):
+    """
+    原始版本的分發 (app.py 原本的 Student / Club / process_allocation，只拿掉 Streamlit 與紀錄)，不要修改
+    回傳格式同 reference_allocation；分發結果為原始名稱，錄取志願序為略過空字串與被禁止的志願後的位置
+    """
+    clubs = {}
+    if '社團名稱' in clubs_df.columns:
+        for c_name, vac in clubs_df.groupby('社團名稱')['目前缺額'].sum().items():
+            clubs[str(c_name).strip()] = [str(c_name).strip(), int(vac), []] # [名稱, 初始缺額, 目前成員]
+    else:
+        for c_name, vac in clubs_df['目前缺額'].items():
+            clubs[str(c_name).strip()] = [str(c_name).strip(), int(vac), []]
+    for c_name in students_df['原社團'].dropna().astype(str).unique():
+        c_name = str(c_name).strip()
+        if c_name and c_name not in clubs:
+            clubs[c_name] = [c_name, 0, []]
+
+    students_df = students_df.copy()
+    if '填寫時間' in students_df.columns:
+        students_df['填寫時間'] = pd.to_datetime(students_df['填寫時間'], errors='coerce')
+        students_df = students_df.sort_values(by="填寫時間")
+
+    students = []
+    for _, data in students_df.iterrows():
+        s = {'id': str(data['學號']).strip(), 'original': str(data.get('原社團', '')).strip(), 'rank': NO_RANK}
+        class_str = str(data.get('班級', '')).strip()
+        grade = None
+        try:
+            cls_num = int(''.join(filter(str.isdigit, class_str))[:3])
+            if 101 <= cls_num <= 115:
+                grade = 1
+            elif 201 <= cls_num <= 215:
+                grade = 2
+        except ValueError:
+            pass
+        forbidden, ban = set(), False
+        if grade == 1:
+            if h1_ban_all: ban = True
+            else: forbidden = set(h1_forbidden)
+        elif grade == 2:
+            if h2_ban_all: ban = True
+            else: forbidden = set(h2_forbidden)
+        s['prefs'] = []
+        if not ban:
+            for i in range(1, 11):
+                col = f'志願{i}'
+                if col in data:
+                    p = str(data[col]).strip()
+                    if p and p not in forbidden:
+                        s['prefs'].append(p)
+        s['assigned'] = s['original']
+        students.append(s)
+        if s['original'] in clubs:
+            clubs[s['original']][2].append(s['id'])
+    capacity = {name: c[1] + len(c[2]) for name, c in clubs.items()}
+
+    # 動態遞補 (每移動一人就重新從第 1 位學生掃描)
+    changed = True
+    iteration = 0
+    max_iterations = len(students) * 10 + 2000
+    while changed and iteration < max_iterations:
+        changed = False
+        iteration += 1
+        for s in students:
+            for i, p_club_name in enumerate(s['prefs']):
+                if i >= s['rank'] or p_club_name not in clubs:
+                    continue
+                target = clubs[p_club_name]
+                if len(target[2]) < capacity[p_club_name]:
+                    if s['assigned'] in clubs:
+                        clubs[s['assigned']][2].remove(s['id'])
+                    target[2].append(s['id'])
+                    s['assigned'], s['rank'] = p_club_name, i
+                    changed = True
+                    break
+            if changed:
+                break
+
+    # 最佳化交換
+    swapped = True
+    while swapped:
+        swapped = False
+        for s1 in students:
+            if s1['rank'] == 0: continue
+            for s2 in students:
+                if s1['id'] == s2['id'] or s2['rank'] == 0: continue
+                c1, c2 = s1['assigned'], s2['assigned']
+                if c1 == c2: continue
+                if c2 in s1['prefs'] and s1['prefs'].index(c2) < s1['rank']:
+                    if c1 in s2['prefs'] and s2['prefs'].index(c1) < s2['rank']:
+                        r1, r2 = s1['prefs'].index(c2), s2['prefs'].index(c1)
+                        s1['assigned'], s1['rank'] = c2, r1
+                        s2['assigned'], s2['rank'] = c1, r2
+                        if c1 in clubs:
+                            clubs[c1][2].remove(s1['id'])
+                            clubs[c1][2].append(s2['id'])
+                        if c2 in clubs:
+                            clubs[c2][2].remove(s2['id'])
+                            clubs[c2][2].append(s1['id'])
+                        swapped = True
+
+    result_df = pd.DataFrame({
+        '學號': [s['id'] for s in students],
+        '分發結果': [s['assigned'] for s in students],
+        '錄取志願序': [s['rank'] for s in students],
+    })
+    return result_df, {c[0]: max(0, capacity[name] - len(c[2])) for name, c in clubs.items()}
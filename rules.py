@@ -0,0 +1,160 @@
+"""
+學生轉社系統 - 限制規則 (Restriction Rules)
+以宣告式的規則取代寫死的「高一 / 高二禁止社團、全年級凍結」:
+每條規則描述「哪些學生」(年級、班級、原社團) 不能轉入「哪些社團」(省略代表所有社團，即完全凍結)。
+規則在分發前由 StudentTable 一次編譯成 (學生, 志願) 的遮罩，分發迴圈完全不需要再判斷規則。
+
+規則可在側邊欄以表格編輯，或由檔案載入:
+- JSON: [{"grades": [1], "clubs": ["熱舞社"]}, {"classes": ["305"], "from_clubs": ["籃球社"], "name": "..."}]
+- CSV / Excel: 欄位為 年級, 班級, 原社團, 禁止轉入, 說明 (多個值以逗號或頓號分隔，班級可寫範圍如 101-105)
+"""
+import json
+import os
+import re
+
+import pandas as pd
+
+GRADE_NAMES = {1: "高一", 2: "高二", 3: "高三"}
+RULE_COLUMNS = ['年級', '班級', '原社團', '禁止轉入', '說明']
+
+
+def split_values(value):
+    """以逗號、頓號或分號分隔的清單 (空白格或 'nan' 視為空清單)；list 直接回傳"""
+    if isinstance(value, (list, tuple, set)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    if value is None or str(value).strip() in ("", "nan"):
+        return []
+    return [v.strip() for v in re.split(r"[,，、;；]", str(value)) if v.strip()]
+
+
+class Rule:
+    """
+    一條限制規則: 同時符合所有條件的學生不能轉入 clubs 中的社團 (未指定的條件不限)
+    - grades: 年級 (1 / 2 / 3，依班級代碼判斷，見 allocation.GRADE_RANGES)
+    - classes: 班級，可寫單一班級 ('305') 或範圍 ('101-105')
+    - from_clubs: 原社團
+    - clubs: 禁止轉入的社團；空的代表所有社團 (完全凍結)
+    - name: 說明 (顯示在志願檢查的原因欄)，省略時自動產生
+    """
+    def __init__(self, grades=(), classes=(), from_clubs=(), clubs=(), name=""):
+        self.grades = sorted({self.parse_grade(g) for g in split_values(grades)})
+        self.classes = split_values(classes)
+        self.from_clubs = split_values(from_clubs)
+        self.clubs = split_values(clubs)
+        self.name = str(name or "").strip()
+        for c in self.classes:
+            if '-' in c and self.class_range(c) is None:
+                raise ValueError(f"班級範圍格式錯誤: {c} (例如 101-105)")
+
+    @property
+    def bans_all(self):
+        return not self.clubs
+
+    @staticmethod
+    def parse_grade(value):
+        """'1' / '高一' -> 1"""
+        for grade, name in GRADE_NAMES.items():
+            if value in (str(grade), name):
+                return grade
+        raise ValueError(f"未知的年級: {value} (可用: {', '.join(map(str, GRADE_NAMES))} 或 {'、'.join(GRADE_NAMES.values())})")
+
+    @staticmethod
+    def class_range(value):
+        """'101-105' -> (101, 105)；不是數字範圍時回傳 None"""
+        match = re.fullmatch(r"(\d+)\s*-\s*(\d+)", value)
+        return (int(match.group(1)), int(match.group(2))) if match else None
+
+    def describe(self):
+        if self.name:
+            return self.name
+        who = [GRADE_NAMES[g] for g in self.grades]
+        who += [f"{c}班" for c in self.classes]
+        who += [f"原社團為{c}" for c in self.from_clubs]
+        who = "、".join(who) or "所有學生"
+        return f"{who}全面凍結" if self.bans_all else f"{who}禁止轉入: {'、'.join(self.clubs)}"
+
+    def to_dict(self):
+        data = {key: getattr(self, key) for key in ("grades", "classes", "from_clubs", "clubs") if getattr(self, key)}
+        if self.name:
+            data["name"] = self.name
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        unknown = set(data) - {"grades", "classes", "from_clubs", "clubs", "name"}
+        if unknown:
+            raise ValueError(f"未知的規則欄位: {sorted(unknown)}")
+        return cls(**data)
+
+    def __eq__(self, other):
+        return isinstance(other, Rule) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Rule({self.to_dict()})"
+
+
+# --- 1. 與舊設定的對應 ---
+def legacy_rules(h1_forbidden=(), h2_forbidden=(), h1_ban_all=False, h2_ban_all=False):
+    """原本的高一 / 高二限制轉成規則 (凍結優先於禁止社團，與原本相同)"""
+    rules = []
+    for grade, forbidden, ban_all in ((1, h1_forbidden, h1_ban_all), (2, h2_forbidden, h2_ban_all)):
+        if ban_all:
+            rules.append(Rule(grades=[grade]))
+        elif forbidden:
+            rules.append(Rule(grades=[grade], clubs=forbidden))
+    return rules
+
+
+# --- 2. 表格與檔案 ---
+def rules_to_frame(rules):
+    """規則轉成側邊欄編輯用的表格 (RULE_COLUMNS)"""
+    return pd.DataFrame([{
+        '年級': "、".join(map(str, rule.grades)),
+        '班級': "、".join(rule.classes),
+        '原社團': "、".join(rule.from_clubs),
+        '禁止轉入': "、".join(rule.clubs),
+        '說明': rule.name,
+    } for rule in rules], columns=RULE_COLUMNS)
+
+def rules_from_frame(df):
+    """由表格讀回規則 (整列空白的略過)；「禁止轉入」留空代表所有社團"""
+    rules = []
+    for k, row in enumerate(df.to_dict('records'), 1):
+        values = {col: row.get(col) for col in RULE_COLUMNS}
+        if not any(split_values(v) for v in values.values()):
+            continue
+        try:
+            rules.append(Rule(grades=values['年級'], classes=values['班級'], from_clubs=values['原社團'],
+                              clubs=values['禁止轉入'], name=values['說明'] if isinstance(values['說明'], str) else ""))
+        except ValueError as e:
+            raise ValueError(f"第 {k} 條規則: {e}")
+    return rules
+
+def rules_from_dicts(items):
+    return [Rule.from_dict(item) for item in items]
+
+def dump_rules(rules):
+    """規則存成 JSON 字串 (load_rules 可讀回)"""
+    return json.dumps([rule.to_dict() for rule in rules], ensure_ascii=False, indent=2)
+
+def load_rules(source, name=None):
+    """
+    由 JSON / CSV / Excel 檔載入規則；source 可為路徑或 file-like 物件 (file-like 時請提供檔名 name)
+    格式錯誤時丟出 ValueError
+    """
+    name = name or (source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', ''))
+    ext = os.path.splitext(str(name))[1].lower()
+    if ext == '.json':
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, encoding="utf-8") as f:
+                items = json.load(f)
+        else:
+            items = json.loads(source.read())
+        if not isinstance(items, list):
+            raise ValueError("規則檔需為規則的清單 ([{...}, ...])")
+        return rules_from_dicts(items)
+    if ext == '.csv':
+        return rules_from_frame(pd.read_csv(source, dtype=str))
+    if ext == '.xlsx':
+        return rules_from_frame(pd.read_excel(source, dtype=str))
+    raise ValueError(f"不支援的規則檔格式: {ext or name} (支援 .json / .csv / .xlsx)")
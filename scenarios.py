@@ -0,0 +1,176 @@
+"""
+學生轉社系統 - 情境比較 (What-if Scenario Sweep)
+在確定缺額之前，一次比較多種設定: 例如「籃球社多開 3 個名額」、「凍結高一轉社」。
+情境為各社團增加名額與凍結年級的所有組合，以 process pool 平行分發，
+每個 worker 只接收一次學生資料並以 Allocator 增量重算各情境。
+另可比較同一份資料在不同分發引擎 (動態遞補 / 精確配對) 下的結果差異，或任意幾次分發結果的差異。
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from allocation import ENGINES, FLOW_TIME_BUDGET, PREF_COLS, Allocator
+from rules import GRADE_NAMES, Rule
+
+BASE_NAME = "基準"
+GRADE_FLAGS = {1: "h1_ban_all", 2: "h2_ban_all"} # 有舊設定可用的年級；其他年級以規則凍結
+
+
+# --- 1. 情境組合 ---
+def build_scenarios(seat_deltas=None, freeze_options=None):
+    """
+    產生所有情境組合，回傳 [{'name', 'seats', 'freeze'}]
+    - seat_deltas: {社團名稱: [增加的名額, ...]}，例如 {'籃球社': [0, 3]}
+    - freeze_options: 要比較的凍結年級組合，例如 [(), (1,)] 代表「不凍結」與「凍結高一」
+    第一個情境通常就是基準 (全部增加 0 且不凍結)。
+    """
+    seat_deltas = seat_deltas or {}
+    freeze_options = freeze_options or [()]
+    clubs = list(seat_deltas)
+    scenarios = []
+    seen = set()
+    for deltas in itertools.product(*(seat_deltas[c] for c in clubs)):
+        for freeze in freeze_options:
+            seats = {c: int(d) for c, d in zip(clubs, deltas) if int(d) != 0}
+            freeze = tuple(sorted(set(freeze)))
+            if (tuple(seats.items()), freeze) in seen:
+                continue # 重複的組合只算一次
+            seen.add((tuple(seats.items()), freeze))
+            parts = [f"{c}{d:+d}" for c, d in seats.items()]
+            parts += [f"凍結{GRADE_NAMES[g]}" for g in freeze]
+            scenarios.append({
+                "name": " / ".join(parts) or BASE_NAME,
+                "seats": seats,
+                "freeze": freeze,
+            })
+    return scenarios
+
+def apply_scenario(clubs_df, restrictions, scenario):
+    """將情境套用到缺額表與限制設定 (不修改傳入的物件)"""
+    clubs_df = clubs_df.copy()
+    for club, delta in scenario["seats"].items():
+        hit = clubs_df['社團名稱'].astype(str).str.strip() == club
+        if hit.any():
+            clubs_df.loc[hit.idxmax(), '目前缺額'] += delta
+        else:
+            clubs_df = pd.concat([clubs_df, pd.DataFrame({'社團名稱': [club], '目前缺額': [delta]})], ignore_index=True)
+    clubs_df['目前缺額'] = clubs_df['目前缺額'].clip(lower=0)
+    restrictions = dict(restrictions)
+    for grade in scenario["freeze"]:
+        if grade in GRADE_FLAGS:
+            restrictions[GRADE_FLAGS[grade]] = True
+        else:
+            restrictions['rules'] = list(restrictions.get('rules', [])) + [Rule(grades=[grade])]
+    return clubs_df, restrictions
+
+
+# --- 2. 結果摘要 ---
+def summarize(name, result_df, vac_df, swap_logs):
+    """一個情境的比較列: 成功人數、各志願錄取人數、平均志願序、剩餘缺額"""
+    ranks = pd.to_numeric(result_df['錄取志願序'], errors='coerce')
+    moved = result_df['狀態'] == '成功'
+    row = {
+        "情境": name,
+        "成功轉社": int(moved.sum()),
+        "維持原社團": int((~moved).sum()),
+        "交換組數": len(swap_logs),
+        "平均志願序": round(float(ranks[moved].mean()), 2) if moved.any() else None,
+    }
+    counts = ranks[moved].value_counts()
+    for i in range(1, PREF_COLS + 1):
+        row[f"第{i}志願"] = int(counts.get(i, 0))
+    row["剩餘缺額"] = int(vac_df['剩餘缺額'].sum()) if len(vac_df) else 0
+    return row
+
+
+# --- 3. 平行執行 ---
+_worker = {} # 每個 worker process 的學生資料與分發器
+
+def _init_worker(students_df, clubs_df, restrictions, swap_cycles, engine='ripple', optimizer='swap', time_budget=FLOW_TIME_BUDGET):
+    _worker.update(allocator=Allocator(students_df), clubs_df=clubs_df, restrictions=restrictions,
+                   swap_cycles=swap_cycles, engine=engine, optimizer=optimizer, time_budget=time_budget)
+
+def _run_scenario(scenario):
+    clubs_df, restrictions = apply_scenario(_worker["clubs_df"], _worker["restrictions"], scenario)
+    result_df, vac_df, logs, swap_logs, stats = _worker["allocator"].run(
+        clubs_df, swap_cycles=_worker["swap_cycles"], engine=_worker["engine"], optimizer=_worker["optimizer"],
+        time_budget=_worker["time_budget"], **restrictions)
+    leftover = dict(zip(vac_df['社團名稱'], vac_df['剩餘缺額']))
+    return summarize(scenario["name"], result_df, vac_df, swap_logs), leftover
+
+def run_sweep(students_df, clubs_df, scenarios, restrictions=None, swap_cycles=False, workers=None, on_done=None, engine='ripple',
+              optimizer='swap', time_budget=FLOW_TIME_BUDGET):
+    """
+    平行分發所有情境，回傳 (比較表, 各社團剩餘缺額表)；兩張表都依 scenarios 的順序排列。
+    restrictions 為基準的限制設定 (h1_forbidden / h2_forbidden / h1_ban_all / h2_ban_all / rules)。
+    workers=1 時在目前的 process 依序執行。on_done(完成數, 總數) 可用來顯示進度。engine 為分發引擎 (見 ENGINES)，
+    optimizer / time_budget 為最佳化階段與其時間預算 (見 OPTIMIZERS)，與主要分發的設定相同時基準情境的結果才會一致。
+    """
+    restrictions = dict(restrictions or {})
+    initargs = (students_df, clubs_df, restrictions, swap_cycles, engine, optimizer, time_budget)
+    workers = min(workers or os.cpu_count() or 1, len(scenarios)) or 1
+    outputs = []
+    if workers == 1:
+        _init_worker(*initargs)
+        for scenario in scenarios:
+            outputs.append(_run_scenario(scenario))
+            if on_done:
+                on_done(len(outputs), len(scenarios))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            for output in pool.map(_run_scenario, scenarios):
+                outputs.append(output)
+                if on_done:
+                    on_done(len(outputs), len(scenarios))
+
+    summary = pd.DataFrame([row for row, _ in outputs])
+    leftover = pd.DataFrame({row["情境"]: left for row, left in outputs}).fillna(0).astype(int)
+    leftover.index.name = '社團名稱'
+    return summary, leftover
+
+
+# --- 4. 分發引擎比較 ---
+def compare_engines(students_df, clubs_df, restrictions=None, swap_cycles=False, engines=tuple(ENGINES)):
+    """
+    以同一份資料分別執行各分發引擎，回傳 (比較表, 差異名單)
+    - 比較表: 每個引擎一列 (同 summarize，另加耗時)
+    - 差異名單: 各引擎分發結果不同的學生，列出各引擎的結果、志願序，以及哪個引擎的志願序較好
+    (留在原社團視為比所有志願都差)
+    """
+    restrictions = dict(restrictions or {})
+    allocator = Allocator(students_df)
+    rows = []
+    results = {}
+    for engine in engines:
+        label = ENGINES[engine]
+        result_df, vac_df, logs, swap_logs, stats = allocator.run(
+            clubs_df, swap_cycles=swap_cycles, engine=engine, **restrictions)
+        rows.append(dict(summarize(label, result_df, vac_df, swap_logs), 耗時秒數=round(stats.total_time, 4)))
+        results[label] = result_df
+    summary = pd.DataFrame(rows).rename(columns={'情境': '分發引擎'})
+    return summary, diff_results(results, winner_column='較好的引擎')
+
+def diff_results(results, winner_column='較好的結果'):
+    """
+    比較多份分發結果 ({名稱: 分發結果表}，依學號對齊)，回傳分發結果不同的學生:
+    各份的分發結果、志願序，以及 winner_column 欄: 哪一份的志願序較好 (留在原社團視為比所有志願都差)
+    """
+    labels = list(results)
+    merged = None
+    for label, result_df in results.items():
+        part = result_df[['學號', '姓名', '原社團', '分發結果', '錄取志願序']].rename(
+            columns={'分發結果': f'{label}分發結果', '錄取志願序': f'{label}志願序'})
+        merged = part if merged is None else merged.merge(part[['學號', f'{label}分發結果', f'{label}志願序']], on='學號')
+    
+    assigned = merged[[f'{label}分發結果' for label in labels]]
+    diff = merged[assigned.ne(assigned.iloc[:, 0], axis=0).any(axis=1)].reset_index(drop=True)
+    ranks = pd.DataFrame({label: pd.to_numeric(diff[f'{label}志願序'], errors='coerce').fillna(PREF_COLS + 1)
+                          for label in labels})
+    best = ranks.min(axis=1)
+    winners = ranks.eq(best, axis=0)
+    diff[winner_column] = ['、'.join(w for w, hit in zip(labels, row) if hit) if not row.all() else '志願序相同'
+                           for row in winners.to_numpy()]
+    return diff
+
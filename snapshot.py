@@ -0,0 +1,185 @@
+"""
+學生轉社系統 - 學生資料快照 (Input Snapshot)
+大型學校每次上傳都要重新解析 Excel、轉換填寫時間、排序並整理社團名稱，這是開啟頁面時最主要的等待。
+第一次讀取後，把整理好的學生資料 (StudentInput: 依填寫時間排序的學號 / 姓名 / 班級、年級、社團名稱表、
+原社團與志願的整數矩陣) 存成版本化的二進位快照，以檔案內容的雜湊為檔名；之後同一份檔案直接以 memory map 載入，
+不需再開啟 Excel。
+
+快照格式: 開頭 8 bytes 的 SNAPSHOT_MAGIC、版本 (uint32)、標頭長度 (uint32)、JSON 標頭 (文字欄位與各陣列的位置)，
+之後是各個陣列的原始內容 (每個陣列從 64 bytes 對齊的位置開始)。版本或年級判斷方式不同的快照視為不存在。
+"""
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from allocation import GRADE_RANGES, PREF_COLS, StudentInput
+from ingest import StudentSheet, read_students
+
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_MAGIC = b"CTSNAP\x00\x00"
+SNAPSHOT_VERSION = 1 # 快照格式版本，StudentInput 的內容改變時要加 1
+SNAPSHOT_EXT = ".snap"
+ALIGN = 64
+
+_PREFIX = struct.Struct("<8sII") # magic, 版本, 標頭長度
+ARRAYS = ('filled', 'class_num', 'grade', 'original', 'prefs') # StudentInput 中以陣列保存的欄位
+
+
+def source_hash(data):
+    """學生檔內容 (bytes) 的雜湊，與介面的 students_key 相同"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class StudentSnapshot:
+    """
+    一份學生檔整理後的結果
+    - students: StudentInput (可直接交給 Allocator / process_allocation)
+    - clubs: 檔案中出現過的社團名稱 (同 StudentSheet.clubs)
+    - columns: 原始標題列
+    - source_hash: 學生檔內容的雜湊
+    """
+    def __init__(self, students, clubs, columns, source_hash):
+        self.students = students
+        self.clubs = clubs
+        self.columns = columns
+        self.source_hash = source_hash
+
+    @classmethod
+    def from_sheet(cls, sheet, source_hash):
+        return cls(StudentInput.from_frame(sheet.df), sheet.clubs, sheet.columns, source_hash)
+
+    def to_sheet(self):
+        """轉回 StudentSheet (df 依填寫時間排序)"""
+        return StudentSheet(self.students.to_frame(), self.clubs, self.columns)
+
+
+# --- 1. 寫入與讀取 ---
+def _pad(offset):
+    return -offset % ALIGN
+
+def write_snapshot(path, snapshot):
+    """寫入快照 (先寫到暫存檔再取代，讀取中的程式不會讀到寫一半的檔案)"""
+    students = snapshot.students
+    arrays = {name: np.ascontiguousarray(getattr(students, name)) for name in ARRAYS}
+    arrays['filled'] = arrays['filled'].astype('datetime64[ns]').view(np.int64)
+    header = {
+        'source_hash': snapshot.source_hash,
+        'created': time.time(),
+        'grade_ranges': {str(g): list(r) for g, r in GRADE_RANGES.items()},
+        'columns': list(snapshot.columns),
+        'clubs': sorted(snapshot.clubs),
+        'ids': students.ids,
+        'names': students.names,
+        'class_strs': students.class_strs,
+        'raw_names': students.raw_names,
+        'arrays': {},
+    }
+    offset = 0
+    for name, values in arrays.items():
+        header['arrays'][name] = {'dtype': values.dtype.str, 'shape': list(values.shape), 'offset': offset}
+        offset += values.nbytes + _pad(values.nbytes)
+    header = json.dumps(header, ensure_ascii=False, default=str).encode('utf-8')
+    start = _PREFIX.size + len(header)
+
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+            f.write(header)
+            f.write(b"\0" * _pad(start))
+            for values in arrays.values():
+                f.write(values.tobytes())
+                f.write(b"\0" * _pad(values.nbytes))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def read_snapshot(path):
+    """
+    以 memory map 載入快照，回傳 StudentSnapshot (陣列直接對應到檔案內容，唯讀)
+    不是快照檔、版本不同或年級判斷方式已改變時丟出 ValueError
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < _PREFIX.size:
+        raise ValueError(f"不是學生資料快照: {path}")
+    magic, version, header_len = _PREFIX.unpack_from(buffer)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"不是學生資料快照: {path}")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"快照版本不同 ({version}，目前為 {SNAPSHOT_VERSION})，需要重新讀取學生檔")
+    header = json.loads(buffer[_PREFIX.size:_PREFIX.size + header_len].decode('utf-8'))
+    if header['grade_ranges'] != {str(g): list(r) for g, r in GRADE_RANGES.items()}:
+        raise ValueError("年級判斷方式已改變，需要重新讀取學生檔")
+    start = _PREFIX.size + header_len
+    start += _pad(start)
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=start + spec['offset']).reshape(spec['shape'])
+    if arrays['prefs'].shape[1:] != (PREF_COLS,):
+        raise ValueError("快照的志願數不同，需要重新讀取學生檔")
+    students = StudentInput(ids=header['ids'], names=header['names'], class_strs=header['class_strs'],
+                            filled=arrays['filled'].view('datetime64[ns]'), class_num=arrays['class_num'],
+                            grade=arrays['grade'], raw_names=header['raw_names'],
+                            original=arrays['original'], prefs=arrays['prefs'])
+    return StudentSnapshot(students, set(header['clubs']), header['columns'], header['source_hash'])
+
+
+# --- 2. 快照資料夾 ---
+class SnapshotStore:
+    """
+    以學生檔內容雜湊為檔名的快照資料夾
+    load_students() 遇到相同內容的檔案時直接載入快照，否則讀檔並寫入新的快照。
+    """
+    def __init__(self, directory=SNAPSHOT_DIR):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SNAPSHOT_EXT)
+
+    def load(self, key):
+        """取回快照；不存在或已失效 (版本不同、檔案損毀) 時回傳 None"""
+        try:
+            snapshot = read_snapshot(self.path(key))
+        except (OSError, ValueError, KeyError):
+            return None
+        return snapshot if snapshot.source_hash == key else None
+
+    def save(self, snapshot):
+        write_snapshot(self.path(snapshot.source_hash), snapshot)
+
+    def load_students(self, source, name=None):
+        """
+        讀取學生志願檔，回傳 (StudentSnapshot, 是否由快照載入)
+        source 為檔案路徑或 file-like 物件 (file-like 時請提供檔名 name)
+        讀檔錯誤 (InputError 等) 照常丟出；快照無法寫入時仍回傳讀取結果
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                data = f.read()
+        else:
+            data = source.getvalue() if hasattr(source, 'getvalue') else source.read()
+            name = name or getattr(source, 'name', None)
+            source = io.BytesIO(data)
+        key = source_hash(data)
+        snapshot = self.load(key)
+        if snapshot is not None:
+            return snapshot, True
+        snapshot = StudentSnapshot.from_sheet(read_students(source, name), key)
+        try:
+            self.save(snapshot)
+        except OSError:
+            pass # 無法寫入快照時 (例如唯讀的資料夾)，下次再重新讀檔
+        return snapshot, False
@@ -0,0 +1,197 @@
+"""
+學生轉社系統 - 分發紀錄保存 (Result Store)
+每次分發的結果、遞補日誌、交換紀錄與執行統計存入本機的 SQLite 檔，以 allocation_key (輸入內容與設定的雜湊) 為 key。
+工作階段過期或伺服器重新啟動後仍可取回，也能讓共用同一部伺服器的老師開啟彼此的分發結果、比較兩次分發的差異，
+都不需要重新分發。
+
+結果以精簡的形式保存: 學號、姓名、班級與社團名稱各存一份文字表，其餘 (每位學生的原社團 / 分發結果 / 志願序、
+遞補與交換紀錄) 都是整數陣列 (numpy .npz 壓縮)；讀回時再由陣列組成與分發當下相同的表格。
+"""
+import io
+import json
+import sqlite3
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from allocation import NO_RANK, AllocationStats, MoveLog, Provenance, SwapLog, build_results
+from scenarios import summarize
+
+STORE_FILE = "allocation_runs.db"
+STORE_MAX_RUNS = 200 # 最多保留幾次分發紀錄 (超過時刪除最舊的)
+STORE_VERSION = 1 # 保存格式版本，不同版本的紀錄視為不存在
+
+LOG_DTYPES = {'i': np.int32, 'b': np.int8} # EventLog 的 array typecode 對應的 numpy 型別
+METRIC_COLUMNS = ['成功轉社', '維持原社團', '交換組數', '平均志願序', '剩餘缺額', '總耗時秒數']
+
+
+# --- 1. 精簡格式 (Compact Format) ---
+def _int_array(typecode, values):
+    # numpy 陣列轉回 EventLog 使用的 array.array
+    out = array(typecode)
+    out.frombytes(np.ascontiguousarray(values, dtype=LOG_DTYPES[typecode]).tobytes())
+    return out
+
+def _json_default(value):
+    # 設定中無法直接轉成 JSON 的值: 限制規則 (Rule) 存成 dict，其餘轉成文字
+    return value.to_dict() if hasattr(value, 'to_dict') else str(value)
+
+def pack_result(result):
+    """將 (分發結果, 剩餘缺額, 遞補日誌, 交換紀錄, 統計) 轉成 bytes"""
+    result_df, vac_df, logs, swap_logs, stats = result
+    club_index = pd.Index(logs.club_names)
+    ranks = pd.to_numeric(result_df['錄取志願序'], errors='coerce')
+    arrays = {
+        'original': club_index.get_indexer(result_df['原社團']).astype(np.int32),
+        'assigned': club_index.get_indexer(result_df['分發結果']).astype(np.int32),
+        'rank': np.where(ranks.isna(), NO_RANK, ranks.fillna(0) - 1).astype(np.int32),
+        'remaining': vac_df['剩餘缺額'].to_numpy(dtype=np.int64),
+        'move_students': np.asarray(logs.students, dtype=np.int32),
+        'move_from': np.asarray(logs.from_clubs, dtype=np.int32),
+        'move_to': np.asarray(logs.to_clubs, dtype=np.int32),
+        'move_ranks': np.asarray(logs.ranks, dtype=np.int32),
+        'swap_starts': np.asarray(swap_logs.starts, dtype=np.int32),
+        'swap_students': np.asarray(swap_logs.students, dtype=np.int32),
+        'swap_clubs': np.asarray(swap_logs.clubs, dtype=np.int32),
+        'swap_cycles': np.asarray(swap_logs.cycles, dtype=np.int8),
+    }
+    texts = {
+        'ids': list(logs.ids),
+        'names': list(logs.names),
+        'classes': result_df['班級'].tolist(),
+        'club_names': list(logs.club_names),
+        'num_clubs': logs.num_clubs,
+        'vacancy_clubs': vac_df['社團名稱'].tolist(),
+        'stats': stats.to_dict(),
+    }
+    provenance = getattr(logs, 'provenance', None)
+    if provenance is not None:
+        # 落榜原因索引只需另外保存志願、原因代碼與各社團名額，其餘由上面的陣列還原
+        arrays['prefs'] = provenance.prefs.astype(np.int32)
+        arrays['reasons'] = provenance.reasons.astype(np.int16)
+        arrays['capacity'] = provenance.capacity
+        texts['rule_labels'] = provenance.rule_labels
+    arrays['texts'] = np.frombuffer(json.dumps(texts, ensure_ascii=False, default=str).encode('utf-8'), dtype=np.uint8)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+def unpack_result(data):
+    """pack_result 的反向: 回傳與 process_allocation 相同的 (分發結果, 剩餘缺額, 遞補日誌, 交換紀錄, 統計)"""
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        arrays = {name: npz[name] for name in npz.files}
+    texts = json.loads(arrays['texts'].tobytes().decode('utf-8'))
+    # 只含 build_results 與 EventLog 用到的欄位的學生資料表
+    table = SimpleNamespace(ids=texts['ids'], names=texts['names'], class_strs=texts['classes'],
+                            club_names=texts['club_names'], num_clubs=texts['num_clubs'],
+                            original=arrays['original'], assigned=arrays['assigned'], rank=arrays['rank'])
+    result_df = build_results(table)
+    vac_df = pd.DataFrame({'社團名稱': texts['vacancy_clubs'], '剩餘缺額': arrays['remaining']})
+
+    logs = MoveLog(table)
+    logs.students = _int_array('i', arrays['move_students'])
+    logs.from_clubs = _int_array('i', arrays['move_from'])
+    logs.to_clubs = _int_array('i', arrays['move_to'])
+    logs.ranks = _int_array('i', arrays['move_ranks'])
+    swap_logs = SwapLog(table)
+    swap_logs.starts = _int_array('i', arrays['swap_starts'])
+    swap_logs.students = _int_array('i', arrays['swap_students'])
+    swap_logs.clubs = _int_array('i', arrays['swap_clubs'])
+    swap_logs.cycles = _int_array('b', arrays['swap_cycles'])
+    if 'prefs' in arrays: # 較早保存的紀錄沒有落榜原因索引
+        logs.provenance = Provenance(logs, swap_logs, arrays['original'], arrays['assigned'], arrays['rank'],
+                                     arrays['prefs'], arrays['reasons'], texts['rule_labels'], arrays['capacity'])
+    return result_df, vac_df, logs, swap_logs, AllocationStats.from_dict(texts['stats'])
+
+def result_metrics(result):
+    """列表與比較用的摘要: 成功人數、各志願錄取人數、平均志願序、剩餘缺額、總耗時"""
+    result_df, vac_df, logs, swap_logs, stats = result
+    row = summarize(None, result_df, vac_df, swap_logs)
+    del row['情境']
+    row['總耗時秒數'] = round(stats.total_time, 4)
+    return row
+
+
+# --- 2. 保存與讀取 ---
+class ResultStore:
+    """
+    以 SQLite 保存的分發紀錄 (每次分發一列)
+    每次操作各自開啟連線，可在背景工作的執行緒中直接呼叫；寫入時另外加鎖，避免同時刪除舊紀錄。
+    """
+    def __init__(self, path=STORE_FILE, max_runs=STORE_MAX_RUNS):
+        self.path = path
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    key TEXT PRIMARY KEY,
+                    created REAL NOT NULL,
+                    label TEXT NOT NULL,
+                    settings TEXT NOT NULL,
+                    metrics TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    payload BLOB NOT NULL
+                )""")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn: # 正常結束時 commit，發生例外時 rollback
+                yield conn
+        finally:
+            conn.close()
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM runs WHERE version = ?", (STORE_VERSION,)).fetchone()[0]
+
+    def __contains__(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM runs WHERE key = ? AND version = ?", (key, STORE_VERSION)).fetchone()
+        return row is not None
+
+    def save(self, key, result, label="", settings=None):
+        """保存一次分發 (相同 key 會覆蓋)；settings 為分發設定 (可轉成 JSON 的 dict)，只供列表顯示"""
+        payload = pack_result(result)
+        metrics = json.dumps(result_metrics(result), ensure_ascii=False)
+        settings = json.dumps(settings or {}, ensure_ascii=False, default=_json_default)
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, time.time(), label, settings, metrics, STORE_VERSION, payload))
+            conn.execute("DELETE FROM runs WHERE key NOT IN (SELECT key FROM runs ORDER BY created DESC LIMIT ?)",
+                         (self.max_runs,))
+
+    def load(self, key):
+        """取回一次分發 (同 process_allocation 的回傳值)；找不到時回傳 None"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload FROM runs WHERE key = ? AND version = ?", (key, STORE_VERSION)).fetchone()
+        return None if row is None else unpack_result(row[0])
+
+    def delete(self, key):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM runs WHERE key = ?", (key,))
+
+    def runs(self):
+        """所有紀錄 (新的在前): key、建立時間、說明、設定，以及 result_metrics 的各欄"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key, created, label, settings, metrics FROM runs WHERE version = ? ORDER BY created DESC",
+                                (STORE_VERSION,)).fetchall()
+        records = []
+        for key, created, label, settings, metrics in rows:
+            settings = json.loads(settings)
+            records.append(dict(
+                {'key': key, '建立時間': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created)), '說明': label},
+                **json.loads(metrics),
+                設定=", ".join(f"{name}={value}" for name, value in settings.items())))
+        columns = ['key', '建立時間', '說明'] + METRIC_COLUMNS
+        frame = pd.DataFrame(records)
+        if frame.empty:
+            return pd.DataFrame(columns=columns + ['設定'])
+        return frame[columns + [c for c in frame.columns if c not in columns]]
@@ -0,0 +1,62 @@
+import os
+import json
+import tempfile
+
+import pandas as pd
+from batch import main
+
+def make_school(folder, club_vacancy):
+    os.makedirs(folder)
+    data = {
+        '學號': ['S001', 'S002'],
+        '姓名': ['Alice', 'Bob'],
+        '班級': ['101', '201'],
+        '原社團': ['None', 'None'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01']),
+        '志願1': ['ClubA', 'ClubA'],
+        '志願2': ['ClubB', 'ClubB']
+    }
+    pd.DataFrame(data).to_excel(os.path.join(folder, '學生志願.xlsx'), index=False)
+    pd.DataFrame({'社團名稱': ['ClubA', 'ClubB'], '目前缺額': [club_vacancy, 5]}).to_excel(
+        os.path.join(folder, '社團缺額.xlsx'), index=False)
+
+def test_batch():
+    print("Testing Multi-School Batch Runner...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, 'district')
+        out = os.path.join(tmp, 'out')
+        make_school(os.path.join(root, '甲校'), 1)
+        make_school(os.path.join(root, '乙校'), 2)
+        # 乙校: 高一禁止轉入 ClubA
+        with open(os.path.join(root, '乙校', '限制.json'), 'w', encoding='utf-8') as f:
+            json.dump({'h1_forbidden': ['ClubA']}, f)
+        # 丙校: 缺少缺額檔，不應影響其他學校
+        os.makedirs(os.path.join(root, '丙校'))
+        pd.DataFrame({'學號': ['X']}).to_excel(os.path.join(root, '丙校', '學生志願.xlsx'), index=False)
+
+        # 丁校: 限制.json 格式錯誤，只有這所學校失敗
+        make_school(os.path.join(root, '丁校'), 1)
+        with open(os.path.join(root, '丁校', '限制.json'), 'w', encoding='utf-8') as f:
+            f.write('{"h1_forbidden": ["ClubA",')
+
+        code = main([root, '-o', out, '--workers', '2', '-q'])
+        assert code == 1, "a failed school should be reported in the exit code"
+
+        summary = pd.read_excel(os.path.join(out, '批次摘要.xlsx')).set_index('學校')
+        print(summary[['狀態', '學生數', '成功轉社', '錯誤訊息']])
+        assert summary.loc['甲校', '狀態'] == '成功'
+        assert summary.loc['乙校', '狀態'] == '成功'
+        assert summary.loc['丙校', '狀態'] == '失敗'
+        assert summary.loc['丁校', '狀態'] == '失敗'
+        assert '限制.json' in summary.loc['丁校', '錯誤訊息'], summary.loc['丁校', '錯誤訊息']
+
+        res = pd.read_excel(os.path.join(out, '甲校_轉社結果.xlsx'))
+        assert dict(zip(res['學號'], res['分發結果'])) == {'S001': 'ClubA', 'S002': 'ClubB'}
+        res = pd.read_excel(os.path.join(out, '乙校_轉社結果.xlsx'))
+        assert dict(zip(res['學號'], res['分發結果'])) == {'S001': 'ClubB', 'S002': 'ClubA'}
+
+    print("\n✅ All batch tests passed!")
+
+if __name__ == "__main__":
+    test_batch()
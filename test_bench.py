@@ -0,0 +1,35 @@
+from bench import compare, make_school, run_scenario
+
+def test_bench():
+    print("Testing Benchmark Generators...")
+
+    # 相同參數與 seed 產生相同資料
+    df1, clubs1, r1 = make_school(students=200, clubs=15, forbid_ratio=0.2, ban_grades=[1], seed=7)
+    df2, clubs2, r2 = make_school(students=200, clubs=15, forbid_ratio=0.2, ban_grades=[1], seed=7)
+    assert df1.equals(df2) and clubs1.equals(clubs2) and r1 == r2
+    assert len(df1) == 200 and len(clubs1) == 15
+    assert len(r1['h1_forbidden']) == 3 and r1['h1_ban_all'] and not r1['h2_ban_all']
+
+    # 只有遞補鏈的學校: 鏈尾的一個缺額會一路連鎖遞補 chain_depth 次
+    row = run_scenario(dict(students=40, clubs=30, movers=0, scarcity=0, chain_depth=20), repeat=1)
+    print(row)
+    assert row['moves'] == 20, row
+    assert row['moved'] == 20
+    assert row['longest_chain'] == 20, row
+    assert row['total'] > 0 and row['peak_mb'] > 0
+
+    # 與基準比較: 變慢、記憶體增加、結果改變都會列出
+    base = dict(row, total=row['total'] / 10, peak_mb=row['peak_mb'] / 10, moves=19)
+    base['ripple'] = 0.0
+    problems = compare({'chain': dict(row, total=row['total'] + 1)}, {'chain': base})
+    print(problems)
+    messages = [m for _, m in problems]
+    assert any(m.startswith("變慢") for m in messages)
+    assert any(m.startswith("記憶體增加") for m in messages)
+    assert any(m.startswith("結果不同: moves") for m in messages)
+    assert compare({'chain': row}, {'chain': row}) == []
+
+    print("\n✅ All benchmark tests passed!")
+
+if __name__ == "__main__":
+    test_bench()
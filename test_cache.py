@@ -0,0 +1,32 @@
+import pandas as pd
+from allocation import ResultCache, allocation_key
+
+def test_cache():
+    print("Testing Result Cache...")
+
+    # LRU: 超過上限時淘汰最久沒用到的結果
+    cache = ResultCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1 # 'a' 變成最近使用
+    cache.put('c', 3)
+    assert cache.get('b') is None, "least recently used entry should be evicted"
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert len(cache) == 2
+
+    # Key: 內容相同即相同，任何設定不同即不同
+    clubs_df = pd.DataFrame({'社團名稱': ['ClubA', 'ClubB'], '目前缺額': [10, 10]})
+    key = allocation_key('students-hash', clubs_df, ['ClubA', 'ClubB'], [])
+    assert key == allocation_key('students-hash', clubs_df.copy(), ['ClubB', 'ClubA'], [])
+    assert key != allocation_key('other-hash', clubs_df, ['ClubA', 'ClubB'], [])
+    assert key != allocation_key('students-hash', clubs_df, ['ClubA'], [])
+    assert key != allocation_key('students-hash', clubs_df, ['ClubA', 'ClubB'], [], h2_ban_all=True)
+
+    changed = clubs_df.copy()
+    changed.loc[1, '目前缺額'] = 11
+    assert key != allocation_key('students-hash', changed, ['ClubA', 'ClubB'], [])
+
+    print("\n✅ All cache tests passed!")
+
+if __name__ == "__main__":
+    test_cache()
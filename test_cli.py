@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+import pandas as pd
+from cli import main
+
+def test_cli():
+    print("Testing Headless CLI...")
+
+    data = {
+        '學號': ['S001', 'S002', 'S003'],
+        '姓名': ['Alice', 'Bob', 'Charlie'],
+        '班級': ['101', '201', '301'],
+        '原社團': ['None', 'None', 'None'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02']),
+        '志願1': ['ClubA', 'ClubA', 'ClubA'],
+        '志願2': ['ClubB', 'ClubB', 'ClubB']
+    }
+    clubs_data = {
+        '社團名稱': ['ClubA', 'ClubB'],
+        '目前缺額': [1, 5]
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        students_path = os.path.join(tmp, 'students.xlsx')
+        clubs_path = os.path.join(tmp, 'clubs.xlsx')
+        output_path = os.path.join(tmp, 'result.xlsx')
+        pd.DataFrame(data).to_excel(students_path, index=False)
+        pd.DataFrame(clubs_data).to_excel(clubs_path, index=False)
+
+        snapshot_dir = os.path.join(tmp, 'snapshots')
+
+        # 高一不能轉入 ClubA，因此 ClubA 唯一的名額給高二的 Bob (第二次由學生資料快照載入，結果相同)
+        for _ in range(2):
+            code = main([students_path, clubs_path, '-o', output_path, '--h1-forbid', 'ClubA', '-q', '--snapshot-dir', snapshot_dir])
+            assert code == 0
+        assert len(os.listdir(snapshot_dir)) == 1
+
+        result_df = pd.read_excel(output_path, sheet_name='分發結果')
+        final = dict(zip(result_df['學號'], result_df['分發結果']))
+        print(final)
+        assert final == {'S001': 'ClubB', 'S002': 'ClubA', 'S003': 'ClubB'}, f"Unexpected result: {final}"
+
+        vac_df = pd.read_excel(output_path, sheet_name='剩餘缺額')
+        assert dict(zip(vac_df['社團名稱'], vac_df['剩餘缺額']))['ClubB'] == 3
+
+        # 缺少必要欄位時回傳錯誤碼，不寫出結果
+        pd.DataFrame(data).drop(columns=['班級']).to_excel(students_path, index=False)
+        os.remove(output_path)
+        assert main([students_path, clubs_path, '-o', output_path, '-q', '--snapshot-dir', snapshot_dir]) == 2
+        assert not os.path.exists(output_path)
+
+    print("\n✅ All CLI tests passed!")
+
+if __name__ == "__main__":
+    test_cli()
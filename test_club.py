@@ -0,0 +1,26 @@
+from allocation import Club
+
+def test_club_membership():
+    print("Testing Club Membership Tracking...")
+
+    c = Club(' Basketball ', 1)
+    for idx in [3, 1, 4]:
+        c.add(idx)
+    c.capacity = c.initial_vacancy + c.occupancy
+
+    assert c.name == 'Basketball'
+    assert c.occupancy == 3 and c.capacity == 4
+    assert c.has_space()
+
+    # 移出後名額釋出，名單仍保留加入順序
+    c.remove(1)
+    c.add(5)
+    c.add(9)
+    assert c.current_students == [3, 4, 5, 9], c.current_students
+    assert c.occupancy == 4
+    assert not c.has_space()
+
+    print("\n✅ All club membership tests passed!")
+
+if __name__ == "__main__":
+    test_club_membership()
@@ -0,0 +1,99 @@
+import pandas as pd
+from allocation import Allocator, normalize_club_name, process_allocation
+from ingest import sheet_from_dataframe
+
+def test_compile():
+    print("Testing Input Compilation...")
+
+    # 1. 社團名稱正規化: 全形/半形、前後與中間的空白、各種空白值
+    assert normalize_club_name('Ｃｏｍｉｃ') == 'Comic'
+    assert normalize_club_name('  熱舞　社 ') == '熱舞 社'
+    assert normalize_club_name('吉他社（一）') == '吉他社(一)'
+    for blank in (None, float('nan'), '', '  ', 'nan', ' nan '):
+        assert normalize_club_name(blank) == 'nan', blank
+    # 'None'、'NaN' 等文字不是空白，是一般的社團名稱
+    for name in ('None', 'NaN', 'null', 'N/A'):
+        assert normalize_club_name(name) == name, name
+
+    data = {
+        '學號': ['S1', 'S2', 'S3', 'S4'],
+        '姓名': ['A', 'B', 'C', 'D'],
+        '班級': ['101', '201', '301', '301'],
+        '原社團': ['Chess', 'Ｃｈｅｓｓ', 'Comic', None],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02', '2023-01-01 10:03']),
+        '志願1': ['Ｃｏｍｉｃ ', 'Drama', 'Chess', 'Comic'],
+        '志願2': ['Comic', 'Music', None, None],
+        '志願3': ['Music', 'Comic', 'Chess', 'Music'],
+    }
+    # 缺額表的名稱也會正規化: 'Music' 與 'Ｍｕｓｉｃ' 是同一個社團，缺額相加
+    clubs_df = pd.DataFrame({'社團名稱': ['Chess', 'Comic', 'Music', 'Ｍｕｓｉｃ', None], '目前缺額': [0, 1, 1, 1, 5]})
+    allocator = Allocator(pd.DataFrame(data))
+    table, clubs = allocator.compile(clubs_df, h1_forbidden=['Ｍｕｓｉｃ'])
+    assert list(clubs) == ['Chess', 'Comic', 'Music'] and clubs['Music'].initial_vacancy == 2
+    assert table.renamed == {'Ｃｈｅｓｓ': 'Chess', 'Ｃｏｍｉｃ': 'Comic'}, table.renamed
+
+    # 2. 每位學生只留下有效且已解析的志願 (志願序, 社團ID)，空白、不在缺額表、重複填寫與被限制的都去除
+    names = table.club_names
+    choices = [[(i + 1, names[cid]) for i, cid in row] for row in table.choices]
+    print(choices)
+    assert choices == [[(1, 'Comic')], [(2, 'Music'), (3, 'Comic')], [(1, 'Chess')], [(1, 'Comic'), (3, 'Music')]]
+
+    # 3. 診斷報告: 每個被略過的志願與原因
+    dropped = table.dropped_entries()
+    print(dropped)
+    assert dropped[['學號', '志願序', '志願社團', '原因']].values.tolist() == [
+        ['S1', 2, 'Comic', '重複填寫'],
+        ['S1', 3, 'Music', '高一禁止轉入: Ｍｕｓｉｃ'],
+        ['S2', 1, 'Drama', '不在缺額表'],
+        ['S3', 3, 'Chess', '重複填寫'],
+    ]
+    assert table.num_dropped == 4
+    table, _ = allocator.compile(clubs_df, h2_ban_all=True)
+    assert set(table.dropped_entries().query("學號 == 'S2'")['原因']) == {'不在缺額表', '高二全面凍結'}
+
+    # 4. 分發使用正規化後的名稱，統計中記錄略過的志願數
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(pd.DataFrame(data), clubs_df, h1_forbidden=['Ｍｕｓｉｃ'])
+    print(result_df)
+    assert result_df['原社團'].tolist() == ['Chess', 'Chess', 'Comic', 'nan']
+    assert result_df['分發結果'].tolist() == ['Comic', 'Music', 'Chess', 'Comic']
+    assert stats.dropped_prefs == 4
+
+    # 5. 精確配對: 沒有原社團的學生，中間的空白志願不再被當成「原社團」而停止 (與動態遞補相同，會繼續看下一個志願)
+    data = {
+        '學號': ['S1', 'S2'],
+        '班級': ['301', '301'],
+        '原社團': ['A', None],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01']),
+        '志願1': ['', 'A'],
+        '志願2': ['', None],
+        '志願3': ['', 'B'],
+    }
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B'], '目前缺額': [0, 1]})
+    for engine in ('ripple', 'exact'):
+        result_df = process_allocation(pd.DataFrame(data), clubs_df, engine=engine)[0]
+        assert result_df['分發結果'].tolist() == ['A', 'B'], (engine, result_df)
+
+    # 6. 名為 'None' 的社團是一般的社團: 可以轉出、轉入，也會出現在剩餘缺額表
+    data = {
+        '學號': ['S1', 'S2', 'S3'],
+        '班級': ['301', '301', '301'],
+        '原社團': ['None', 'None', 'A'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02']),
+        '志願1': ['A', 'B', 'None'],
+    }
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B'], '目前缺額': [0, 1]})
+    for engine in ('ripple', 'exact'):
+        result_df, vac_df = process_allocation(pd.DataFrame(data), clubs_df, engine=engine)[:2]
+        assert result_df['分發結果'].tolist() == ['A', 'B', 'None'], (engine, result_df)
+        assert vac_df['社團名稱'].tolist() == ['A', 'B', 'None'], (engine, vac_df)
+
+    # 7. 讀檔時收集的社團名稱與分發時相同
+    sheet = sheet_from_dataframe(pd.DataFrame({
+        '學號': ['S1'], '班級': ['101'], '填寫時間': ['2023-01-01'], '原社團': [' Chess'], '志願1': ['Ｃｏｍｉｃ'], '志願2': ['nan'],
+    }))
+    assert sheet.clubs == {'Chess', 'Comic'}, sheet.clubs
+
+    print("\n✅ All input compilation tests passed!")
+
+if __name__ == "__main__":
+    test_compile()
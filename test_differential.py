@@ -0,0 +1,86 @@
+import os
+import tempfile
+
+import pandas as pd
+
+import allocation
+from allocation import process_allocation
+from differential import (BASELINE, CANDIDATES, _each_step, case_from_json, case_to_json, check_case, is_plain, main,
+                          plain_case, random_case, run_cases, shrink)
+from reference import baseline_allocation, reference_allocation
+
+def test_differential():
+    print("Testing Differential Harness...")
+
+    # 1. 隨機案例 (含增量重算) 的所有分發方式都與參考分發相同；相同 seed 產生相同案例
+    reports = run_cases(range(30), max_students=300, workers=2)
+    sizes = [report['students'] for report in reports]
+    print(f"學生數 {min(sizes)} ~ {max(sizes)}")
+    assert [report['seed'] for report in reports] == list(range(30))
+    assert all(not report['failures'] for report in reports), [r['failures'] for r in reports if r['failures']]
+    case = random_case(7, 300)
+    assert case_to_json(case) == case_to_json(random_case(7, 300))
+    assert any(len(random_case(seed, 300)['steps']) > 1 for seed in range(10))
+
+    # 2. 故意出錯的分發方式 (忽略所有限制) 會被找出並縮小成很小的案例
+    CANDIDATES['broken'] = lambda case: _each_step(case, lambda clubs, _: process_allocation(case['students'].copy(), clubs))
+    try:
+        seed = next(seed for seed in range(100) if check_case(random_case(seed, 300), ['broken']))
+        case = random_case(seed, 300)
+        small, checks = shrink(case, 'broken')
+        failures = check_case(small, ['broken'])
+        print(f"seed {seed}: {len(case['students'])} → {len(small['students'])} 名學生 ({checks} 次比對) {failures[0]['message']}")
+        assert failures and len(small['students']) <= 2 and len(small['steps']) == 1
+        assert check_case(small, [name for name in CANDIDATES if name != 'broken']) == []
+
+        # 3. 存檔後重現相同的差異
+        restored = case_from_json(case_to_json(small))
+        assert check_case(restored, ['broken']) == failures
+    finally:
+        del CANDIDATES['broken']
+
+    # 4. 參考分發與原始版本: 不觸發刻意差異的輸入 (含名為 'None' 的社團) 結果相同
+    reports = run_cases(range(40), [BASELINE], max_students=300, workers=2)
+    assert all(not report['failures'] for report in reports), [r['failures'] for r in reports if r['failures']]
+    assert all(is_plain(plain_case(seed, 300)) for seed in range(10))
+    assert not is_plain(random_case(0, 300))
+    students_df = pd.DataFrame({
+        '學號': ['S1', 'S2', 'S3'],
+        '班級': ['301', '301', '301'],
+        '原社團': ['None', 'None', 'A'],
+        '填寫時間': pd.date_range('2024-01-01', periods=3, freq='min'),
+        '志願1': ['A', 'B', 'None'],
+    })
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B'], '目前缺額': [0, 1]})
+    result_df, leftover = baseline_allocation(students_df, clubs_df)
+    assert result_df['分發結果'].tolist() == ['A', 'B', 'None'] and leftover == {'A': 0, 'B': 0, 'None': 1}
+    case = {'seed': None, 'students': students_df, 'steps': [{'clubs': clubs_df, 'restrictions': {}}]}
+    assert is_plain(case) and check_case(case, [BASELINE] + list(CANDIDATES)) == []
+
+    # 把 'None' 當成空白 (不該有的規則改變) 時，與原始版本的比對會找出差異並縮小案例
+    blank_names = allocation.BLANK_NAMES
+    allocation.BLANK_NAMES = blank_names | {'None'}
+    try:
+        assert reference_allocation(students_df, clubs_df)[0]['分發結果'].tolist() == ['nan', 'B', 'A']
+        failures = check_case(case, [BASELINE])
+        print(failures[0]['message'])
+        assert failures and failures[0]['candidate'] == BASELINE
+        seed = next(seed for seed in range(100) if check_case(plain_case(seed, 300), [BASELINE]))
+        small, _ = shrink(plain_case(seed, 300), BASELINE)
+        assert is_plain(small) and len(small['students']) <= 2 and check_case(small, [BASELINE])
+    finally:
+        allocation.BLANK_NAMES = blank_names
+
+    # 5. 命令列: 沒有差異時回傳 0，並可重新檢查存下來的案例
+    assert main(["--cases", "3", "--max-students", "50", "--workers", "1", "-q"]) == 0
+    assert main(["--baseline", "--cases", "3", "--max-students", "50", "--workers", "1", "-q"]) == 0
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "case.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(case_to_json(small))
+        assert main(["--replay", path]) == 0
+
+    print("\n✅ All differential tests passed!")
+
+if __name__ == "__main__":
+    test_differential()
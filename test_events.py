@@ -0,0 +1,49 @@
+import io
+
+import pandas as pd
+from allocation import MoveLog, SwapLog, process_allocation, write_workbook
+
+def test_events():
+    print("Testing Structured Event Logs...")
+
+    # U1 轉入 B 的缺額引發連鎖遞補；S1/S2 兩兩交換；S3 -> S4 -> S5 循環交換
+    data = {
+        '學號': ['U2', 'U1', 'S1', 'S2', 'S3', 'S4', 'S5'],
+        '姓名': ['小二', '小一', '甲', '乙', '丙', '丁', '戊'],
+        '班級': ['301'] * 7,
+        '原社團': ['C', 'A', 'P', 'Q', 'X', 'Y', 'Z'],
+        '填寫時間': pd.date_range('2023-01-01 10:00', periods=7, freq='min'),
+        '志願1': ['A', 'B', 'Q', 'P', 'Y', 'Z', 'X'],
+    }
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B', 'C', 'P', 'Q', 'X', 'Y', 'Z'], '目前缺額': [0, 1, 0, 0, 0, 0, 0, 0]})
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(pd.DataFrame(data), clubs_df, swap_cycles=True)
+
+    # 事件以陣列儲存，取出時才組成文字
+    assert isinstance(logs, MoveLog) and isinstance(swap_logs, SwapLog)
+    assert logs.students.tolist() == [1, 0]
+    print(list(logs), list(swap_logs))
+    assert logs[0] == "#1: 小一 (U1) 從 [A] 轉入 [B] (志願1)"
+    assert logs[-1] == logs[1] and logs[:1] == [logs[0]]
+    assert swap_logs[0] == "甲 <-> 乙 : P <-> Q"
+    assert swap_logs[1] == "循環交換: 丙 (X) -> 丁 (Y) -> 戊 (Z) -> 丙"
+
+    # 表格: 遞補一筆一列，交換每位參與者一列 (序號相同)
+    moves = logs.to_frame()
+    assert moves.columns.tolist() == ['序號', '學號', '姓名', '原本社團', '轉入社團', '志願序']
+    assert moves.iloc[1].tolist() == [2, 'U2', '小二', 'C', 'A', 1]
+    swaps = swap_logs.to_frame()
+    print(swaps)
+    assert swaps['序號'].tolist() == [1, 1, 2, 2, 2]
+    assert swaps.iloc[4][['學號', '原本社團', '轉入社團']].tolist() == ['S5', 'Z', 'X']
+
+    # 匯出檔寫入相同的表格
+    output = io.BytesIO()
+    write_workbook(output, result_df, vac_df, logs, swap_logs, stats)
+    sheets = pd.read_excel(io.BytesIO(output.getvalue()), sheet_name=None)
+    assert sheets['遞補日誌']['轉入社團'].tolist() == ['B', 'A']
+    assert len(sheets['交換紀錄']) == 5
+
+    print("\n✅ All event log tests passed!")
+
+if __name__ == "__main__":
+    test_events()
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+from allocation import Allocator, Club, NO_RANK, SwapLog, process_allocation, swap_optimize
+from bench import make_school
+from scenarios import compare_engines
+
+def test_exact():
+    print("Testing Exact Matching Engine...")
+
+    # 1. 要求鏈: S1 (最早) 想去已滿的 X，X 的成員 S2 想去有空位的 Z
+    #    精確配對讓 S2 先輪 (轉入 Z)，S1 再補上 S2 在 X 的名額；動態遞補則是 S1 先拿走 Z 的空位，再靠交換達到相同結果
+    data = {
+        '學號': ['S1', 'S2', 'S3'],
+        '姓名': ['S1', 'S2', 'S3'],
+        '班級': ['301', '301', '301'],
+        '原社團': ['W', 'X', 'Y'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02']),
+        '志願1': ['X', 'Z', 'Z'],
+        '志願2': ['Z', None, None],
+    }
+    clubs_df = pd.DataFrame({'社團名稱': ['W', 'X', 'Y', 'Z'], '目前缺額': [0, 0, 0, 1]})
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(pd.DataFrame(data), clubs_df, engine='exact')
+    final = dict(zip(result_df['學號'], result_df['分發結果']))
+    print(final, list(logs))
+    assert final == {'S1': 'X', 'S2': 'Z', 'S3': 'Y'}, f"Unexpected chain result: {final}"
+    assert result_df['錄取志願序'].tolist() == [1, 1, '未轉社']
+    # 鏈尾先轉入空位，與遞補日誌的順序相同；S1 的原名額釋出
+    assert list(logs) == ["#1: S2 (S2) 從 [X] 轉入 [Z] (志願1)", "#2: S1 (S1) 從 [W] 轉入 [X] (志願1)"], list(logs)
+    assert dict(zip(vac_df['社團名稱'], vac_df['剩餘缺額'])) == {'W': 1, 'X': 0, 'Y': 0, 'Z': 0}
+    assert 'match' in stats.timings and 'ripple' not in stats.timings
+    assert stats.moves == 2 and stats.longest_chain == 2
+
+    summary, diff = compare_engines(pd.DataFrame(data), clubs_df)
+    print(summary)
+    assert summary['分發引擎'].tolist() == ['動態遞補 + 交換', '精確配對']
+    assert summary['交換組數'].tolist() == [1, 0] and summary['成功轉社'].tolist() == [2, 2]
+    assert diff.empty
+
+    # 2. 沒有缺額時，兩兩交換與循環交換都在配對中完成
+    data = {
+        '學號': ['S1', 'S2', 'S3', 'S4', 'S5'],
+        '姓名': ['S1', 'S2', 'S3', 'S4', 'S5'],
+        '班級': ['301', '301', '301', '301', '301'],
+        '原社團': ['A', 'B', 'C', 'D', 'E'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02',
+                                   '2023-01-01 10:03', '2023-01-01 10:04']),
+        '志願1': ['B', 'A', 'D', 'E', 'C'],
+    }
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B', 'C', 'D', 'E'], '目前缺額': [0, 0, 0, 0, 0]})
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(pd.DataFrame(data), clubs_df, engine='exact')
+    print(list(swap_logs))
+    assert list(swap_logs) == ["S1 <-> S2 : A <-> B", "循環交換: S3 (C) -> S4 (D) -> S5 (E) -> S3"], list(swap_logs)
+    assert (result_df['錄取志願序'] == 1).all() and len(logs) == 0
+    assert stats.swaps == 1 and stats.cycle_swaps == 1
+
+    # 動態遞補沒有開啟循環交換時，三人循環留在原社團
+    summary, diff = compare_engines(pd.DataFrame(data), clubs_df)
+    print(diff)
+    assert diff['學號'].tolist() == ['S3', 'S4', 'S5']
+    assert diff['動態遞補 + 交換分發結果'].tolist() == ['C', 'D', 'E'] and diff['精確配對分發結果'].tolist() == ['D', 'E', 'C']
+    assert diff['較好的引擎'].tolist() == ['精確配對'] * 3
+    assert compare_engines(pd.DataFrame(data), clubs_df, swap_cycles=True)[1].empty
+
+    # 3. 志願中填了自己的原社團: 寧可留下，不去後面的志願
+    data = {
+        '學號': ['S1'], '姓名': ['S1'], '班級': ['101'], '原社團': ['A'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00']), '志願1': ['A'], '志願2': ['B'],
+    }
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B'], '目前缺額': [0, 3]})
+    result_df = process_allocation(pd.DataFrame(data), clubs_df, engine='exact')[0]
+    assert result_df['分發結果'].tolist() == ['A']
+
+    # 4. 模擬學校: 沒有人比原社團差、沒有浪費的空位、也找不到讓人變好的交換
+    students_df, clubs_df, restrictions = make_school(students=600, clubs=20, scarcity=0.3, chain_depth=5,
+                                                      forbid_ratio=0.2, seed=7)
+    allocator = Allocator(students_df)
+    result_df, vac_df, logs, swap_logs, stats = allocator.run(clubs_df, engine='exact', **restrictions)
+    table = allocator.table
+    left = np.zeros(len(table.club_names), dtype=np.int64)
+    left[:len(vac_df)] = vac_df['剩餘缺額'].to_numpy()
+    for idx, pos in enumerate(table.first_positions()):
+        limit = table.rank[idx] if table.rank[idx] != NO_RANK else pos.get(table.original[idx], NO_RANK)
+        if table.assigned[idx] != table.original[idx]:
+            assert pos[table.assigned[idx]] == table.rank[idx] < pos.get(table.original[idx], NO_RANK)
+        assert not any(i < limit and table.is_club(c) and left[c] > 0 for c, i in pos.items()), idx
+    clubs = [Club(name, 0) for name in table.club_names[:table.num_clubs]]
+    for idx, cid in enumerate(table.assigned.tolist()):
+        if table.is_club(cid):
+            clubs[cid].add(idx)
+    for c in clubs:
+        c.capacity = c.occupancy
+    extra = SwapLog(table)
+    swap_optimize(table, clubs, extra, cycles=True)
+    assert len(extra) == 0, list(extra)
+
+    # 5. 未知的引擎
+    try:
+        allocator.run(clubs_df, engine='magic')
+        assert False, "should reject unknown engine"
+    except ValueError as e:
+        print(e)
+
+    print("\n✅ All exact matching tests passed!")
+
+if __name__ == "__main__":
+    test_exact()
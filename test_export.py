@@ -0,0 +1,69 @@
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+from allocation import available_sheets, process_allocation, write_csv_zip, write_workbook
+
+def test_export():
+    print("Testing Excel / CSV Export...")
+
+    data = {
+        '學號': ['S1', 'S2', 'S3'],
+        '姓名': ['Alice', 'Bob', 'Charlie'],
+        '班級': ['101', '201', '301'],
+        '原社團': ['A', 'B', None],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02']),
+        '志願1': ['B', 'A', ''],
+    }
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B'], '目前缺額': [0, 0]})
+    result = process_allocation(pd.DataFrame(data), clubs_df)
+    result_df, vac_df, logs, swap_logs, stats = result
+
+    # 沒有遞補紀錄，只有一組交換
+    sheets = available_sheets(logs, swap_logs, stats)
+    print(sheets)
+    assert sheets == ['分發結果', '剩餘缺額', '成功名單', '交換紀錄', '執行統計']
+    assert available_sheets(logs, [], None) == ['分發結果', '剩餘缺額', '成功名單']
+
+    # 1. constant_memory 寫出的 Excel 讀回後與原表格相同
+    buffer = io.BytesIO()
+    write_workbook(buffer, *result)
+    book = pd.read_excel(io.BytesIO(buffer.getvalue()), sheet_name=None)
+    assert list(book) == sheets
+    assert book['分發結果']['學號'].tolist() == ['S1', 'S2', 'S3']
+    assert book['分發結果']['分發結果'].tolist()[:2] == ['B', 'A']
+    assert book['分發結果']['錄取志願序'].tolist() == [1, 1, '未轉社']
+    # 缺漏值寫成空白格
+    assert book['分發結果']['原社團'].tolist()[:2] == ['A', 'B'] and pd.isna(book['分發結果']['原社團'][2])
+    assert book['交換紀錄']['學號'].tolist() == ['S1', 'S2']
+
+    # 數值照原樣寫入，NaN 與 None 為空白格
+    frame = pd.DataFrame({'x': [1.5, np.nan, 2.0], 'y': ['a', None, 'b']})
+    buffer = io.BytesIO()
+    write_workbook(buffer, frame, frame, [], [], sheets=['剩餘缺額'])
+    back = pd.read_excel(io.BytesIO(buffer.getvalue()), sheet_name=None)
+    assert list(back) == ['剩餘缺額']
+    assert back['剩餘缺額']['x'].tolist()[::2] == [1.5, 2.0] and back['剩餘缺額'].iloc[1].isna().all()
+
+    # 2. 只匯出選定的工作表 (依 EXPORT_SHEETS 的順序)
+    buffer = io.BytesIO()
+    write_workbook(buffer, *result, sheets=['執行統計', '分發結果'])
+    assert list(pd.read_excel(io.BytesIO(buffer.getvalue()), sheet_name=None)) == ['分發結果', '執行統計']
+
+    # 3. CSV 壓縮檔: 每個工作表一個 CSV，Excel 可直接開啟 (UTF-8 含 BOM)
+    buffer = io.BytesIO()
+    write_csv_zip(buffer, *result, sheets=['分發結果', '遞補日誌', '交換紀錄'])
+    with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as archive:
+        names = archive.namelist()
+        print(names)
+        assert names == ['分發結果.csv', '交換紀錄.csv'] # 沒有遞補紀錄的工作表略過
+        raw = archive.read('分發結果.csv')
+        assert raw.startswith(b'\xef\xbb\xbf')
+        csv = pd.read_csv(io.BytesIO(raw), encoding='utf-8-sig')
+        assert csv['學號'].tolist() == ['S1', 'S2', 'S3']
+
+    print("\n✅ All export tests passed!")
+
+if __name__ == "__main__":
+    test_export()
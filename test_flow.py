@@ -0,0 +1,107 @@
+import pandas as pd
+from allocation import Allocator, PREF_COLS, process_allocation
+from bench import make_school
+
+def test_flow():
+    print("Testing Min-Cost Flow Optimizer...")
+
+    # 沒有缺額，只能互換。兩種改善方式互相衝突 (都需要 S2 / 社團 B):
+    # P: S1 A→B (第1志願)、S2 B→A (第10志願)       志願序總和改善 10 + 1 = 11，多 1 人錄取第 1 志願
+    # Q: S2 B→C (第2志願)、S3 C→B (第2志願)        志願序總和改善 9 + 9 = 18
+    # (Z1..Z8 不是社團，只用來占志願位置)
+    data = {
+        '學號': ['S1', 'S2', 'S3'],
+        '姓名': ['S1', 'S2', 'S3'],
+        '班級': ['301', '301', '301'],
+        '原社團': ['A', 'B', 'C'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02']),
+        '志願1': ['B', 'Z1', 'Z1'],
+        '志願2': [None, 'C', 'B'],
+    }
+    for i in range(3, PREF_COLS):
+        data[f'志願{i}'] = [None, f'Z{i - 1}', None]
+    data[f'志願{PREF_COLS}'] = [None, 'A', None]
+    students_df = pd.DataFrame(data)
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B', 'C'], '目前缺額': [0, 0, 0]})
+
+    def final(result_df):
+        return dict(zip(result_df['學號'], result_df['分發結果']))
+
+    # 兩兩交換依填寫時間先換 S1 / S2，停在 P
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(students_df.copy(), clubs_df)
+    assert final(result_df) == {'S1': 'B', 'S2': 'A', 'S3': 'C'}
+    # 志願序總和最小: Q
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(students_df.copy(), clubs_df, optimizer='sum')
+    print(final(result_df), list(swap_logs))
+    assert final(result_df) == {'S1': 'A', 'S2': 'C', 'S3': 'B'}, final(result_df)
+    # 紀錄的是淨變化: 中途先換成 P 再轉成 Q 的過程不會出現在紀錄中
+    assert list(swap_logs) == ["S2 <-> S3 : B <-> C"], list(swap_logs)
+    assert 'flow' in stats.timings and 'swap' not in stats.timings
+    assert stats.flow_cycles >= 1 and stats.flow_timeouts == 0
+    # 志願序優先: 第 1 志願的人數最多，選 P
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(students_df.copy(), clubs_df, optimizer='lex')
+    assert final(result_df) == {'S1': 'B', 'S2': 'A', 'S3': 'C'}, final(result_df)
+    assert result_df['錄取志願序'].tolist() == [1, 10, '未轉社']
+
+    # 時間預算用完時停在目前的分配 (沒有人變差)
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(students_df.copy(), clubs_df, optimizer='sum', time_budget=0)
+    assert stats.flow_timeouts == 1 and len(swap_logs) == 0
+    assert final(result_df) == {'S1': 'A', 'S2': 'B', 'S3': 'C'}
+
+    # 三人循環不需要開啟 swap_cycles
+    data = {
+        '學號': ['S1', 'S2', 'S3'],
+        '姓名': ['S1', 'S2', 'S3'],
+        '班級': ['301', '301', '301'],
+        '原社團': ['C', 'D', 'E'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02']),
+        '志願1': ['D', 'E', 'C'],
+    }
+    clubs_df = pd.DataFrame({'社團名稱': ['C', 'D', 'E'], '目前缺額': [0, 0, 0]})
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(pd.DataFrame(data), clubs_df, optimizer='sum')
+    assert final(result_df) == {'S1': 'D', 'S2': 'E', 'S3': 'C'}
+    assert len(swap_logs) == 1 and swap_logs[0].startswith("循環交換")
+
+    # 模擬學校: 以遞補結果為起點 (time_budget=0 時不做任何改善)，沒有人變差、不超過容量，
+    # 志願序總和不比兩兩交換差，且紀錄的淨變化可以重現最後的分配
+    students_df, clubs_df, restrictions = make_school(students=800, clubs=25, scarcity=0.3, chain_depth=5,
+                                                      forbid_ratio=0.2, seed=3)
+    allocator = Allocator(students_df)
+
+    def levels():
+        pos = allocator.table.first_positions()
+        return [pos[i].get(c, PREF_COLS) if allocator.table.is_club(c) else PREF_COLS
+                for i, c in enumerate(allocator.table.assigned.tolist())]
+
+    allocator.run(clubs_df, **restrictions)
+    swapped = levels()
+    base = allocator.run(clubs_df, optimizer='sum', time_budget=0, **restrictions)
+    before, start = levels(), allocator.table.assigned.tolist()
+    flow = allocator.run(clubs_df, optimizer='sum', time_budget=None, **restrictions)
+    after, final = levels(), allocator.table.assigned.tolist()
+    print(flow[4].to_dict())
+    assert all(a <= b for a, b in zip(after, before))
+    assert sum(after) <= sum(swapped) < sum(before) and flow[4].flow_cycles > 0
+    assert (flow[1]['剩餘缺額'] >= 0).all()
+    vacancy = {c.name: c.initial_vacancy for c in allocator.build_clubs(clubs_df).values()}
+    occupancy = flow[0]['分發結果'].value_counts()
+    members = flow[0]['原社團'].value_counts()
+    assert all(occupancy.get(name, 0) <= vacancy[name] + members.get(name, 0) for name in vacancy)
+
+    table = allocator.table
+    replay = list(start)
+    moves, swaps = flow[2], flow[3]
+    for k in range(len(base[2]), len(moves)):
+        assert replay[moves.students[k]] == moves.from_clubs[k]
+        replay[moves.students[k]] = moves.to_clubs[k]
+    for k in range(len(base[3]), len(swaps)):
+        members, clubs = swaps.members(k)
+        for j, idx in enumerate(members):
+            assert replay[idx] == clubs[j]
+            replay[idx] = clubs[(j + 1) % len(clubs)]
+    assert replay == final
+
+    print("\n✅ All min-cost flow tests passed!")
+
+if __name__ == "__main__":
+    test_flow()
@@ -0,0 +1,64 @@
+import io
+import os
+import tempfile
+
+import pandas as pd
+from allocation import process_allocation
+from ingest import read_students, read_vacancies
+
+def test_formats():
+    print("Testing CSV / Parquet / Arrow Inputs...")
+
+    students = pd.DataFrame({
+        '學號': ['0101', '0102', '0201', '0202'],
+        '姓名': ['A', 'B', 'C', 'D'],
+        '班級': ['101', '102', '201', '202'],
+        '原社團': ['Comic', 'Chess', 'Comic', 'Chess'],
+        '填寫時間': ['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02', '2023-01-01 10:03'],
+        '志願1': ['Chess', 'Music', 'Music', None],
+        '志願2': ['Music', 'Comic', None, None],
+    })
+    clubs = pd.DataFrame({'社團名稱': ['Comic', 'Chess', 'Music'], '目前缺額': [0, 0, 1]})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def save(df, ext):
+            path = os.path.join(tmp, f"data{ext}")
+            if ext == '.xlsx':
+                df.to_excel(path, index=False)
+            elif ext == '.csv':
+                df.to_csv(path, index=False, encoding='utf-8-sig')
+            elif ext == '.parquet':
+                df.to_parquet(path, index=False)
+            else:
+                df.to_feather(path)
+            return path
+
+        results = {}
+        for ext in ['.xlsx', '.csv', '.parquet', '.feather']:
+            sheet = read_students(save(students, ext))
+            vac = read_vacancies(save(clubs, ext))
+            # 學號開頭的 0 保留、社團名稱一致
+            assert sheet.df['學號'].tolist() == ['0101', '0102', '0201', '0202'], (ext, sheet.df['學號'].tolist())
+            assert sheet.clubs == {'Comic', 'Chess', 'Music'}, (ext, sheet.clubs)
+            assert vac['目前缺額'].tolist() == [0, 0, 1], ext
+            res_df, vac_df, logs, swap_logs, stats = process_allocation(sheet.df, vac)
+            results[ext] = (res_df['分發結果'].tolist(), logs, swap_logs)
+            print(ext, results[ext][0])
+
+        for ext, r in results.items():
+            assert r == results['.xlsx'], f"{ext} 的分發結果與 Excel 不同"
+
+    # 上傳的 file-like 物件以檔名判斷格式；Big5 CSV 也能讀
+    buf = io.BytesIO(clubs.to_csv(index=False).encode('cp950'))
+    assert read_vacancies(buf, '缺額.csv')['社團名稱'].tolist() == ['Comic', 'Chess', 'Music']
+
+    try:
+        read_vacancies(io.BytesIO(b''), '缺額.txt')
+        assert False, "unknown extension should raise"
+    except ValueError as e:
+        print("Expected error:", e)
+
+    print("\n✅ All format tests passed!")
+
+if __name__ == "__main__":
+    test_formats()
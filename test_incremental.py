@@ -0,0 +1,59 @@
+import pandas as pd
+from allocation import Allocator, process_allocation
+
+def test_incremental():
+    print("Testing Incremental Re-allocation...")
+
+    # 連鎖: B 的缺額 -> U1 離開 A -> U2 離開 C -> U3 轉入 C；W 在候補已滿的 F
+    data = {
+        '學號': ['U2', 'U3', 'U1', 'W'],
+        '姓名': ['U2', 'U3', 'U1', 'W'],
+        '班級': ['101', '201', '101', '201'],
+        '原社團': ['C', 'D', 'A', 'E'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02', '2023-01-01 10:03']),
+        '志願1': ['A', 'C', 'B', 'F'],
+        '志願2': ['', '', '', ''],
+    }
+    students_df = pd.DataFrame(data)
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B', 'C', 'D', 'E', 'F'], '目前缺額': [0, 1, 0, 0, 0, 0]})
+
+    allocator = Allocator(students_df.copy())
+    first = allocator.run(clubs_df)
+    assert first[4].reused_moves == 0 and len(first[2]) == 3
+
+    def check(result, clubs_df, **restrictions):
+        full = process_allocation(students_df.copy(), clubs_df, **restrictions)
+        assert result[0].equals(full[0]), result[0]
+        assert result[1].equals(full[1])
+        assert list(result[2]) == list(full[2]), list(result[2])
+        return dict(zip(result[0]['學號'], result[0]['分發結果']))
+
+    # F 多開一個名額: 沿用前三次遞補，只喚醒 F 的候補 W
+    more = clubs_df.assign(目前缺額=[0, 1, 0, 0, 0, 1])
+    result = allocator.run(more)
+    print(list(result[2]))
+    assert result[4].reused_moves == 3 and result[4].moves == 4
+    assert check(result, more)['W'] == 'F'
+
+    # 高一新增禁止 A: U2 不能再轉入 A，從那一步開始重新分發
+    result = allocator.run(more, h1_forbidden=['A'])
+    print(list(result[2]))
+    assert result[4].reused_moves == 1 # 只有 U1 轉入 B 可以沿用
+    final = check(result, more, h1_forbidden=['A'])
+    assert final['U2'] == 'C' and final['U3'] == 'D'
+
+    # 解除限制、減少缺額也與整個重跑相同
+    result = allocator.run(clubs_df)
+    check(result, clubs_df)
+    fewer = clubs_df.assign(目前缺額=[0, 0, 0, 0, 0, 0])
+    result = allocator.run(fewer)
+    assert check(result, fewer) == {'U2': 'C', 'U3': 'D', 'U1': 'A', 'W': 'E'}
+
+    # 社團名單改變時重新建立學生資料表
+    renamed = pd.concat([clubs_df, pd.DataFrame({'社團名稱': ['G'], '目前缺額': [2]})], ignore_index=True)
+    check(allocator.run(renamed), renamed)
+
+    print("\n✅ All incremental re-allocation tests passed!")
+
+if __name__ == "__main__":
+    test_incremental()
@@ -0,0 +1,59 @@
+import io
+
+import pandas as pd
+from allocation import InputError
+from ingest import read_students_xlsx
+
+def to_xlsx(df):
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False)
+    buf.seek(0)
+    return buf
+
+def test_ingest():
+    print("Testing Streaming Student Ingestion...")
+
+    data = {
+        ' 學號 ': [1001, 1002, 1003],
+        '班級': ['101', '201', '301'],
+        '原社團': ['Comic', None, 'Chess'],
+        '填寫時間': ['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02'],
+        '志願1': ['ClubA', 'ClubB', None],
+        '志願2': [None, 'ClubA', 'N/A'],
+        '備註': ['不需要的欄位', '', '']
+    }
+    sheet = read_students_xlsx(to_xlsx(pd.DataFrame(data)))
+    print(sheet.df)
+
+    # 標題去除空白、學號轉字串、補上姓名欄、丟掉用不到的欄位
+    assert sheet.columns[0] == '學號'
+    assert sheet.df['學號'].tolist() == ['1001', '1002', '1003']
+    assert (sheet.df['姓名'] == '').all()
+    assert '備註' not in sheet.df.columns
+
+    # 空白格 (含 pandas 預設的 N/A 字串) 以 NaN 表示
+    assert pd.isna(sheet.df.loc[1, '原社團']) and pd.isna(sheet.df.loc[2, '志願2'])
+
+    # 同一次讀取收集到的社團名稱
+    assert sheet.clubs == {'Comic', 'Chess', 'ClubA', 'ClubB'}, sheet.clubs
+
+    # 缺少必要欄位
+    try:
+        read_students_xlsx(to_xlsx(pd.DataFrame(data).drop(columns=['班級'])))
+        assert False, "missing column should raise"
+    except InputError as e:
+        assert e.missing == ['班級'], e.missing
+
+    # 重複學號
+    dup = pd.DataFrame(data)
+    dup[' 學號 '] = [1001, 1002, 1001]
+    try:
+        read_students_xlsx(to_xlsx(dup))
+        assert False, "duplicate id should raise"
+    except InputError as e:
+        assert e.duplicates == ['1001'], e.duplicates
+
+    print("\n✅ All ingestion tests passed!")
+
+if __name__ == "__main__":
+    test_ingest()
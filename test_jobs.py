@@ -0,0 +1,108 @@
+import threading
+import time
+
+from allocation import Allocator, process_allocation
+from bench import make_school
+from jobs import JobManager
+
+def wait(job, timeout=30):
+    deadline = time.time() + timeout
+    while not job.done and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+def test_jobs():
+    print("Testing Background Allocation Jobs...")
+    manager = JobManager(max_workers=1, max_jobs=3)
+
+    # 1. 完成的工作: 結果與進度
+    def work(on_progress):
+        on_progress("一半", 50)
+        return 42
+    job = wait(manager.submit(work))
+    assert job.status == 'done' and job.result == 42 and job.percent == 100 and job.text == "一半"
+    assert manager.get(job.id) is job
+
+    # 2. 失敗的工作: 記錄錯誤訊息
+    def broken(on_progress):
+        raise ValueError("缺少欄位")
+    job = wait(manager.submit(broken))
+    print(job.status, job.text)
+    assert job.status == 'failed' and job.error == "缺少欄位"
+
+    # 3. 相同 key 的工作只執行一次；排隊中的工作可以直接取消
+    release = threading.Event()
+    def blocker(on_progress):
+        on_progress("等待中", 10)
+        release.wait(10)
+        return "ok"
+    first = manager.submit(blocker, key="k1")
+    assert manager.submit(blocker, key="k1") is first
+    queued = manager.submit(work, key="k2")
+    time.sleep(0.05)
+    assert first.status == 'running' and queued.status == 'queued'
+    assert [j.id for j in manager.active()] == [first.id, queued.id]
+    queued.cancel()
+    assert queued.status == 'cancelled'
+    release.set()
+    assert wait(first).result == "ok"
+
+    # 4. 執行中的工作在下一次回報進度時停止
+    started = threading.Event()
+    def spin(on_progress):
+        started.set()
+        while True:
+            on_progress("執行中", 50)
+            time.sleep(0.01)
+    job = manager.submit(spin)
+    started.wait(10)
+    job.cancel()
+    assert wait(job).status == 'cancelled'
+
+    # 5. 取消真正的分發後，同一個分發器仍可正常重新分發，結果與重新執行相同
+    students_df, clubs_df, restrictions = make_school(students=3000, clubs=60, seed=1)
+    allocator = Allocator(students_df.copy())
+    allocator.run(clubs_df, **restrictions)
+    clubs_df.loc[0, '目前缺額'] += 5
+    holder = []
+    texts = []
+    def allocate(on_progress):
+        def hook(text, percent=None):
+            texts.append(text)
+            if percent and percent >= 20:
+                holder[0].cancel()
+            on_progress(text, percent)
+        return allocator.run(clubs_df, on_progress=hook, **restrictions)
+    holder.append(manager.submit(allocate))
+    job = wait(holder[0])
+    print(job.status, job.text)
+    assert job.status == 'cancelled' and job.result is None
+    # 進度包含處理到第幾位學生與剩餘缺額
+    assert "剩餘缺額" in texts[-1] and "處理到第" in texts[-1], texts[-1]
+    job = wait(manager.submit(lambda on_progress: allocator.run(clubs_df, on_progress=on_progress, **restrictions)))
+    assert job.status == 'done' and job.text == "分發完成"
+    expected = process_allocation(students_df.copy(), clubs_df, **restrictions)
+    assert job.result[0].equals(expected[0]) and list(job.result[2]) == list(expected[2])
+
+    # 6. 交換階段每輪也會回報進度，取消時不必等到整個階段結束
+    texts.clear()
+    def allocate_swaps(on_progress):
+        def hook(text, percent=None):
+            texts.append(text)
+            if "已交換" in text:
+                holder[1].cancel()
+            on_progress(text, percent)
+        return process_allocation(students_df.copy(), clubs_df, swap_cycles=True, on_progress=hook, **restrictions)
+    holder.append(manager.submit(allocate_swaps))
+    job = wait(holder[1])
+    assert job.status == 'cancelled' and job.result is None
+    assert "已交換" in texts[-1] and "交換最佳化完成" not in texts[-1], texts[-1]
+
+    # 只保留最近結束的工作
+    assert len(manager) <= 3 + len(manager.active())
+    manager.shutdown()
+
+    print("\n✅ All background job tests passed!")
+
+if __name__ == "__main__":
+    test_jobs()
@@ -1,63 +1,40 @@
-def simulate_allocation(students_data, clubs_data):
-    club_vacancies = clubs_data.copy()
-    
-    students = []
-    for s_in in students_data:
-        students.append({
-            'name': s_in['name'],
-            'original_club': s_in['original_club'],
-            'prefs': s_in['prefs'],
-            'current_club': s_in['original_club'],
-            'rank': 999
-        })
-        
-    iteration = 0
-    max_iterations = 20
-    logs = []
-    
-    while iteration < max_iterations:
-        changed = False
-        iteration += 1
-        logs.append(f"Iteration {iteration}")
-        
-        for s in students:
-            # Check prefs better than current
-            current_rank_index = s['rank'] if s['rank'] != 999 else len(s['prefs'])
-            
-            for i in range(current_rank_index):
-                wanted = s['prefs'][i]
-                if wanted in club_vacancies and club_vacancies[wanted] > 0:
-                    old = s['current_club']
-                    new = wanted
-                    
-                    club_vacancies[new] -= 1
-                    if old in club_vacancies:
-                        club_vacancies[old] += 1
-                        
-                    s['current_club'] = new
-                    s['rank'] = i
-                    changed = True
-                    logs.append(f"Moved {s['name']} from {old} to {new}")
-                    break
-        if not changed:
-            break
-            
-    return students, club_vacancies, logs
-
-students_input = [
-    {'name': 'U2', 'original_club': 'C', 'prefs': ['A']},
-    {'name': 'U3', 'original_club': 'D', 'prefs': ['C']},
-    {'name': 'U1', 'original_club': 'A', 'prefs': ['B']},
-]
-# Clubs
-clubs_input = {'A': 0, 'B': 1, 'C': 0, 'D': 0}
-
-final_students, final_clubs, logs = simulate_allocation(students_input, clubs_input)
-
-print("Logs:")
-for l in logs:
-    print(l)
-
-print("\nFinal State:")
-for s in final_students:
-    print(f"{s['name']}: {s['current_club']}")
+import pandas as pd
+
+from allocation import process_allocation
+from differential import canonical, check_case, first_difference
+from reference import baseline_allocation, reference_allocation
+
+def test_logic_pure():
+    print("Testing Chain Refill Against Reference...")
+    # 遞補鏈: U1 離開 A 轉入 B (唯一的缺額) → U2 離開 C 轉入 A → U3 離開 D 轉入 C
+    # U2、U3 填寫得比 U1 早，第一次掃描時都還沒有空位，必須在 U1 移動後重新掃描才會遞補
+    students_df = pd.DataFrame({
+        '學號': ['U2', 'U3', 'U1'],
+        '姓名': ['U2', 'U3', 'U1'],
+        '班級': ['201', '202', '203'],
+        '原社團': ['C', 'D', 'A'],
+        '填寫時間': pd.date_range('2024-01-01', periods=3, freq='min'),
+        '志願1': ['A', 'C', 'B'],
+    })
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B', 'C', 'D'], '目前缺額': [0, 1, 0, 0]})
+
+    expected = reference_allocation(students_df, clubs_df)
+    print(expected[0])
+    assert expected[0]['分發結果'].tolist() == ['A', 'C', 'B']
+    assert expected[0]['錄取志願序'].tolist() == [0, 0, 0]
+    assert expected[1] == {'A': 0, 'B': 0, 'C': 0, 'D': 1}
+
+    # 原始版本 (app.py 原本的分發) 也是同樣的結果
+    assert first_difference(expected, baseline_allocation(students_df, clubs_df)) is None
+
+    actual = canonical(*process_allocation(students_df.copy(), clubs_df)[:2])
+    assert first_difference(expected, actual) is None
+
+    # 所有分發方式 (含增量重算、快照、規則) 都與參考分發相同
+    case = {'seed': None, 'students': students_df, 'steps': [{'clubs': clubs_df, 'restrictions': {}}]}
+    assert check_case(case) == []
+
+    print("\n✅ Chain refill test passed!")
+
+if __name__ == "__main__":
+    test_logic_pure()
@@ -1,6 +1,6 @@
 
 import pandas as pd
-from app import process_allocation
+from allocation import process_allocation
 
 def test_no_name():
     print("Testing No Name Column Logic...")
@@ -28,7 +28,7 @@ def test_no_name():
     clubs_df = pd.DataFrame(clubs_data)
 
     try:
-        result_df, vac_df = process_allocation(students_df, clubs_df)
+        result_df, vac_df, logs, swap_logs, stats = process_allocation(students_df, clubs_df)
         print("✅ process_allocation ran successfully without Name column (after preprocessing)")
         print(result_df.head())
     except Exception as e:
@@ -0,0 +1,77 @@
+import pandas as pd
+
+from allocation import Allocator, process_allocation
+from bench import make_school
+from rules import Rule
+from store import pack_result, unpack_result
+
+def test_provenance():
+    print("Testing Provenance Index...")
+    # U1 離開 A 轉入 B → U2 遞補 A；U4 (高三) 想去 A 但較晚填寫，B 被規則禁止，X 不在缺額表
+    students_df = pd.DataFrame({
+        '學號': ['U2', 'U3', 'U1', 'U4', 'U5'],
+        '姓名': ['N2', 'N3', 'N1', 'N4', 'N5'],
+        '班級': ['201', '202', '203', '301', '101'],
+        '原社團': ['C', 'D', 'A', 'D', 'C'],
+        '填寫時間': pd.date_range('2024-01-01', periods=5, freq='min'),
+        '志願1': ['A', 'C', 'B', 'X', 'B'],
+        '志願2': [None, None, None, 'A', 'B'],
+        '志願3': [None, None, None, 'B', 'C'],
+    })
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B', 'C', 'D'], '目前缺額': [0, 1, 0, 0]})
+    result = process_allocation(students_df, clubs_df, rules=[Rule(grades=[3], clubs=['B'], name="高三不開放 B")])
+    provenance = result[2].provenance
+
+    # 1. 錄取的學生只列出錄取的志願與轉入的事件
+    explained = provenance.explain('U2')
+    print(explained)
+    assert explained[['志願序', '志願社團', '結果', '原因']].values.tolist() == [[1, 'A', '錄取', '遞補 #2']]
+
+    # 2. 各種沒有錄取的原因；額滿時列出比他早填寫、佔用名額的學生
+    explained = provenance.explain(' U4 ')
+    print(explained.to_string())
+    assert explained['原因'].tolist() == ['不在缺額表', '額滿 (名額 1 個)', '高三不開放 B']
+    assert explained['結果'].tolist() == ['未錄取'] * 3
+    assert explained.loc[1, '佔用名額的較優先學生'] == 'N2 (U2，遞補 #2)'
+    assert explained.loc[1, ['原社團留任', '較優先轉入', '較晚轉入']].tolist() == [0, 1, 0]
+    assert explained['較優先轉入'].isna().tolist() == [True, False, True]
+
+    explained = provenance.explain('U5')
+    print(explained.to_string())
+    assert explained['原因'].tolist() == ['額滿 (名額 1 個)', '重複填寫', '已在此社團 (原社團)']
+    assert explained['結果'].tolist() == ['未錄取', '未錄取', '留任']
+    assert explained.loc[0, '佔用名額的較優先學生'] == 'N1 (U1，遞補 #1)'
+    assert provenance.explain('nobody') is None
+
+    # 3. 社團依發生順序的轉入事件
+    entries = provenance.club_entries('A')
+    assert entries[['事件', '學號', '轉出社團', '仍在社團']].values.tolist() == [['遞補 #2', 'U2', 'C', True]]
+    assert provenance.club_entries('X') is None
+
+    # 4. 保存後讀回的分發紀錄可查詢相同的結果
+    restored = unpack_result(pack_result(result))[2].provenance
+    for sid in students_df['學號']:
+        pd.testing.assert_frame_equal(provenance.explain(sid), restored.explain(sid))
+
+    # 5. 大型學校: 動態遞補 + 交換後，每個沒有錄取且參與分發的志願都是額滿；
+    #    同一個分發器重算後，前一次的索引不受影響
+    students_df, clubs_df, restrictions = make_school(students=2000, clubs=30, scarcity=0.3, forbid_ratio=0.2, seed=5)
+    allocator = Allocator(students_df)
+    result_df, _, logs, swap_logs, _ = allocator.run(clubs_df, **restrictions)
+    before = {sid: logs.provenance.explain(sid) for sid in result_df['學號']}
+    reasons = pd.concat(before.values())
+    print(reasons['原因'].str.split(' ').str[0].value_counts())
+    assert not (reasons['原因'] == '尚有空位').any()
+    admitted = reasons[reasons['結果'] == '錄取']
+    assert len(admitted) == int((result_df['錄取志願序'] != '未轉社').sum())
+    assert admitted['原因'].str.startswith(('遞補', '交換', '循環交換')).all()
+    assert sum(len(logs.provenance.club_entries(c)) for c in clubs_df['社團名稱']) == len(logs) + len(swap_logs.students)
+
+    allocator.run(clubs_df.assign(目前缺額=clubs_df['目前缺額'] + 2), **restrictions)
+    for sid in result_df['學號'][:200]:
+        pd.testing.assert_frame_equal(before[sid], logs.provenance.explain(sid))
+
+    print("\n✅ All provenance tests passed!")
+
+if __name__ == "__main__":
+    test_provenance()
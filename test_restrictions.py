@@ -1,5 +1,5 @@
 import pandas as pd
-from app import process_allocation
+from allocation import process_allocation
 
 def test_restrictions():
     print("Testing Grade Restrictions Logic...")
@@ -30,7 +30,7 @@ def test_restrictions():
     h1_forbidden = ['ClubA']
     h2_forbidden = ['ClubB']
 
-    result_df, vac_df = process_allocation(students_df, clubs_df, h1_forbidden, h2_forbidden)
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(students_df, clubs_df, h1_forbidden, h2_forbidden)
 
     print("\n--- Result DataFrame ---")
     print(result_df[['學號', '班級', '分發結果', '錄取志願序', '狀態']])
@@ -0,0 +1,39 @@
+import pandas as pd
+from allocation import process_allocation, split_results
+
+def test_results():
+    print("Testing Columnar Result Assembly...")
+
+    data = {
+        '學號': ['S1', 'S2', 'S3'],
+        '姓名': ['S1', 'S2', 'S3'],
+        '班級': ['101', '201', '301'],
+        '原社團': ['A', 'B', None],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02']),
+        '志願1': ['X', 'A', ''],
+        '志願2': ['B', '', ''],
+    }
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B', 'X'], '目前缺額': [0, 2, 0]})
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(pd.DataFrame(data), clubs_df)
+    print(result_df)
+    print(vac_df)
+
+    assert result_df.columns.tolist() == ['學號', '姓名', '班級', '原社團', '分發結果', '錄取志願序', '狀態']
+    assert result_df['分發結果'].tolist() == ['B', 'A', 'nan']
+    # 錄取志願序 1 起算，沒錄取任何志願為「未轉社」
+    assert result_df['錄取志願序'].tolist() == [2, 1, '未轉社']
+    assert result_df['狀態'].tolist() == ['成功', '成功', '未變更']
+    # 剩餘缺額不為負數
+    assert dict(zip(vac_df['社團名稱'], vac_df['剩餘缺額'])) == {'A': 0, 'B': 2, 'X': 0}
+
+    # 全部都錄取時，錄取志願序為整數欄
+    all_ranked = process_allocation(pd.DataFrame(data).iloc[:2], clubs_df)[0]
+    assert all_ranked['錄取志願序'].dtype == 'int64'
+
+    success, others = split_results(result_df)
+    assert success['學號'].tolist() == ['S1', 'S2'] and others['學號'].tolist() == ['S3']
+
+    print("\n✅ All result assembly tests passed!")
+
+if __name__ == "__main__":
+    test_results()
@@ -0,0 +1,65 @@
+import pandas as pd
+from allocation import process_allocation
+
+def test_ripple():
+    print("Testing Event-Driven Ripple Allocation...")
+
+    # Chain Reaction:
+    # U2 (最早) 想去 A，U3 想去 C，U1 (最晚) 想去 B。
+    # 只有 B 有 1 個缺額，A 與 C 都是滿的。
+    # U1 轉入 B -> A 釋出 -> U2 轉入 A -> C 釋出 -> U3 轉入 C
+    data = {
+        '學號': ['U2', 'U3', 'U1'],
+        '姓名': ['U2', 'U3', 'U1'],
+        '班級': ['301', '301', '301'],
+        '原社團': ['C', 'D', 'A'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02']),
+        '志願1': ['A', 'C', 'B'],
+        '志願2': ['', '', '']
+    }
+    students_df = pd.DataFrame(data)
+
+    clubs_data = {
+        '社團名稱': ['A', 'B', 'C', 'D'],
+        '目前缺額': [0, 1, 0, 0]
+    }
+    clubs_df = pd.DataFrame(clubs_data)
+
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(students_df, clubs_df)
+
+    print("\n--- Result DataFrame ---")
+    print(result_df[['學號', '原社團', '分發結果', '錄取志願序', '狀態']])
+    print("\n".join(logs))
+
+    final = dict(zip(result_df['學號'], result_df['分發結果']))
+    assert final == {'U2': 'A', 'U3': 'C', 'U1': 'B'}, f"Unexpected chain result: {final}"
+
+    # 每次移動一筆日誌，編號連續
+    assert len(logs) == 3, f"Expected 3 moves, got {len(logs)}"
+    assert [l.split(':')[0] for l in logs] == ['#1', '#2', '#3']
+    assert logs[0].startswith('#1: U1'), logs[0]
+
+    # 遞補完後，原社團 D 釋出的名額無人候補
+    remaining = dict(zip(vac_df['社團名稱'], vac_df['剩餘缺額']))
+    assert remaining == {'A': 0, 'B': 0, 'C': 0, 'D': 1}, f"Unexpected vacancies: {remaining}"
+
+    # Time Priority: 兩人搶同一個釋出的名額，較早填寫者優先
+    data = {
+        '學號': ['S1', 'S2', 'S3'],
+        '姓名': ['Late', 'Early', 'Leaver'],
+        '班級': ['301', '301', '301'],
+        '原社團': ['None', 'None', 'Comic'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:05', '2023-01-01 10:00', '2023-01-01 10:10']),
+        '志願1': ['Comic', 'Comic', 'Basketball']
+    }
+    students_df = pd.DataFrame(data)
+    clubs_df = pd.DataFrame({'社團名稱': ['Basketball'], '目前缺額': [1]})
+
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(students_df, clubs_df)
+    final = dict(zip(result_df['學號'], result_df['分發結果']))
+    assert final == {'S1': 'None', 'S2': 'Comic', 'S3': 'Basketball'}, f"Unexpected priority result: {final}"
+
+    print("\n✅ All ripple tests passed!")
+
+if __name__ == "__main__":
+    test_ripple()
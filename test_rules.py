@@ -0,0 +1,79 @@
+import io
+import os
+import tempfile
+
+import pandas as pd
+
+from allocation import Allocator, allocation_key, process_allocation
+from rules import Rule, dump_rules, legacy_rules, load_rules, rules_from_frame, rules_to_frame
+from scenarios import apply_scenario
+
+def test_rules():
+    print("Testing Restriction Rules...")
+
+    data = {
+        '學號': ['S1', 'S2', 'S3', 'S4', 'S5'],
+        '姓名': ['A', 'B', 'C', 'D', 'E'],
+        '班級': ['101', '201', '301', '305', '305'],
+        '原社團': ['Chess', 'Chess', 'Chess', 'Music', 'Chess'],
+        '填寫時間': pd.date_range('2024-01-01', periods=5, freq='min'),
+        '志願1': ['Comic', 'Comic', 'Comic', 'Comic', 'Comic'],
+        '志願2': ['Drama', 'Drama', 'Drama', 'Drama', 'Drama'],
+    }
+    students_df = pd.DataFrame(data)
+    clubs_df = pd.DataFrame({'社團名稱': ['Chess', 'Comic', 'Drama', 'Music'], '目前缺額': [0, 10, 10, 0]})
+
+    def outcome(**restrictions):
+        result_df = process_allocation(students_df.copy(), clubs_df, **restrictions)[0]
+        return dict(zip(result_df['學號'], result_df['分發結果']))
+
+    # 1. 高三 (301-315) 全面凍結
+    result = outcome(rules=[Rule(grades=['高三'])])
+    print(result)
+    assert result == {'S1': 'Comic', 'S2': 'Comic', 'S3': 'Chess', 'S4': 'Music', 'S5': 'Chess'}
+
+    # 2. 班級 (範圍與單一班級) + 原社團: 305 班原社團為 Chess 的學生不能轉入 Comic
+    result = outcome(rules=[Rule(classes=['305'], from_clubs=['Chess'], clubs=['Comic']), Rule(classes=['101-102'], clubs=['Comic'])])
+    print(result)
+    assert result == {'S1': 'Drama', 'S2': 'Comic', 'S3': 'Comic', 'S4': 'Comic', 'S5': 'Drama'}
+
+    # 3. 與原本的高一 / 高二設定結果相同
+    legacy = dict(h1_forbidden=['Comic'], h2_ban_all=True)
+    assert outcome(**legacy) == outcome(rules=legacy_rules(**legacy))
+    assert legacy_rules(**legacy) == [Rule(grades=[1], clubs=['Comic']), Rule(grades=[2])]
+
+    # 4. 志願檢查列出命中的規則
+    table, _ = Allocator(students_df.copy()).compile(clubs_df, rules=[Rule(grades=[3], clubs=['Comic', 'Drama'], name="高三不開放")])
+    dropped = table.dropped_entries()
+    print(dropped)
+    assert dropped['學號'].tolist() == ['S3', 'S3', 'S4', 'S4', 'S5', 'S5']
+    assert set(dropped['原因']) == {'高三不開放'}
+
+    # 5. 表格與檔案格式 (JSON / CSV) 來回轉換
+    rules = [Rule(grades='1、高三', clubs='Comic，Drama'), Rule(classes='301-305', from_clubs=['Chess'], name="說明")]
+    assert rules_from_frame(rules_to_frame(rules)) == rules
+    assert load_rules(io.StringIO(dump_rules(rules)), "rules.json") == rules
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "規則.csv")
+        rules_to_frame(rules).to_csv(path, index=False)
+        assert load_rules(path) == rules
+    for bad in (pd.DataFrame({'年級': ['高四']}), pd.DataFrame({'班級': ['301-']})):
+        try:
+            rules_from_frame(bad)
+            assert False, "should raise"
+        except ValueError as e:
+            print(e)
+            assert "第 1 條規則" in str(e)
+
+    # 6. 快取 key: 沒有額外規則時與先前相同，有規則時不同
+    assert allocation_key('k', clubs_df) == allocation_key('k', clubs_df, rules=[])
+    assert allocation_key('k', clubs_df) != allocation_key('k', clubs_df, rules=rules)
+
+    # 7. 情境凍結高三時以規則表示
+    _, restrictions = apply_scenario(clubs_df, {}, {'seats': {}, 'freeze': (3,)})
+    assert restrictions == {'rules': [Rule(grades=[3])]}
+
+    print("\n✅ All rule tests passed!")
+
+if __name__ == "__main__":
+    test_rules()
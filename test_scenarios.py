@@ -0,0 +1,69 @@
+import pandas as pd
+from allocation import process_allocation
+from scenarios import BASE_NAME, apply_scenario, build_scenarios, run_sweep, summarize
+
+def test_scenarios():
+    print("Testing What-if Scenario Sweep...")
+
+    data = {
+        '學號': ['S1', 'S2', 'S3', 'S4'],
+        '姓名': ['S1', 'S2', 'S3', 'S4'],
+        '班級': ['101', '102', '201', '202'],
+        '原社團': ['A', 'A', 'B', 'C'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02', '2023-01-01 10:03']),
+        '志願1': ['Ball', 'Ball', 'Ball', 'A'],
+        '志願2': ['B', '', 'A', ''],
+    }
+    students_df = pd.DataFrame(data)
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B', 'C', 'Ball'], '目前缺額': [0, 0, 0, 1]})
+
+    scenarios = build_scenarios({'Ball': [0, 2]}, [(), (1,)])
+    names = [s['name'] for s in scenarios]
+    print(names)
+    assert names == [BASE_NAME, '凍結高一', 'Ball+2', 'Ball+2 / 凍結高一']
+    # 重複的組合只出現一次
+    assert len(build_scenarios({'Ball': [0, 0]}, [(), (1,), (1,)])) == 2
+
+    # 套用情境不會修改原本的缺額表
+    new_clubs, restrictions = apply_scenario(clubs_df, {'h1_forbidden': []}, scenarios[3])
+    assert new_clubs['目前缺額'].tolist() == [0, 0, 0, 3] and clubs_df['目前缺額'].tolist() == [0, 0, 0, 1]
+    assert restrictions == {'h1_forbidden': [], 'h1_ban_all': True}
+
+    summary, leftover = run_sweep(students_df, clubs_df, scenarios, workers=2)
+    print(summary)
+    print(leftover)
+    assert summary['情境'].tolist() == names
+    assert summary['成功轉社'].tolist() == [2, 1, 4, 1], summary['成功轉社'].tolist()
+    assert summary['第1志願'].tolist() == [1, 1, 4, 1] and summary['第2志願'].tolist() == [1, 0, 0, 0]
+    assert leftover.loc['Ball', 'Ball+2'] == 0 and leftover.loc['Ball', 'Ball+2 / 凍結高一'] == 2
+
+    # 每個情境都與單獨執行 process_allocation 相同
+    for scenario, row in zip(scenarios, summary.to_dict('records')):
+        c, r = apply_scenario(clubs_df, {}, scenario)
+        result_df = process_allocation(students_df.copy(), c, **r)[0]
+        assert row['成功轉社'] == (result_df['狀態'] == '成功').sum(), scenario
+
+    # 單一 process 的結果相同
+    assert run_sweep(students_df, clubs_df, scenarios, workers=1)[0].equals(summary)
+
+    # 最佳化階段與主要分發相同: 三人循環只有最小成本流會換，基準情境與 process_allocation(optimizer='sum') 一致
+    cycle_df = pd.DataFrame({
+        '學號': ['T1', 'T2', 'T3'],
+        '姓名': ['T1', 'T2', 'T3'],
+        '班級': ['301', '301', '301'],
+        '原社團': ['C', 'D', 'E'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02']),
+        '志願1': ['D', 'E', 'C'],
+    })
+    cycle_clubs = pd.DataFrame({'社團名稱': ['C', 'D', 'E'], '目前缺額': [0, 0, 0]})
+    base = build_scenarios({}, [()])
+    swept = run_sweep(cycle_df, cycle_clubs, base, workers=1, optimizer='sum')[0].iloc[0].to_dict()
+    result_df, vac_df, _, swap_logs, _ = process_allocation(cycle_df.copy(), cycle_clubs, optimizer='sum')
+    assert swept == summarize(BASE_NAME, result_df, vac_df, swap_logs), swept
+    assert swept['成功轉社'] == 3
+    assert run_sweep(cycle_df, cycle_clubs, base, workers=1)[0].loc[0, '成功轉社'] == 0
+
+    print("\n✅ All scenario sweep tests passed!")
+
+if __name__ == "__main__":
+    test_scenarios()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from allocation import StudentInput, process_allocation
+from bench import make_school
+from snapshot import SNAPSHOT_MAGIC, SnapshotStore, read_snapshot
+
+def test_snapshot():
+    print("Testing Student Input Snapshot...")
+    students_df, clubs_df, restrictions = make_school(students=300, clubs=12, scarcity=0.4, forbid_ratio=0.2, seed=2)
+    students_df.loc[3, '志願2'] = ' Ｃｌｕｂ 1 ' # 需要正規化的名稱
+    students_df.loc[5, '原社團'] = None
+    students_df.loc[7, '班級'] = '305'
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'students.xlsx')
+        students_df.to_excel(path, index=False)
+        store = SnapshotStore(os.path.join(folder, 'snapshots'))
+
+        # 1. 第一次讀檔並寫入快照，第二次直接載入 (memory map，陣列唯讀)
+        first, cached = store.load_students(path)
+        assert not cached
+        snapshot, cached = store.load_students(path)
+        assert cached
+        print(f"快照 {os.path.getsize(store.path(snapshot.source_hash))} bytes")
+        with open(store.path(snapshot.source_hash), 'rb') as f:
+            assert f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+        students = snapshot.students
+        assert not students.prefs.flags.writeable
+        assert snapshot.clubs == first.clubs and snapshot.columns == first.columns
+        for name in ('ids', 'names', 'class_strs', 'raw_names'):
+            assert getattr(students, name) == getattr(first.students, name), name
+        for name in ('filled', 'class_num', 'grade', 'original', 'prefs'):
+            np.testing.assert_array_equal(getattr(students, name), getattr(first.students, name))
+        assert students.grade[students.ids.index(students_df.loc[7, '學號'])] == 3
+
+        # 2. 由快照分發的結果與讀取 Excel 後分發相同 (含增量重算用的 Allocator)
+        from ingest import read_students
+        expected = process_allocation(read_students(path).df, clubs_df, swap_cycles=True, **restrictions)
+        result = process_allocation(students, clubs_df, swap_cycles=True, **restrictions)
+        pd.testing.assert_frame_equal(expected[0], result[0])
+        pd.testing.assert_frame_equal(expected[1], result[1])
+        assert list(expected[2]) == list(result[2]) and list(expected[3]) == list(result[3])
+
+        # 3. 還原的學生資料表依填寫時間排序
+        frame = students.to_frame()
+        assert frame['填寫時間'].is_monotonic_increasing and len(frame) == len(students_df)
+        assert StudentInput.from_frame(frame.copy()).raw_names == students.raw_names
+
+        # 4. 內容改變的檔案是新的快照；版本不同或損毀的快照視為不存在，重新讀檔
+        students_df.loc[0, '志願1'] = '社團002'
+        students_df.to_excel(path, index=False)
+        changed, cached = store.load_students(path)
+        assert not cached and changed.source_hash != snapshot.source_hash
+        with open(store.path(changed.source_hash), 'r+b') as f:
+            f.seek(len(SNAPSHOT_MAGIC))
+            f.write((99).to_bytes(4, 'little'))
+        try:
+            read_snapshot(store.path(changed.source_hash))
+            assert False, "should raise"
+        except ValueError as e:
+            print(e)
+        assert store.load(changed.source_hash) is None
+        _, cached = store.load_students(path)
+        assert not cached
+        assert store.load_students(path)[1]
+        assert len(os.listdir(store.directory)) == 2
+
+        del first, snapshot, students, changed, result, frame
+
+    print("\n✅ All snapshot tests passed!")
+
+if __name__ == "__main__":
+    test_snapshot()
@@ -0,0 +1,50 @@
+import io
+
+import pandas as pd
+from allocation import AllocationStats, process_allocation, write_workbook
+
+def test_stats():
+    print("Testing Allocation Instrumentation...")
+
+    # 同 test_ripple 的連鎖: B 的缺額讓 U1 -> U2 -> U3 依序遞補 (連鎖 3 人)；
+    # 另有 X、Y 互換 (E <-> F) 與一位沒填志願的 Z
+    data = {
+        '學號': ['U2', 'U3', 'U1', 'X', 'Y', 'Z'],
+        '姓名': ['U2', 'U3', 'U1', 'X', 'Y', 'Z'],
+        '班級': ['301', '301', '301', '201', '201', '101'],
+        '原社團': ['C', 'D', 'A', 'E', 'F', 'E'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02',
+                                  '2023-01-01 10:03', '2023-01-01 10:04', '2023-01-01 10:05']),
+        '志願1': ['A', 'C', 'B', 'F', 'E', ''],
+    }
+    clubs_df = pd.DataFrame({'社團名稱': ['A', 'B', 'C', 'D', 'E', 'F'], '目前缺額': [0, 1, 0, 0, 0, 0]})
+
+    progress = []
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(
+        pd.DataFrame(data), clubs_df, on_progress=lambda text, percent=None: progress.append(percent))
+    print(stats.to_frame())
+
+    assert isinstance(stats, AllocationStats)
+    assert stats.students == 6
+    assert stats.moves == len(logs) == 3
+    assert stats.longest_chain == 3, stats.longest_chain
+    assert stats.swaps == len(swap_logs) == 1 and stats.cycle_swaps == 0
+    assert stats.swap_attempts >= 1 and stats.scans >= stats.moves and stats.pref_checks >= stats.moves
+    assert list(stats.timings) == ['setup', 'ripple', 'swap', 'results']
+    assert stats.slowest_phase() in stats.timings
+
+    # 進度百分比只會往前，最後到 100
+    percents = [p for p in progress if p is not None]
+    assert percents == sorted(percents) and percents[-1] == 100, percents
+
+    # 匯出檔附上執行統計
+    output = io.BytesIO()
+    write_workbook(output, result_df, vac_df, logs, swap_logs, stats)
+    sheet = pd.read_excel(io.BytesIO(output.getvalue()), sheet_name='執行統計')
+    values = dict(zip(sheet['項目'], sheet['數值']))
+    assert values['遞補移動次數'] == 3 and values['最長連鎖遞補'] == 3, values
+
+    print("\n✅ All instrumentation tests passed!")
+
+if __name__ == "__main__":
+    test_stats()
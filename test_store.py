@@ -0,0 +1,68 @@
+import os
+import tempfile
+
+import pandas as pd
+from allocation import process_allocation
+from bench import make_school
+from scenarios import diff_results
+from store import ResultStore, pack_result, unpack_result
+
+def same_result(a, b):
+    pd.testing.assert_frame_equal(a[0], b[0])
+    pd.testing.assert_frame_equal(a[1], b[1])
+    assert list(a[2]) == list(b[2]) and list(a[3]) == list(b[3])
+    pd.testing.assert_frame_equal(a[2].to_frame(), b[2].to_frame())
+    pd.testing.assert_frame_equal(a[3].to_frame(), b[3].to_frame())
+    assert a[4].to_dict() == b[4].to_dict()
+
+def test_store():
+    print("Testing Persistent Result Store...")
+    students_df, clubs_df, restrictions = make_school(students=400, clubs=15, scarcity=0.3, forbid_ratio=0.2, seed=1)
+
+    # 1. 精簡格式讀回後與分發當下完全相同 (含遞補日誌、交換紀錄、未轉社的學生與沒有姓名欄的資料)
+    ripple = process_allocation(students_df.copy(), clubs_df, swap_cycles=True, **restrictions)
+    exact = process_allocation(students_df.drop(columns=['姓名']), clubs_df, engine='exact', **restrictions)
+    print(f"遞補 {len(ripple[2])} 次、交換 {len(ripple[3])} 組；壓縮後 {len(pack_result(ripple))} bytes")
+    assert len(ripple[2]) and len(ripple[3]) and (ripple[0]['錄取志願序'] == '未轉社').any()
+    for result in (ripple, exact):
+        same_result(result, unpack_result(pack_result(result)))
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "runs.db")
+
+        # 2. 保存後由另一個 ResultStore (例如伺服器重新啟動後) 以 key 取回
+        store = ResultStore(path)
+        assert len(store) == 0 and store.runs().empty and store.load('ripple') is None
+        store.save('ripple', ripple, label="動態遞補", settings={'engine': 'ripple', 'h1_forbidden': ['社團001']})
+        store.save('exact', exact, label="精確配對", settings={'engine': 'exact'})
+        reopened = ResultStore(path)
+        assert len(reopened) == 2 and 'ripple' in reopened and 'other' not in reopened
+        same_result(ripple, reopened.load('ripple'))
+
+        # 3. 列表: 新的在前，附摘要與設定
+        runs = reopened.runs()
+        print(runs[['說明', '成功轉社', '交換組數', '設定']])
+        assert list(runs['key']) == ['exact', 'ripple']
+        assert runs.loc[1, '成功轉社'] == int((ripple[0]['狀態'] == '成功').sum())
+        assert runs.loc[1, '設定'] == "engine=ripple, h1_forbidden=['社團001']"
+
+        # 4. 相同 key 覆蓋、超過上限時刪除最舊的
+        small = ResultStore(path, max_runs=2)
+        small.save('ripple', ripple, label="重新分發")
+        small.save('third', ripple)
+        assert list(small.runs()['key']) == ['third', 'ripple'] and small.load('exact') is None
+        small.delete('third')
+        assert list(small.runs()['key']) == ['ripple']
+
+    # 5. 比較兩次分發: 列出結果不同的學生與志願序較好的一方
+    diff = diff_results({'遞補': ripple[0], '精確': exact[0]})
+    print(diff.head())
+    changed = (ripple[0].set_index('學號')['分發結果'] != exact[0].set_index('學號')['分發結果']).sum()
+    assert len(diff) == changed
+    assert set(diff['較好的結果']) <= {'遞補', '精確', '志願序相同'}
+    assert diff_results({'A': ripple[0], 'B': ripple[0]}).empty
+
+    print("\n✅ All result store tests passed!")
+
+if __name__ == "__main__":
+    test_store()
@@ -0,0 +1,61 @@
+import pandas as pd
+from allocation import process_allocation
+
+def test_swap():
+    print("Testing Indexed Swap Optimizer...")
+
+    # 所有社團都沒有缺額，只能靠交換改善
+    # Pair: S1 (在 A) 想去 B，S2 (在 B) 想去 A
+    # Cycle: S3 (在 C) 想去 D，S4 (在 D) 想去 E，S5 (在 E) 想去 C
+    data = {
+        '學號': ['S1', 'S2', 'S3', 'S4', 'S5'],
+        '姓名': ['S1', 'S2', 'S3', 'S4', 'S5'],
+        '班級': ['301', '301', '301', '301', '301'],
+        '原社團': ['A', 'B', 'C', 'D', 'E'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02',
+                                   '2023-01-01 10:03', '2023-01-01 10:04']),
+        '志願1': ['B', 'A', 'D', 'E', 'C']
+    }
+    students_df = pd.DataFrame(data)
+
+    clubs_data = {
+        '社團名稱': ['A', 'B', 'C', 'D', 'E'],
+        '目前缺額': [0, 0, 0, 0, 0]
+    }
+    clubs_df = pd.DataFrame(clubs_data)
+
+    # 預設只做兩兩交換
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(students_df.copy(), clubs_df)
+    final = dict(zip(result_df['學號'], result_df['分發結果']))
+    print(swap_logs)
+    assert final == {'S1': 'B', 'S2': 'A', 'S3': 'C', 'S4': 'D', 'S5': 'E'}, f"Unexpected pairwise result: {final}"
+    assert swap_logs == ["S1 <-> S2 : A <-> B"], swap_logs
+
+    # 開啟循環交換後，三人一起轉
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(students_df.copy(), clubs_df, swap_cycles=True)
+    final = dict(zip(result_df['學號'], result_df['分發結果']))
+    print(swap_logs)
+    assert final == {'S1': 'B', 'S2': 'A', 'S3': 'D', 'S4': 'E', 'S5': 'C'}, f"Unexpected cycle result: {final}"
+    assert len(swap_logs) == 2 and swap_logs[1].startswith("循環交換"), swap_logs
+
+    # 沒有人變差，社團人數不變
+    assert (result_df['錄取志願序'] == 1).all()
+    assert (vac_df['剩餘缺額'] == 0).all()
+
+    # 空白志願 (讀檔後為 'nan') 不是社團: 沒有原社團的 S2 不能和 S1 交換，讓 S1 失去社團
+    data = {
+        '學號': ['S1', 'S2'],
+        '姓名': ['S1', 'S2'],
+        '班級': ['301', '301'],
+        '原社團': ['A', None],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01']),
+        '志願1': [None, 'A'],
+    }
+    result_df, vac_df, logs, swap_logs, stats = process_allocation(pd.DataFrame(data), pd.DataFrame({'社團名稱': ['A'], '目前缺額': [0]}))
+    assert len(swap_logs) == 0, swap_logs
+    assert result_df['分發結果'].tolist() == ['A', 'nan']
+
+    print("\n✅ All swap tests passed!")
+
+if __name__ == "__main__":
+    test_swap()
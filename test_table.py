@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from allocation import NO_RANK, StudentTable
+
+def test_table():
+    print("Testing Columnar Student Table...")
+
+    data = {
+        '學號': ['S1', 'S2', 'S3', 'S4', 'S5', 'S6'],
+        '姓名': ['A', 'B', 'C', 'D', 'E', 'F'],
+        '班級': ['101', '１０１', 'abc', '201班', '3年5班', '115'],
+        '原社團': ['Chess', 'Chess', 'Music', None, 'Chess', 'Music'],
+        '填寫時間': pd.to_datetime(['2023-01-01 10:00', '2023-01-01 10:01', '2023-01-01 10:02',
+                                 '2023-01-01 10:03', '2023-01-01 10:04', '2023-01-01 10:05']),
+        '志願1': ['Comic', 'Comic', 'Comic', 'Comic', 'Ghost', 'Comic'],
+        '志願2': ['Comic', 'Drama', None, 'Drama', 'Drama', None],
+        '志願3': ['Drama', None, 'Drama', None, 'Comic', 'Drama'],
+    }
+    students_df = pd.DataFrame(data)
+    clubs = ['Chess', 'Comic', 'Drama', 'Music']
+    table = StudentTable(students_df, clubs, ['Comic'], ['Drama'], False, False)
+
+    # 1. 社團名稱轉成整數 ID: 缺額表的社團在前，其他出現過的名稱 (不在缺額表、空白) 排在後面
+    print(table.club_names)
+    assert table.club_names[:table.num_clubs] == clubs
+    comic, drama = clubs.index('Comic'), clubs.index('Drama')
+    assert not table.is_club(table.club_ids['Ghost'])
+    assert table.original.tolist()[:3] == [0, 0, 3] and not table.is_club(table.original[3])
+
+    # 2. 年級: 只取班級欄位的半形數字前 3 位；全形數字、沒有數字或不在範圍內的為 0
+    print(table.grade.tolist())
+    assert table.grade.tolist() == [1, 0, 0, 2, 0, 1]
+    assert np.isnan(table.class_num[2]) and table.class_num[4] == 35
+
+    # 3. 高一 / 高二限制: 被禁止的志願、空白、不在缺額表、重複填寫都變成 -1，其餘保留原本欄位位置
+    prefs = table.prefs[:, :3].tolist()
+    print(prefs)
+    assert prefs == [
+        [-1, -1, drama],       # 高一禁止 Comic (第 2 格另外也是重複填寫)
+        [comic, drama, -1],    # 全形班級無法判斷年級，不受限制
+        [comic, -1, drama],
+        [comic, -1, -1],       # 高二禁止 Drama
+        [-1, drama, comic],    # Ghost 不在缺額表
+        [-1, -1, drama],
+    ]
+    assert table.duplicate[0, 1] and table.unknown[4, 0] and table.blank[1, 2]
+    assert (table.prefs[:, 3:] == -1).all()
+    assert [row for row in table.choices[2]] == [(0, comic), (2, drama)]
+
+    # 4. 完全凍結: 該年級所有志願都是 -1
+    table.apply_restrictions(h1_ban_all=True)
+    assert (table.prefs[[0, 5]] == -1).all() and table.prefs[3, 2] == -1 and table.prefs[3, 1] == drama
+    assert table.choices[0] == [] and table.choices[3] == [(0, comic), (1, drama)]
+
+    # 5. 重新套用限制時回到初始狀態 (在原社團、尚未錄取任何志願)
+    table.assigned[:] = comic
+    table.rank[:] = 0
+    table.apply_restrictions()
+    assert (table.assigned == table.original).all()
+    assert (table.rank == NO_RANK).all()
+    assert table.prefs[0].tolist()[:3] == [comic, -1, drama]
+
+    print("\n✅ All student table tests passed!")
+
+if __name__ == "__main__":
+    test_table()